@@ -0,0 +1,48 @@
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, Set
+
+logger = logging.getLogger(__name__)
+
+# Файл с администраторами, назначенными через админ-панель
+ADMINS_PATH = os.getenv("ADMINS_PATH", "admins.json")
+
+
+class AdminRegistry:
+    """Множество администраторов: из ADMIN_IDS и назначенные в админ-панели.
+
+    Назначенные хранятся в файле и читаются один раз при запуске, проверка
+    прав - один поиск в множестве.
+    """
+
+    def __init__(self, initial: Iterable[int], path: str = ADMINS_PATH):
+        self.path = Path(path)
+        self._ids: Set[int] = set(initial)
+        self._granted: Set[int] = set()
+        try:
+            if self.path.exists():
+                self._granted = {int(user_id) for user_id in json.loads(self.path.read_text(encoding="utf-8"))}
+                self._ids |= self._granted
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Ошибка чтения списка администраторов {self.path}: {e}")
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._ids
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(sorted(self._ids))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, user_id: int):
+        """Назначить администратора и сохранить список на диск"""
+        if user_id in self._granted:
+            return
+        self._granted.add(user_id)
+        self._ids.add(user_id)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(sorted(self._granted)), encoding="utf-8")
+        tmp_path.replace(self.path)
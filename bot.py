@@ -2,10 +2,27 @@ import asyncio
 import logging
 import os
 import sys                       # ➊ добавили
+import secrets
+import multiprocessing
 from pathlib import Path
-from aiogram import Bot, Dispatcher
+from typing import Any, Dict, Optional
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from data import user_data, DATA_BACKEND
+from questions import question_bank
+from fsm_storage import create_fsm_storage, FSM_STORAGE
+from sharding import BOT_WORKERS, ShardSupervisor
+from logging_config import setup_logging, current_queue
+from send_queue import SEND_QUEUE_ENABLED, send_queue
+from broadcast import broadcaster
+from throttling import THROTTLE_ENABLED, ThrottlingMiddleware
+import metrics
+from metrics import METRICS_PORT, ApiMetricsMiddleware, HandlerMetricsMiddleware
 from handlers import main_router, quiz_router, riddles_router, word_router, games_router, admin_router
 
 # ➋ Гарантируем UTF-8 в stdout / stderr (Windows)
@@ -21,17 +38,23 @@ if os.name == "nt":
         sys.stdout = codecs.getwriter("utf-8")(sys.stdout.buffer, "replace")
         sys.stderr = codecs.getwriter("utf-8")(sys.stderr.buffer, "replace")
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log", encoding="utf-8"),   # ➌ указываем кодировку
-        logging.StreamHandler()                             # использует перенастроенный stdout
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Адрес и путь встроенного веб-сервера для webhook
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Публичный https-адрес, который регистрируется в Telegram ("" - не регистрировать)
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Отвечать Telegram сразу, не дожидаясь обработчика
+WEBHOOK_BACKGROUND = os.getenv("WEBHOOK_BACKGROUND", "1") not in ("0", "false", "no")
+# Файл для записи входящих обновлений (JSONL) для webhook_selftest.py
+RECORD_UPDATES_PATH = os.getenv("RECORD_UPDATES_PATH", "")
+
 def get_token():
     """Получение токена из переменной окружения или .env файла"""
     token = os.getenv('BOT_TOKEN')
@@ -52,51 +75,179 @@ def get_token():
 
     return token
 
-async def on_startup():
+async def on_startup(bot: Bot, metrics_port: int = METRICS_PORT):
     """Функция выполняется при запуске бота"""
     logger.info("Бот запускается...")
+    user_data.start()
+    question_bank.start()
+    await metrics.start_server(metrics_port)
+    # Вопрос дня по расписанию и продолжение прерванных рассылок
+    broadcaster.start_background(bot)
 
 async def on_shutdown():
     """Функция выполняется при остановке бота"""
     logger.info("Бот останавливается...")
+    await broadcaster.stop()
+    await send_queue.drain()
+    await question_bank.close()
+    await user_data.close()
+    await metrics.stop_server()
 
-async def main():
-    try:
-        token = get_token()
+class UpdateRecorder(BaseMiddleware):
+    """Дописывает каждое входящее обновление строкой JSON в файл"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+
+    async def __call__(self, handler, event: Update, data: Dict[str, Any]) -> Any:
+        self._file.write(event.model_dump_json(exclude_none=True) + "\n")
+        return await handler(event, data)
+
+    def close(self):
+        self._file.close()
+
+def create_bot(token: str, session: Optional[BaseSession] = None, rate_limit: bool = SEND_QUEUE_ENABLED) -> Bot:
+    """Создание бота с настройками по умолчанию.
+
+    При rate_limit сообщения отправляются через очередь send_queue с учетом
+    лимитов Telegram, а обработчики не ждут отправки.
+    """
+    bot = Bot(
+        token=token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    if rate_limit:
+        bot.session.middleware(send_queue)
+    bot.session.middleware(ApiMetricsMiddleware())
+    return bot
+
+def create_dispatcher(throttle: bool = THROTTLE_ENABLED) -> Dispatcher:
+    """Диспетчер со всеми роутерами (состояния FSM переживают перезапуск).
+
+    При throttle слишком частые обновления от пользователя отбрасываются
+    до чтения состояния FSM и обработчиков.
+    """
+    # FSM подключается ниже вручную, чтобы ограничение частоты стояло перед ним
+    dp = Dispatcher(storage=create_fsm_storage(), disable_fsm=True)
+
+    # Подключение обработчиков событий
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
-        # Создание бота с настройками по умолчанию
-        bot = Bot(
-            token=token,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    # Подключение роутеров
+    dp.include_router(admin_router)
+    dp.include_router(main_router)
+    dp.include_router(quiz_router)
+    dp.include_router(games_router)
+    dp.include_router(riddles_router)
+    dp.include_router(word_router)
+
+    # Время и ошибки каждого обработчика
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    if RECORD_UPDATES_PATH:
+        recorder = UpdateRecorder(RECORD_UPDATES_PATH)
+        dp.update.outer_middleware(recorder)
+        dp.shutdown.register(recorder.close)
+        logger.info(f"Входящие обновления записываются в {RECORD_UPDATES_PATH}")
+    if throttle:
+        dp.update.outer_middleware(ThrottlingMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+    return dp
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, path: str = WEBHOOK_PATH, secret: Optional[str] = None,
+                       background: bool = WEBHOOK_BACKGROUND) -> web.Application:
+    """aiohttp-приложение, принимающее обновления на path.
+
+    Запросы без правильного заголовка X-Telegram-Bot-Api-Secret-Token
+    отклоняются с кодом 401. При background=True Telegram получает ответ
+    сразу, а обновление обрабатывается в отдельной задаче.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=background,
+        secret_token=secret
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Запуск встроенного веб-сервера и регистрация вебхука в Telegram"""
+    secret = WEBHOOK_SECRET
+    if not secret:
+        secret = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET не задан, используется случайный секрет")
+
+    async def register_webhook():
+        if not WEBHOOK_BASE_URL:
+            # Без публичного адреса сервер принимает только локальные запросы
+            logger.warning("WEBHOOK_BASE_URL не задан, вебхук в Telegram не регистрируется")
+            return
+        await bot.set_webhook(
+            url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=False
         )
+        logger.info(f"Вебхук зарегистрирован: {WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}")
 
-        # Создание диспетчера
-        dp = Dispatcher()
+    dp.startup.register(register_webhook)
+    runner = web.AppRunner(create_webhook_app(bot, dp, secret=secret))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        logger.info(f"Вебхук слушает http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
 
-        # Подключение обработчиков событий
-        dp.startup.register(on_startup)
-        dp.shutdown.register(on_shutdown)
+async def run_sharded(bot: Bot, dp: Dispatcher):
+    """Прием обновлений в этом процессе и обработка в BOT_WORKERS воркерах"""
+    if DATA_BACKEND != "sqlite" or FSM_STORAGE != "sqlite":
+        raise ValueError("Для BOT_WORKERS > 1 нужны DATA_BACKEND=sqlite и FSM_STORAGE=sqlite")
+    if BOT_MODE == "webhook":
+        logger.warning("Режим webhook не поддерживается при BOT_WORKERS > 1, используется polling")
+    # Диспетчер здесь нужен только для списка типов обновлений, роутеры работают в воркерах
+    allowed_updates = dp.resolve_used_update_types()
+    await dp.storage.close()
+    await bot.delete_webhook()
+    try:
+        await ShardSupervisor(BOT_WORKERS, log_queue=current_queue()).run(bot, allowed_updates)
+    finally:
+        await bot.session.close()
 
-        # Подключение роутеров
-        dp.include_router(admin_router)
-        dp.include_router(main_router)
-        dp.include_router(quiz_router)
-        dp.include_router(games_router)
-        dp.include_router(riddles_router)
-        dp.include_router(word_router)
+async def main():
+    try:
+        bot = create_bot(get_token())
+        dp = create_dispatcher()
 
         # Запуск бота
-        logger.info("Начинаю polling...")
-        await dp.start_polling(
-            bot,
-            allowed_updates=dp.resolve_used_update_types()
-        )
+        if BOT_WORKERS > 1:
+            await run_sharded(bot, dp)
+        elif BOT_MODE == "webhook":
+            logger.info("Запуск в режиме webhook...")
+            await run_webhook(bot, dp)
+        else:
+            logger.info("Начинаю polling...")
+            # Вебхук мог остаться от запуска в режиме webhook, с ним getUpdates не работает
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot,
+                allowed_updates=dp.resolve_used_update_types()
+            )
 
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
         raise
 
 if __name__ == "__main__":
+    # Запись логов идет в отдельном потоке; воркерам нужна межпроцессная очередь
+    setup_logging(multiprocessing.get_context("spawn").Queue() if BOT_WORKERS > 1 else None)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,441 @@
+"""Рассылки всем пользователям: объявления администраторов и вопрос дня.
+
+Получатели читаются из хранилища страницами по BROADCAST_PAGE_SIZE id
+(по возрастанию), поэтому список всех пользователей в памяти не держится.
+Сообщения отправляются не больше BROADCAST_CONCURRENCY одновременно и не
+чаще BROADCAST_RATE в секунду, в полосе рассылок send_queue, так что
+ответы пользователям уходят раньше.
+
+После каждой страницы в базу BROADCAST_DB_PATH записываются последний
+обработанный id и счетчики: прерванная рассылка продолжается с этого места
+после перезапуска (повторно может прийти не больше одной страницы).
+Заблокировавшие бота и удаленные пользователи, а также те, кому отправка
+не удалась BROADCAST_MAX_FAILURES раз подряд, в следующих рассылках
+пропускаются.
+"""
+import os
+import html
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from data import user_data
+from questions import question_bank
+from send_queue import TokenBucket, bulk
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_DB_PATH = os.getenv("BROADCAST_DB_PATH", "broadcasts.db")
+# Получателей на страницу: после каждой страницы сохраняется прогресс
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))
+# Одновременных отправок и отправок в секунду (общий лимит бота - SEND_GLOBAL_RATE)
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+# Неудачных отправок подряд, после которых пользователь пропускается
+BROADCAST_MAX_FAILURES = int(os.getenv("BROADCAST_MAX_FAILURES", "3"))
+# Время ежедневного вопроса дня, ЧЧ:ММ по местному времени ("" - не рассылать)
+DAILY_QUIZ_TIME = os.getenv("DAILY_QUIZ_TIME", "")
+
+# Рассылка без отметки дольше этого (секунды) считается брошенной упавшим процессом
+STALE_AFTER = 180
+# Период проверки расписания и брошенных рассылок
+SUPERVISE_INTERVAL = 60
+
+ANNOUNCEMENT = "announcement"
+DAILY_QUIZ = "daily_quiz"
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+# Результаты отправки одному пользователю
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Job(NamedTuple):
+    """Рассылка и ее прогресс"""
+    id: int
+    kind: str
+    text: str
+    status: str
+    cursor: str
+    sent: int
+    blocked: int
+    failed: int
+    skipped: int
+    created_by: Optional[int]
+    created: float
+    finished: Optional[float]
+
+
+_JOB_COLUMNS = ", ".join(Job._fields)
+
+
+async def daily_quiz_text() -> str:
+    """Текст вопроса дня: случайный вопрос и ответ под спойлером"""
+    question = await question_bank.get_question_async()
+    return (
+        f"🧠 <b>Вопрос дня</b>\n\n{html.escape(question['q'])}\n\n"
+        f"Ответ: <tg-spoiler>{html.escape(question['a'][0])}</tg-spoiler>\n\n"
+        "💡 <i>Больше вопросов - в викторине!</i>"
+    )
+
+
+def _parse_time(value: str) -> Optional[Tuple[int, int]]:
+    if not value:
+        return None
+    try:
+        hour, minute = map(int, value.split(":"))
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            return hour, minute
+    except ValueError:
+        pass
+    logger.error(f"Неверное DAILY_QUIZ_TIME={value!r}, ожидается ЧЧ:ММ; вопрос дня не рассылается")
+    return None
+
+
+class Broadcaster:
+    """Рассылки с сохранением прогресса в SQLite.
+
+    Рассылку выполняет процесс, который ее захватил (owner). Процессы бота
+    раз в SUPERVISE_INTERVAL секунд отмечают свои рассылки, а рассылку без
+    отметки дольше STALE_AFTER секунд подхватывает любой из них.
+    """
+
+    def __init__(self, db_path: str = BROADCAST_DB_PATH, page_size: int = BROADCAST_PAGE_SIZE,
+                 concurrency: int = BROADCAST_CONCURRENCY, rate: float = BROADCAST_RATE,
+                 max_failures: int = BROADCAST_MAX_FAILURES, daily_time: str = DAILY_QUIZ_TIME):
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_failures = max_failures
+        self.daily_time = _parse_time(daily_time)
+        self.owner = uuid.uuid4().hex
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._supervisor: Optional[asyncio.Task] = None
+        self.db_path = db_path
+        # База открывается при первом обращении: импорт модуля ее не создает
+        self._db: Optional[sqlite3.Connection] = None
+        self._daily_sent: Optional[str] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = self._connect()
+        return self._db
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key TEXT UNIQUE,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL,
+                cursor TEXT NOT NULL DEFAULT '',
+                sent INTEGER NOT NULL DEFAULT 0,
+                blocked INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                skipped INTEGER NOT NULL DEFAULT 0,
+                created_by INTEGER,
+                created REAL NOT NULL,
+                finished REAL,
+                owner TEXT,
+                heartbeat REAL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS unreachable (
+                user_id TEXT PRIMARY KEY,
+                permanent INTEGER NOT NULL,
+                failures INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        return conn
+
+    # --- Рассылки ---
+
+    def create(self, kind: str, text: str, created_by: Optional[int] = None,
+               key: Optional[str] = None) -> Optional[int]:
+        """Новая рассылка этого процесса; None, если рассылка с таким key уже есть"""
+        now = time.time()
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO broadcasts (kind, key, text, status, created_by, created, owner, heartbeat) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, key, text, RUNNING, created_by, now, self.owner, now)
+        )
+        self._conn.commit()
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def get(self, job_id: int) -> Optional[Job]:
+        row = self._conn.execute(f"SELECT {_JOB_COLUMNS} FROM broadcasts WHERE id = ?", (job_id,)).fetchone()
+        return Job(*row) if row else None
+
+    def recent(self, limit: int = 5) -> List[Job]:
+        rows = self._conn.execute(
+            f"SELECT {_JOB_COLUMNS} FROM broadcasts ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [Job(*row) for row in rows]
+
+    def cancel(self, job_id: int) -> bool:
+        """Остановить рассылку (в другом процессе - после текущей страницы)"""
+        cursor = self._conn.execute(
+            "UPDATE broadcasts SET status = ?, finished = ?, owner = NULL WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, RUNNING)
+        )
+        self._conn.commit()
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return cursor.rowcount > 0
+
+    def start(self, bot: Bot, job_id: int) -> bool:
+        """Запустить рассылку в этом процессе, если ее никто не выполняет"""
+        if job_id in self._tasks:
+            return False
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE broadcasts SET owner = ?, heartbeat = ? WHERE id = ? AND status = ? "
+            "AND (owner IS NULL OR owner = ? OR heartbeat < ?)",
+            (self.owner, now, job_id, RUNNING, self.owner, now - STALE_AFTER)
+        )
+        self._conn.commit()
+        if not cursor.rowcount:
+            return False
+        task = asyncio.create_task(self._run(bot, job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return True
+
+    # --- Недоступные пользователи ---
+
+    def unreachable_count(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM unreachable WHERE permanent = 1 OR failures >= ?", (self.max_failures,)
+        ).fetchone()[0]
+
+    def mark_reachable(self, user_id: int):
+        """Пользователь снова пишет боту: вернуть его в рассылки"""
+        if self._db is None:
+            # Рассылки в этом процессе не запускались (loadtest и т.п.)
+            return
+        cursor = self._conn.execute("DELETE FROM unreachable WHERE user_id = ?", (str(user_id),))
+        if cursor.rowcount:
+            self._conn.commit()
+
+    def _unreachable(self, page: List[str]) -> Dict[str, Tuple[int, int]]:
+        placeholders = ",".join("?" * len(page))
+        rows = self._conn.execute(
+            f"SELECT user_id, permanent, failures FROM unreachable WHERE user_id IN ({placeholders})", page
+        ).fetchall()
+        return {uid: (permanent, failures) for uid, permanent, failures in rows}
+
+    # --- Выполнение ---
+
+    async def _run(self, bot: Bot, job_id: int):
+        job = self.get(job_id)
+        markup = _markup(job.kind)
+        bucket = TokenBucket(self.rate, 1)
+        cursor = job.cursor
+        logger.info(f"Рассылка #{job_id} ({job.kind}) запущена" + (f" с id {cursor}" if cursor else ""))
+        try:
+            while True:
+                status = self._conn.execute("SELECT status FROM broadcasts WHERE id = ?", (job_id,)).fetchone()
+                if status is None or status[0] != RUNNING:
+                    logger.info(f"Рассылка #{job_id} остановлена")
+                    return
+                page = user_data.user_ids_after(cursor, self.page_size)
+                if not page:
+                    break
+                results = await self._send_page(bot, job.text, markup, page, bucket)
+                cursor = page[-1]
+                self._checkpoint(job_id, cursor, results)
+        except asyncio.CancelledError:
+            # Остановка процесса: рассылку продолжит следующий запуск
+            self._release(job_id)
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка рассылки #{job_id}: {e}")
+            self._release(job_id)
+            return
+
+        self._conn.execute(
+            "UPDATE broadcasts SET status = ?, finished = ?, owner = NULL WHERE id = ? AND status = ?",
+            (DONE, time.time(), job_id, RUNNING)
+        )
+        self._conn.commit()
+        job = self.get(job_id)
+        logger.info(f"Рассылка #{job_id} завершена: отправлено {job.sent}, заблокировали {job.blocked}, "
+                    f"ошибок {job.failed}, пропущено {job.skipped}")
+        if job.created_by:
+            try:
+                await bot.send_message(
+                    job.created_by,
+                    f"📢 <b>Рассылка #{job_id} завершена</b>\n\n"
+                    f"✅ Отправлено: <b>{job.sent}</b>\n"
+                    f"🚫 Заблокировали бота: <b>{job.blocked}</b>\n"
+                    f"⚠️ Ошибок: <b>{job.failed}</b>\n"
+                    f"⏭ Пропущено: <b>{job.skipped}</b>"
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось сообщить о завершении рассылки #{job_id}: {e}")
+
+    async def _send_page(self, bot: Bot, text: str, markup: Optional[InlineKeyboardMarkup],
+                         page: List[str], bucket: TokenBucket) -> Dict[str, Tuple[str, str]]:
+        """Отправить странице получателей; uid -> (результат, причина)"""
+        known = self._unreachable(page)
+        results: Dict[str, Tuple[str, str]] = {}
+        targets = []
+        for uid in page:
+            state = known.get(uid)
+            if state is not None and (state[0] or state[1] >= self.max_failures):
+                results[uid] = (SKIPPED, "")
+            else:
+                targets.append(uid)
+
+        pending = iter(targets)
+
+        async def worker():
+            for uid in pending:
+                results[uid] = await self._deliver(bot, uid, text, markup, bucket)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(targets)))))
+        return results
+
+    @staticmethod
+    async def _deliver(bot: Bot, uid: str, text: str, markup: Optional[InlineKeyboardMarkup],
+                       bucket: TokenBucket) -> Tuple[str, str]:
+        delay = bucket.take()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = bucket.take()
+        try:
+            with bulk():
+                await bot.send_message(int(uid), text, reply_markup=markup)
+        except TelegramForbiddenError as e:
+            return BLOCKED, e.message
+        except TelegramBadRequest as e:
+            if "chat not found" in e.message.lower():
+                return BLOCKED, e.message
+            return FAILED, e.message
+        except Exception as e:
+            return FAILED, str(e) or type(e).__name__
+        return SENT, ""
+
+    def _checkpoint(self, job_id: int, cursor: str, results: Dict[str, Tuple[str, str]]):
+        """Прогресс страницы и недоступные пользователи - одной транзакцией"""
+        counts = {SENT: 0, BLOCKED: 0, FAILED: 0, SKIPPED: 0}
+        now = time.time()
+        with self._conn:
+            for uid, (result, reason) in results.items():
+                counts[result] += 1
+                if result == BLOCKED:
+                    self._conn.execute(
+                        "INSERT INTO unreachable (user_id, permanent, failures, reason, updated) "
+                        "VALUES (?, 1, 1, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+                        "permanent = 1, failures = failures + 1, reason = excluded.reason, updated = excluded.updated",
+                        (uid, reason, now)
+                    )
+                elif result == FAILED:
+                    self._conn.execute(
+                        "INSERT INTO unreachable (user_id, permanent, failures, reason, updated) "
+                        "VALUES (?, 0, 1, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+                        "failures = failures + 1, reason = excluded.reason, updated = excluded.updated",
+                        (uid, reason, now)
+                    )
+                elif result == SENT:
+                    # Успешная отправка обнуляет счетчик неудач
+                    self._conn.execute("DELETE FROM unreachable WHERE user_id = ?", (uid,))
+            self._conn.execute(
+                "UPDATE broadcasts SET cursor = ?, sent = sent + ?, blocked = blocked + ?, failed = failed + ?, "
+                "skipped = skipped + ?, heartbeat = ? WHERE id = ?",
+                (cursor, counts[SENT], counts[BLOCKED], counts[FAILED], counts[SKIPPED], now, job_id)
+            )
+
+    def _release(self, job_id: int):
+        self._conn.execute("UPDATE broadcasts SET owner = NULL WHERE id = ? AND owner = ?", (job_id, self.owner))
+        self._conn.commit()
+
+    # --- Фоновая проверка ---
+
+    def start_background(self, bot: Bot):
+        """Вопрос дня по расписанию и продолжение брошенных рассылок"""
+        if self._supervisor is None:
+            # База открывается при запуске бота, а не на первом запросе
+            _ = self._conn
+            self._supervisor = asyncio.create_task(self._supervise(bot))
+
+    async def _supervise(self, bot: Bot):
+        while True:
+            try:
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE broadcasts SET heartbeat = ? WHERE owner = ? AND status = ?", (now, self.owner, RUNNING)
+                )
+                self._conn.commit()
+                await self._schedule_daily()
+                rows = self._conn.execute(
+                    "SELECT id FROM broadcasts WHERE status = ? AND (owner IS NULL OR owner = ? OR heartbeat < ?)",
+                    (RUNNING, self.owner, now - STALE_AFTER)
+                ).fetchall()
+                for (job_id,) in rows:
+                    self.start(bot, job_id)
+            except Exception as e:
+                logger.error(f"Ошибка проверки рассылок: {e}")
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+
+    async def _schedule_daily(self) -> Optional[int]:
+        if self.daily_time is None:
+            return None
+        now = datetime.now()
+        if (now.hour, now.minute) < self.daily_time:
+            return None
+        # Ключ с датой: за день создается одна рассылка, даже если процессов несколько
+        key = f"{DAILY_QUIZ}:{now.date().isoformat()}"
+        if key == self._daily_sent:
+            return None
+        if self._conn.execute("SELECT 1 FROM broadcasts WHERE key = ?", (key,)).fetchone() is None:
+            job_id = self.create(DAILY_QUIZ, await daily_quiz_text(), key=key)
+        else:
+            job_id = None
+        self._daily_sent = key
+        if job_id is not None:
+            logger.info(f"Запланирован вопрос дня: рассылка #{job_id}")
+        return job_id
+
+    async def stop(self):
+        """Остановить фоновые задачи; незавершенные рассылки продолжатся при запуске"""
+        tasks = list(self._tasks.values())
+        if self._supervisor is not None:
+            tasks.append(self._supervisor)
+            self._supervisor = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _markup(kind: str) -> Optional[InlineKeyboardMarkup]:
+    if kind == DAILY_QUIZ:
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🧠 Викторина", callback_data="quiz")]
+        ])
+    return None
+
+
+# Глобальный экземпляр
+broadcaster = Broadcaster()
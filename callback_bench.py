@@ -0,0 +1,93 @@
+"""Бенчмарк выбора обработчика для нажатий inline-кнопок.
+
+Роутеры бота копируются дважды с пустыми обработчиками: с фильтрами как
+сейчас (Action, CallbackData.filter()) и с прежними строковыми фильтрами
+F.data == ... / F.data.startswith(...). Нажатия прогоняются через цепочку
+роутеров в том же порядке, что в боте; измеряется только поиск
+обработчика.
+
+    python callback_bench.py --rounds 200
+"""
+import time
+import asyncio
+import argparse
+from typing import Any, List
+from aiogram import F, Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.event.handler import FilterObject
+from aiogram.filters.callback_data import CallbackQueryFilter
+from aiogram.types import CallbackQuery, User
+from callbacks import Action
+from handlers import main_router, quiz_router, riddles_router, word_router, games_router, admin_router
+
+ROUTERS = [admin_router, main_router, quiz_router, games_router, riddles_router, word_router]
+
+# Нажатия примерно в пропорциях loadtest.py
+DATA = [
+    "quiz:easy", "quiz:medium", "quiz:hard", "riddles:easy", "word:short",
+    "game:dice", "game:coin", "game:number", "rps:rock",
+    "leaderboard", "leaderboard:page:2", "stats", "back_to_main", "riddle_hint",
+]
+
+
+async def noop(*args: Any, **kwargs: Any) -> None:
+    return None
+
+
+def legacy(filter_: FilterObject) -> Any:
+    """Прежний строковый фильтр вместо нового"""
+    callback = filter_.callback
+    if isinstance(callback, Action):
+        (value,) = callback.values
+        return F.data == value
+    if isinstance(callback, CallbackQueryFilter):
+        return F.data.startswith(f"{callback.callback_data.__prefix__}:")
+    return callback
+
+
+def copy_router(source: Router, old: bool) -> Router:
+    """Те же фильтры в том же порядке, но обработчики ничего не делают"""
+    convert = legacy if old else (lambda f: f.callback)
+    router = Router(name=f"{source.name}-{'old' if old else 'new'}")
+    router.callback_query.filter(*(convert(f) for f in source.callback_query._handler.filters or ()))
+    for handler in source.callback_query.handlers:
+        router.callback_query.register(noop, *(convert(f) for f in handler.filters or ()))
+    return router
+
+
+def build(old: bool) -> Router:
+    root = Router()
+    for source in ROUTERS:
+        root.include_router(copy_router(source, old))
+    return root
+
+
+async def measure(root: Router, events: List[CallbackQuery], rounds: int) -> float:
+    """Среднее время поиска обработчика на одно нажатие, секунды"""
+    for event in events:
+        assert await root.propagate_event("callback_query", event) is not UNHANDLED, event.data
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for event in events:
+            await root.propagate_event("callback_query", event)
+    return (time.perf_counter() - started) / (rounds * len(events))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Стоимость выбора обработчика callback-кнопок")
+    parser.add_argument("--rounds", type=int, default=200, help="проходов по всем нажатиям")
+    args = parser.parse_args()
+
+    user = User(id=1, is_bot=False, first_name="Bench")
+    events = [CallbackQuery(id=str(i), from_user=user, chat_instance="bench", data=data)
+              for i, data in enumerate(DATA)]
+
+    old = await measure(build(old=True), events, args.rounds)
+    new = await measure(build(old=False), events, args.rounds)
+    print(f"строковые фильтры F.data:   {old * 1e6:8.1f} мкс на нажатие")
+    print(f"Action / CallbackData:      {new * 1e6:8.1f} мкс на нажатие")
+    print(f"ускорение:                  {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""Данные inline-кнопок.
+
+Кнопки с параметром ("game:dice", "quiz:easy", "leaderboard:page:2")
+описаны классами CallbackData: клавиатуры собирают строку через pack(),
+а обработчик получает разобранный callback_data вместо split(":").
+Строки кнопок не изменились, поэтому кнопки в уже отправленных
+сообщениях продолжают работать.
+
+Фильтры F.data синхронные, и aiogram проверяет каждый из них в пуле
+потоков (run_in_executor) - для каждого обработчика по пути к нужному.
+CallbackData.filter() и Action асинхронные и проверяются прямо в цикле
+событий.
+"""
+from typing import FrozenSet
+from aiogram.filters import BaseFilter
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+
+class QuizCallback(CallbackData, prefix="quiz"):
+    """Режим викторины: easy, medium, hard, random, speed, mixed"""
+    level: str
+
+
+class GameCallback(CallbackData, prefix="game"):
+    """Игра из меню игр"""
+    game: str
+
+
+class RpsCallback(CallbackData, prefix="rps"):
+    """Ход в камень-ножницы-бумага: rock, scissors, paper"""
+    choice: str
+
+
+class RiddleCallback(CallbackData, prefix="riddles"):
+    """Тип загадок"""
+    level: str
+
+
+class WordCallback(CallbackData, prefix="word"):
+    """Сложность игры в слова"""
+    level: str
+
+
+class LeaderboardCallback(CallbackData, prefix="leaderboard"):
+    """Страница рейтинга: leaderboard:page:N"""
+    action: str
+    page: int
+
+
+class Action(BaseFilter):
+    """Кнопка без параметров: точное совпадение callback_data"""
+
+    def __init__(self, *values: str):
+        self.values: FrozenSet[str] = frozenset(values)
+
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        return callback.data in self.values
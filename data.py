@@ -1,18 +1,105 @@
+import os
 import json
+import sqlite3
 import asyncio
 import aiofiles
 from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List, NamedTuple, Set, Tuple
+from sortedcontainers import SortedList
+import metrics
 
 logger = logging.getLogger(__name__)
 
+# Интервал фоновой записи (секунды). 0 - писать на диск при каждом изменении
+FLUSH_INTERVAL = float(os.getenv("DATA_FLUSH_INTERVAL", "5"))
+# Размер журнала (байты), после которого он сворачивается в новый снимок
+JOURNAL_MAX_BYTES = int(os.getenv("DATA_JOURNAL_MAX_BYTES", str(1024 * 1024)))
+# Снимок данных пользователей (журнал лежит рядом с расширением .journal)
+DATA_PATH = os.getenv("DATA_PATH", "user_data.json")
+# Хранилище: json (по умолчанию) или sqlite
+DATA_BACKEND = os.getenv("DATA_BACKEND", "json").lower()
+DATA_DB_PATH = os.getenv("DATA_DB_PATH", "user_data.db")
+
+class ApplyResult(NamedTuple):
+    """Результат UserData.apply"""
+    user: Dict[str, Any]
+    achievements: List[str]  # новые достижения
+    streak_updated: bool
+
+class LeaderboardIndex:
+    """Рейтинг по очкам, обновляемый при каждом изменении счета.
+
+    Ключи (-score, uid) хранятся в SortedList, поэтому срез топа, страница
+    и место пользователя находятся за O(log n) без сортировки всех игроков.
+    Рядом лежит SortedList самих uid для постраничного обхода по id.
+    """
+
+    def __init__(self):
+        self._keys = SortedList()
+        self._ids = SortedList()
+        self._scores: Dict[str, int] = {}
+
+    def rebuild(self, users: Dict[str, Dict[str, Any]]):
+        self._scores = {uid: user["score"] for uid, user in users.items()}
+        self._keys = SortedList((-score, uid) for uid, score in self._scores.items())
+        self._ids = SortedList(self._scores)
+
+    def update(self, uid: str, score: int):
+        old = self._scores.get(uid)
+        if old == score:
+            return
+        if old is not None:
+            self._keys.remove((-old, uid))
+        else:
+            self._ids.add(uid)
+        self._keys.add((-score, uid))
+        self._scores[uid] = score
+
+    def top(self, limit: int, offset: int = 0) -> List[str]:
+        return [uid for _, uid in self._keys.islice(offset, offset + limit)]
+
+    def rank(self, uid: str) -> Optional[int]:
+        score = self._scores.get(uid)
+        if score is None:
+            return None
+        return self._keys.index((-score, uid)) + 1
+
+    def ids_after(self, after: str, limit: int) -> List[str]:
+        return list(islice(self._ids.irange(minimum=after, inclusive=(False, True)), limit))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
 class UserData:
-    def __init__(self, path: str = 'user_data.json'):
+    """Данные пользователей: снимок user_data.json + журнал изменений.
+
+    Каждое изменение дописывается в журнал одной строкой
+    {"t": время, "u": id, "f": поле, "v": новое значение[, "d": приращение]}.
+    При загрузке журнал проигрывается поверх снимка. Записи хранят итоговое
+    значение поля, поэтому повторное проигрывание журнала безопасно.
+    """
+
+    def __init__(self, path: str = 'user_data.json', flush_interval: float = FLUSH_INTERVAL,
+                 journal_max_bytes: int = JOURNAL_MAX_BYTES):
         self.path = Path(path)
+        self.journal_path = self.path.with_suffix('.journal')
         self.data: Dict[str, Dict[str, Any]] = {}
         self._lock = asyncio.Lock()
+        self.flush_interval = flush_interval
+        self.journal_max_bytes = journal_max_bytes
+        self._dirty = False
+        self._pending: List[str] = []
+        self._journal_size = 0
+        self._snapshot_needed = False
+        self._ranking = LeaderboardIndex()
+        self._ranking_stale = True
+        # Версии пользователей для кешей текстов (только в памяти)
+        self._versions: Dict[str, int] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
         self._achievements = {
             "first_answer": "🎯 Первый ответ",
             "streak_3": "🔥 Серия 3",
@@ -28,7 +115,7 @@ class UserData:
         }
 
     async def load(self):
-        """Асинхронная загрузка данных"""
+        """Асинхронная загрузка снимка и проигрывание журнала"""
         try:
             if self.path.exists():
                 async with aiofiles.open(self.path, 'r', encoding='utf-8') as f:
@@ -42,131 +129,332 @@ class UserData:
             logger.error(f"Ошибка загрузки данных: {e}")
             self.data = {}
 
+        try:
+            if self.journal_path.exists():
+                replayed = 0
+                async with aiofiles.open(self.journal_path, 'r', encoding='utf-8') as f:
+                    async for line in f:
+                        try:
+                            self._replay(json.loads(line))
+                            replayed += 1
+                        except (ValueError, KeyError):
+                            # Недописанная строка после сбоя
+                            logger.warning(f"Пропущена поврежденная запись журнала: {line[:80]!r}")
+                self._journal_size = self.journal_path.stat().st_size
+                logger.info(f"Из журнала применено {replayed} изменений")
+        except Exception as e:
+            logger.error(f"Ошибка чтения журнала: {e}")
+        self._ranking_stale = True
+
+    def _replay(self, op: Dict[str, Any]):
+        uid = op["u"]
+        if "f" not in op:
+            # Полная запись пользователя (создание)
+            self.data[uid] = op["v"]
+            return
+        user = self.data.setdefault(uid, self._new_user(op["t"]))
+        user[op["f"]] = op["v"]
+        if "d" in op:
+            user["last_activity"] = op["t"]
+
+    def _record(self, uid: str, field: Optional[str], value: Any,
+                delta: Optional[int] = None, ts: Optional[str] = None):
+        """Добавить изменение в очередь журнала"""
+        op = {"t": ts or datetime.now().isoformat(), "u": uid}
+        if field is not None:
+            op["f"] = field
+        op["v"] = value
+        if delta is not None:
+            op["d"] = delta
+        self._pending.append(json.dumps(op, ensure_ascii=False) + "\n")
+        self._dirty = True
+        self._bump_version(uid)
+
+    def _bump_version(self, uid: str):
+        self._versions[uid] = self._versions.get(uid, 0) + 1
+
+    def version(self, user_id: int) -> int:
+        """Версия пользователя для кешей текстов, построенных по его данным.
+
+        Меняется при каждом изменении пользователя; в записи не сохраняется.
+        """
+        return self._versions.get(str(user_id), 0)
+
     async def save(self):
-        """Асинхронное сохранение данных с резервным копированием"""
+        """Сохранить изменения, сделанные напрямую в словаре пользователя.
+
+        Такие изменения не попадают в журнал, поэтому при следующем сбросе
+        записывается полный снимок.
+        """
+        self._snapshot_needed = True
+        # Очки могли измениться в обход индекса рейтинга
+        self._ranking_stale = True
+        with metrics.registry.timer("storage", "save"):
+            await self._persist()
+
+    async def _persist(self):
+        # Если фоновая запись запущена, данные попадут на диск при следующем
+        # сбросе, иначе записываются сразу
+        self._dirty = True
+        if self._flusher is None:
+            await self.flush()
+
+    async def flush(self):
+        """Принудительная запись накопленных изменений на диск"""
+        if not self._dirty:
+            return
         async with self._lock:
-            backup_path = self.path.with_suffix('.bak')
+            if not self._dirty:
+                return
+            # Изменения, сделанные во время записи, попадут в следующий сброс
+            self._dirty = False
             try:
-                # Удаляем старый бэкап, если есть
-                if backup_path.exists():
-                    backup_path.unlink()
-                # Создаем новую копию
-                if self.path.exists():
-                    self.path.rename(backup_path)
+                with metrics.registry.timer("storage", "flush"):
+                    await self._write()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения данных: {e}")
+                self._dirty = True
 
-                # Записываем данные
-                async with aiofiles.open(self.path, 'w', encoding='utf-8') as f:
-                    await f.write(json.dumps(self.data, indent=2, ensure_ascii=False))
+    async def _write(self):
+        """Дописать журнал и при необходимости свернуть его в снимок"""
+        lines, self._pending = self._pending, []
+        compact = self._snapshot_needed or self._journal_size >= self.journal_max_bytes
+        # Снимок фиксирует то же состояние, что и журнал вместе с lines
+        content = json.dumps(self.data, indent=2, ensure_ascii=False) if compact else None
+        self._snapshot_needed = False
+        try:
+            if lines:
+                chunk = "".join(lines)
+                async with aiofiles.open(self.journal_path, 'a', encoding='utf-8') as f:
+                    await f.write(chunk)
+                self._journal_size += len(chunk.encode('utf-8'))
+                lines = []
+            if compact:
+                await self._compact(content)
+            logger.debug("Данные сохранены")
+        except Exception:
+            # Повторная запись тех же строк безопасна: они хранят итоговые значения
+            self._pending[:0] = lines
+            self._snapshot_needed = self._snapshot_needed or compact
+            raise
 
-                logger.debug("Данные сохранены")
+    async def _compact(self, content: str):
+        """Атомарная замена снимка и очистка журнала"""
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as f:
+            await f.write(content)
+        os.replace(tmp_path, self.path)
+        # Сбой до очистки журнала не опасен: проигрывание его поверх нового
+        # снимка дает то же состояние
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+        self._journal_size = 0
+        logger.info(f"Журнал свернут в снимок ({len(self.data)} пользователей)")
 
-                # Удаляем бэкап после успешной записи
-                if backup_path.exists():
-                    backup_path.unlink()
+    def start(self):
+        """Запуск фоновой записи (не чаще раза в flush_interval секунд)"""
+        if self.flush_interval > 0 and self._flusher is None:
+            self._closing.clear()
+            self._flusher = asyncio.create_task(self._flush_loop())
+            logger.info(f"Фоновая запись данных: каждые {self.flush_interval} с")
 
-            except Exception as e:
-                logger.error(f"Ошибка сохранения данных: {e}")
-                # Восстанавливаем из бэкапа
-                if backup_path.exists():
-                    if self.path.exists():
-                        self.path.unlink()
-                    backup_path.rename(self.path)
+    async def _flush_loop(self):
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def close(self):
+        """Остановка фоновой записи и финальный сброс на диск"""
+        if self._flusher is not None:
+            self._closing.set()
+            await self._flusher
+            self._flusher = None
+        if self._journal_size or self._pending:
+            self._snapshot_needed = True
+            self._dirty = True
+        await self.flush()
+
+    @staticmethod
+    def _new_user(now: str) -> Dict[str, Any]:
+        return {
+            "score": 0,
+            "answered": 0,
+            "correct": 0,
+            "games_played": 0,
+            "riddles_solved": 0,
+            "words_guessed": 0,
+            "streak": 0,
+            "last_day": "",
+            "max_streak": 0,
+            "achievements": [],
+            "created_at": now,
+            "last_activity": now,
+            "total_time_played": 0,
+            "favorite_category": "",
+            "level": 1
+        }
 
     def ensure_user(self, user_id: int) -> Dict[str, Any]:
         """Создание пользователя если не существует"""
         uid = str(user_id)
         if uid not in self.data:
             now = datetime.now().isoformat()
-            self.data[uid] = {
-                "score": 0,
-                "answered": 0,
-                "correct": 0,
-                "games_played": 0,
-                "riddles_solved": 0,
-                "words_guessed": 0,
-                "streak": 0,
-                "last_day": "",
-                "max_streak": 0,
-                "achievements": [],
-                "created_at": now,
-                "last_activity": now,
-                "total_time_played": 0,
-                "favorite_category": "",
-                "level": 1
-            }
+            self.data[uid] = self._new_user(now)
+            self._record(uid, None, self.data[uid], ts=now)
+            self._reindex(uid, self.data[uid])
         return self.data[uid]
 
+    async def apply(self, user_id: int, deltas: Dict[str, int], touch_streak: bool = False,
+                    values: Optional[Dict[str, Any]] = None) -> ApplyResult:
+        """Применить несколько изменений пользователя за одну операцию.
+
+        Приращения deltas и значения values применяются вместе, достижения
+        проверяются один раз, данные сохраняются один раз.
+        """
+        uid = str(user_id)
+        user = self.ensure_user(user_id)
+        now = datetime.now().isoformat()
+        for field, amount in deltas.items():
+            user[field] = user.get(field, 0) + amount
+            self._record(uid, field, user[field], delta=amount, ts=now)
+        if deltas:
+            user["last_activity"] = now
+        for field, value in (values or {}).items():
+            user[field] = value
+            self._record(uid, field, value, ts=now)
+        if "score" in deltas or (values and "score" in values):
+            self._reindex(uid, user)
+        streak_updated = self._touch_streak(uid, user) if touch_streak else False
+        unlocked = self._unlock_achievements(uid, user)
+        await self._persist()
+        return ApplyResult(user, unlocked, streak_updated)
+
     async def update_stat(self, user_id: int, field: str, amount: int):
         """Обновление статистики пользователя"""
-        user = self.ensure_user(user_id)
-        user[field] += amount
-        user["last_activity"] = datetime.now().isoformat()
-        await self._check_achievements(user_id)
-        await self.save()
+        await self.apply(user_id, {field: amount})
 
     async def update_score(self, user_id: int, delta: int):
         """Обновление очков пользователя"""
         await self.update_stat(user_id, "score", delta)
 
+    async def set_fields(self, user_id: int, **fields):
+        """Установка значений полей пользователя"""
+        await self.apply(user_id, {}, values=fields)
+
     async def add_achievement(self, user_id: int, achievement_key: str) -> bool:
         """Добавление достижения пользователю"""
         user = self.ensure_user(user_id)
-        name = self._achievements.get(achievement_key, achievement_key)
-        if name not in user["achievements"]:
-            user["achievements"].append(name)
-            await self.save()
-            logger.info(f"Пользователь {user_id} получил достижение: {name}")
+        if self._grant(str(user_id), user, [achievement_key]):
+            await self._persist()
             return True
         return False
 
     async def update_streak(self, user_id: int) -> tuple[int, bool]:
         """Обновление серии ответов пользователя"""
         user = self.ensure_user(user_id)
+        updated = self._touch_streak(str(user_id), user)
+        if updated:
+            await self._persist()
+        return user["streak"], updated
+
+    def _touch_streak(self, uid: str, user: Dict[str, Any]) -> bool:
         today = datetime.now().date().isoformat()
         last = user["last_day"]
-        updated = False
-        if last != today:
-            yesterday = (datetime.now().date() - timedelta(days=1)).isoformat()
-            user["streak"] = user["streak"] + 1 if last == yesterday else 1
-            user["last_day"] = today
-            user["max_streak"] = max(user["max_streak"], user["streak"])
-            await self.save()
-            updated = True
-        return user["streak"], updated
+        if last == today:
+            return False
+        yesterday = (datetime.now().date() - timedelta(days=1)).isoformat()
+        user["streak"] = user["streak"] + 1 if last == yesterday else 1
+        user["last_day"] = today
+        user["max_streak"] = max(user["max_streak"], user["streak"])
+        for field in ("streak", "last_day", "max_streak"):
+            self._record(uid, field, user[field])
+        return True
+
+    def _grant(self, uid: str, user: Dict[str, Any], keys: List[str]) -> List[str]:
+        """Выдать достижения, которых еще нет; возвращает новые названия"""
+        unlocked = []
+        for key in keys:
+            name = self._achievements.get(key, key)
+            if name not in user["achievements"]:
+                user["achievements"].append(name)
+                unlocked.append(name)
+                logger.info(f"Пользователь {uid} получил достижение: {name}")
+        if unlocked:
+            self._record(uid, "achievements", user["achievements"])
+        return unlocked
 
-    async def _check_achievements(self, user_id: int):
-        user = self.data[str(user_id)]
+    def _unlock_achievements(self, uid: str, user: Dict[str, Any]) -> List[str]:
+        keys = []
         # Очки
         if user["score"] >= 1000:
-            await self.add_achievement(user_id, "score_1000")
+            keys.append("score_1000")
         elif user["score"] >= 500:
-            await self.add_achievement(user_id, "score_500")
+            keys.append("score_500")
         elif user["score"] >= 100:
-            await self.add_achievement(user_id, "score_100")
+            keys.append("score_100")
         # Серии
         if user["streak"] >= 30:
-            await self.add_achievement(user_id, "streak_30")
+            keys.append("streak_30")
         elif user["streak"] >= 7:
-            await self.add_achievement(user_id, "streak_7")
+            keys.append("streak_7")
         elif user["streak"] >= 3:
-            await self.add_achievement(user_id, "streak_3")
+            keys.append("streak_3")
         # Активность
         if user["correct"] >= 50:
-            await self.add_achievement(user_id, "quiz_master")
+            keys.append("quiz_master")
         elif user["answered"] >= 1:
-            await self.add_achievement(user_id, "first_answer")
+            keys.append("first_answer")
         if user["riddles_solved"] >= 20:
-            await self.add_achievement(user_id, "riddle_solver")
+            keys.append("riddle_solver")
         if user["words_guessed"] >= 10:
-            await self.add_achievement(user_id, "word_champion")
+            keys.append("word_champion")
+        return self._grant(uid, user, keys)
 
     def get_info(self, user_id: int) -> Dict[str, Any]:
         """Получение информации о пользователе"""
         return self.ensure_user(user_id)
 
-    def get_leaderboard(self, limit: int = 10) -> list:
-        """Получение таблицы лидеров"""
-        return sorted(self.data.items(), key=lambda x: x[1]["score"], reverse=True)[:limit]
+    def _reindex(self, uid: str, user: Dict[str, Any]):
+        if not self._ranking_stale:
+            self._ranking.update(uid, user["score"])
+
+    def _fresh_ranking(self) -> LeaderboardIndex:
+        if self._ranking_stale:
+            self._ranking.rebuild(self.data)
+            self._ranking_stale = False
+        return self._ranking
+
+    def get_leaderboard(self, limit: int = 10, offset: int = 0) -> list:
+        """Получение таблицы лидеров (срез с позиции offset)"""
+        return [(uid, self.data[uid]) for uid in self._fresh_ranking().top(limit, offset)]
+
+    def get_rank(self, user_id: int) -> Optional[int]:
+        """Место пользователя в рейтинге (с 1) или None"""
+        return self._fresh_ranking().rank(str(user_id))
+
+    def get_around(self, user_id: int, radius: int = 2) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Пользователь и его соседи по рейтингу: [(место, uid, данные), ...]"""
+        rank = self.get_rank(user_id)
+        if rank is None:
+            return []
+        offset = max(rank - 1 - radius, 0)
+        leaders = self.get_leaderboard(rank - offset + radius, offset=offset)
+        return [(offset + i, uid, info) for i, (uid, info) in enumerate(leaders, 1)]
+
+    def count_users(self) -> int:
+        """Количество пользователей"""
+        return len(self.data)
+
+    def user_ids_after(self, after: str = "", limit: int = 1000) -> List[str]:
+        """Следующие limit id пользователей после after (по возрастанию строк).
+
+        Для обхода всех пользователей страницами: следующая страница
+        начинается после последнего id предыдущей.
+        """
+        return self._fresh_ranking().ids_after(after, limit)
 
     async def get_stats_summary(self) -> Dict[str, Any]:
         if not self.data:
@@ -182,8 +470,339 @@ class UserData:
             "average_score": round(avg, 2)
         }
 
+class SqliteUserData(UserData):
+    """Хранение пользователей в SQLite: одна строка на пользователя.
+
+    В памяти держатся только пользователи, затронутые с момента последней
+    записи (self.data), остальные читаются из базы по запросу.
+
+    Строку того же пользователя мог изменить другой процесс (при
+    BOT_WORKERS > 1 - например, админ из своего воркера), пока здесь лежит
+    ее копия. Поэтому при записи строка перечитывается в той же транзакции
+    и на нее накладываются только свои изменения: приращения прибавляются,
+    установленные значения записываются. Целиком пишутся только новые
+    пользователи и строки после save().
+    """
+
+    def __init__(self, db_path: str = 'user_data.db', json_path: str = 'user_data.json',
+                 flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(json_path, flush_interval)
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        # Строки, записываемые целиком
+        self._changed: Set[str] = set()
+        # Изменения по полям: ("add", приращение) или ("set", значение)
+        self._ops: Dict[str, Dict[str, Tuple[str, Any]]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                score INTEGER NOT NULL DEFAULT 0,
+                answered INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("DROP INDEX IF EXISTS idx_users_score")
+        conn.execute("DROP INDEX IF EXISTS idx_users_rank")
+        # Порядок рейтинга как в LeaderboardIndex: очки по убыванию, при
+        # равенстве - user_id по возрастанию
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_leaderboard ON users(score DESC, user_id ASC)")
+        conn.commit()
+        return conn
+
+    async def load(self):
+        """Открытие базы и импорт user_data.json при первом запуске"""
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+            self.data = {}
+            count = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            if count == 0 and self.path.exists():
+                async with aiofiles.open(self.path, 'r', encoding='utf-8') as f:
+                    imported = json.loads(await f.read())
+                self._upsert(imported.items())
+                count = len(imported)
+                logger.info(f"Импортировано {count} пользователей из {self.path}")
+            logger.info(f"База {self.db_path}: {count} пользователей")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки данных: {e}")
+
+    def _upsert(self, users):
+        self._upsert_rows(users)
+        self._conn.commit()
+
+    def _upsert_rows(self, users):
+        self._conn.executemany(
+            """
+            INSERT INTO users (user_id, score, answered, data) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                score = excluded.score,
+                answered = excluded.answered,
+                data = excluded.data
+            """,
+            [(uid, user["score"], user["answered"], json.dumps(user, ensure_ascii=False))
+             for uid, user in users]
+        )
+
+    def _sync_pending(self):
+        """Запись измененных строк и очистка кеша"""
+        # Строки, которые только читались, не перезаписываются: их может
+        # менять другой процесс бота
+        if self._changed or self._ops:
+            # IMMEDIATE: между чтением и записью строку не изменит другой процесс
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = [(uid, self.data[uid]) for uid in self._changed if uid in self.data]
+                for uid, ops in self._ops.items():
+                    if uid in self._changed or uid not in self.data:
+                        continue
+                    row = self._conn.execute("SELECT data FROM users WHERE user_id = ?", (uid,)).fetchone()
+                    rows.append((uid, self._merge(json.loads(row[0]), ops) if row else self.data[uid]))
+                self._upsert_rows(rows)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        self._changed = set()
+        self._ops = {}
+        self.data = {}
+
+    @staticmethod
+    def _merge(user: Dict[str, Any], ops: Dict[str, Tuple[str, Any]]) -> Dict[str, Any]:
+        """Наложить свои изменения на строку, прочитанную из базы"""
+        for field, (kind, value) in ops.items():
+            user[field] = user.get(field, 0) + value if kind == "add" else value
+        return user
+
+    def _record(self, uid: str, field: Optional[str], value: Any,
+                delta: Optional[int] = None, ts: Optional[str] = None):
+        # Журнал не нужен: изменения накладываются на строку при записи
+        if field is None:
+            self._changed.add(uid)
+        else:
+            ops = self._ops.setdefault(uid, {})
+            previous = ops.get(field)
+            if delta is None:
+                ops[field] = ("set", value)
+            elif previous is None or previous[0] == "add":
+                ops[field] = ("add", (previous[1] if previous else 0) + delta)
+            else:
+                ops[field] = ("set", value)
+            if delta is not None and ts is not None:
+                ops["last_activity"] = ("set", ts)
+        self._dirty = True
+        self._bump_version(uid)
+
+    async def save(self):
+        # Изменения в обход _record могли затронуть любую строку из кеша
+        self._changed.update(self.data)
+        await super().save()
+
+    async def _write(self):
+        self._sync_pending()
+        logger.debug("Данные сохранены")
+
+    def _unsaved(self) -> Dict[str, Dict[str, Any]]:
+        """Измененные и еще не записанные строки из кеша.
+
+        Запросы к рейтингу накладывают их на результат из базы, а не
+        записывают перед каждым чтением.
+        """
+        return {uid: self.data[uid] for uid in self._changed.union(self._ops) if uid in self.data}
+
+    def _stored(self, uids) -> Dict[str, Tuple[int, int]]:
+        """Очки и число ответов этих пользователей в базе"""
+        uids = list(uids)
+        stored = {}
+        for i in range(0, len(uids), 500):
+            chunk = uids[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT user_id, score, answered FROM users WHERE user_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            stored.update((uid, (score, answered)) for uid, score, answered in rows)
+        return stored
+
+    def _with_data(self, uids: List[str], pending: Dict[str, Dict[str, Any]]) -> list:
+        """[(uid, данные), ...] в порядке uids"""
+        users = dict(pending)
+        missing = [uid for uid in uids if uid not in users]
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT user_id, data FROM users WHERE user_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            users.update((uid, json.loads(data)) for uid, data in rows)
+        return [(uid, users[uid]) for uid in uids]
+
+    def ensure_user(self, user_id: int) -> Dict[str, Any]:
+        uid = str(user_id)
+        user = self.data.get(uid)
+        if user is not None:
+            return user
+        row = self._conn.execute("SELECT data FROM users WHERE user_id = ?", (uid,)).fetchone()
+        if row is not None:
+            user = json.loads(row[0])
+            self.data[uid] = user
+            # Строку мог изменить другой процесс: тексты по старой копии устарели
+            self._bump_version(uid)
+            return user
+        # Новый пользователь будет записан при следующем сбросе
+        return super().ensure_user(user_id)
+
+    def _reindex(self, uid: str, user: Dict[str, Any]):
+        # Рейтинг строится по индексу idx_users_leaderboard
+        pass
+
+    def get_leaderboard(self, limit: int = 10, offset: int = 0) -> list:
+        pending = self._unsaved()
+        if not pending:
+            rows = self._conn.execute(
+                "SELECT user_id, data FROM users ORDER BY score DESC, user_id ASC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+            return [(uid, json.loads(data)) for uid, data in rows]
+        # Несохраненные строки могут сдвинуть страницу не больше чем на
+        # len(pending) позиций: берем из индекса столько же лишних ключей
+        rows = self._conn.execute(
+            "SELECT user_id, score FROM users ORDER BY score DESC, user_id ASC LIMIT ?",
+            (offset + limit + len(pending),)
+        ).fetchall()
+        keys = [(-score, uid) for uid, score in rows if uid not in pending]
+        keys += [(-user["score"], uid) for uid, user in pending.items()]
+        keys.sort()
+        return self._with_data([uid for _, uid in keys[offset:offset + limit]], pending)
+
+    def get_rank(self, user_id: int) -> Optional[int]:
+        uid = str(user_id)
+        pending = self._unsaved()
+        user = pending.get(uid)
+        if user is not None:
+            score = user["score"]
+        else:
+            row = self._conn.execute("SELECT score FROM users WHERE user_id = ?", (uid,)).fetchone()
+            if row is None:
+                return None
+            score = row[0]
+        above = self._conn.execute(
+            "SELECT COUNT(*) FROM users WHERE score > ? OR (score = ? AND user_id < ?)",
+            (score, score, uid)
+        ).fetchone()[0]
+        if pending:
+            key = (-score, uid)
+            above -= sum(1 for u, (s, _) in self._stored(pending).items() if (-s, u) < key)
+            above += sum(1 for u, info in pending.items() if (-info["score"], u) < key)
+        return above + 1
+
+    def _neighbours(self, uid: str, score: int, radius: int, pending: Dict[str, Dict[str, Any]],
+                    higher: bool) -> List[str]:
+        """Ближайшие radius соседей выше (higher) или ниже по рейтингу"""
+        # Сначала соседи с теми же очками, затем с большими (меньшими)
+        limit = radius + len(pending)
+        if higher:
+            rows = self._conn.execute(
+                "SELECT user_id, score FROM users WHERE score = ? AND user_id < ? "
+                "ORDER BY user_id DESC LIMIT ?",
+                (score, uid, limit)
+            ).fetchall()
+            if len(rows) < limit:
+                rows += self._conn.execute(
+                    "SELECT user_id, score FROM users WHERE score > ? "
+                    "ORDER BY score ASC, user_id DESC LIMIT ?",
+                    (score, limit - len(rows))
+                ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT user_id, score FROM users WHERE score = ? AND user_id > ? "
+                "ORDER BY user_id ASC LIMIT ?",
+                (score, uid, limit)
+            ).fetchall()
+            if len(rows) < limit:
+                rows += self._conn.execute(
+                    "SELECT user_id, score FROM users WHERE score < ? "
+                    "ORDER BY score DESC, user_id ASC LIMIT ?",
+                    (score, limit - len(rows))
+                ).fetchall()
+        key = (-score, uid)
+        keys = [(-s, u) for u, s in rows if u not in pending]
+        keys += [(-info["score"], u) for u, info in pending.items()
+                 if u != uid and ((-info["score"], u) < key) == higher]
+        keys.sort(reverse=higher)
+        return [u for _, u in keys[:radius]]
+
+    def get_around(self, user_id: int, radius: int = 2) -> List[Tuple[int, str, Dict[str, Any]]]:
+        # Соседей выбираем по индексу от позиции пользователя, без OFFSET
+        rank = self.get_rank(user_id)
+        if rank is None:
+            return []
+        uid = str(user_id)
+        user = self.ensure_user(user_id)
+        score = user["score"]
+        pending = self._unsaved()
+        above = self._neighbours(uid, score, radius, pending, higher=True)
+        below = self._neighbours(uid, score, radius, pending, higher=False)
+        rows = self._with_data(above[::-1] + [uid] + below, pending)
+        first = rank - len(above)
+        return [(first + i, u, info) for i, (u, info) in enumerate(rows)]
+
+    def count_users(self) -> int:
+        count = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        pending = self._unsaved()
+        if pending:
+            count += len(pending.keys() - self._stored(pending).keys())
+        return count
+
+    def user_ids_after(self, after: str = "", limit: int = 1000) -> List[str]:
+        rows = self._conn.execute(
+            "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, limit)
+        ).fetchall()
+        ids = [row[0] for row in rows]
+        # Новые пользователи, которых еще нет в базе
+        candidates = [uid for uid in self._unsaved() if uid > after]
+        if candidates:
+            stored = self._stored(candidates)
+            ids = sorted(set(ids).union(uid for uid in candidates if uid not in stored))[:limit]
+        return ids
+
+    async def get_stats_summary(self) -> Dict[str, Any]:
+        total_users, total_score, total_answers = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(score), 0), COALESCE(SUM(answered), 0) FROM users"
+        ).fetchone()
+        pending = self._unsaved()
+        if pending:
+            stored = self._stored(pending)
+            total_users += len(pending.keys() - stored.keys())
+            total_score += sum(user["score"] for user in pending.values()) - sum(s for s, _ in stored.values())
+            total_answers += (sum(user["answered"] for user in pending.values())
+                              - sum(a for _, a in stored.values()))
+        if not total_users:
+            return {"total_users": 0}
+        return {
+            "total_users": total_users,
+            "total_score": total_score,
+            "total_answers": total_answers,
+            "average_score": round(total_score / total_users, 2)
+        }
+
+    async def close(self):
+        await super().close()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def create_user_data() -> UserData:
+    """Создание хранилища по настройке DATA_BACKEND"""
+    if DATA_BACKEND == "sqlite":
+        return SqliteUserData(DATA_DB_PATH, DATA_PATH)
+    return UserData(DATA_PATH)
+
 # Глобальный экземпляр
-user_data = UserData()
+user_data = create_user_data()
 
 async def init_data():
     await user_data.load()
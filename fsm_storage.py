@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from typing import Any, Dict, Optional, Tuple
+from cachetools import TTLCache
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+# Хранилище состояний FSM: sqlite (по умолчанию) или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "fsm_state.db")
+# Время жизни неактивного состояния (секунды)
+FSM_TTL = float(os.getenv("FSM_TTL", str(24 * 3600)))
+# Интервал пакетной записи (секунды)
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "2"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "50000"))
+
+# (состояние, данные)
+Record = Tuple[Optional[str], Dict[str, Any]]
+_EMPTY: Record = (None, {})
+
+
+class SqliteStorage(BaseStorage):
+    """Состояния FSM в SQLite с кешем в памяти и пакетной записью.
+
+    Изменения копятся в памяти и записываются одной транзакцией раз в
+    flush_interval секунд. Запись, не менявшаяся ttl секунд, считается
+    пустой и удаляется из базы. Данные хранятся в JSON, поэтому в состоянии
+    допустимы только сериализуемые значения.
+    """
+
+    def __init__(self, path: str = FSM_DB_PATH, ttl: float = FSM_TTL,
+                 flush_interval: float = FSM_FLUSH_INTERVAL, cache_size: int = FSM_CACHE_SIZE,
+                 key_builder: Optional[KeyBuilder] = None):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # Кеш хранит и пустые записи, чтобы не ходить в базу на каждое обновление
+        self._cache: TTLCache = TTLCache(maxsize=cache_size, ttl=ttl)
+        # Ключ -> (состояние, данные в JSON), ожидающие записи
+        self._dirty: Dict[str, Tuple[Optional[str], str]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL,
+                expires REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_expires ON fsm(expires)")
+        self._conn.execute("DELETE FROM fsm WHERE expires < ?", (time.time(),))
+        self._conn.commit()
+
+    def _read(self, key: StorageKey) -> Tuple[str, Record]:
+        db_key = self._key_builder.build(key)
+        record = self._cache.get(db_key)
+        if record is None:
+            # Запись могла уйти из кеша, не дождавшись сброса на диск
+            row = self._dirty.get(db_key) or self._conn.execute(
+                "SELECT state, data FROM fsm WHERE key = ? AND expires >= ?", (db_key, time.time())
+            ).fetchone()
+            record = (row[0], json.loads(row[1])) if row else _EMPTY
+            self._cache[db_key] = record
+        return db_key, record
+
+    def _write(self, db_key: str, record: Record):
+        # Сериализуем сразу: несериализуемые данные - ошибка обработчика, а не сброса
+        payload = json.dumps(record[1], ensure_ascii=False)
+        self._cache[db_key] = record
+        self._dirty[db_key] = (record[0], payload)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        db_key, (_, data) = self._read(key)
+        self._write(db_key, (state.state if isinstance(state, State) else state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._read(key)[1][0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        db_key, (state, _) = self._read(key)
+        self._write(db_key, (state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._read(key)[1][1].copy()
+
+    def flush(self):
+        """Записать накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        now = time.time()
+        upserts = []
+        deletes = []
+        for db_key, (state, payload) in batch.items():
+            if state is None and payload == "{}":
+                deletes.append((db_key,))
+            else:
+                upserts.append((db_key, state, payload, now + self.ttl))
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fsm (key, state, data, expires) VALUES (?, ?, ?, ?)", upserts
+            )
+            self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            self._conn.execute("DELETE FROM fsm WHERE expires < ?", (now,))
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка записи состояний FSM: {e}")
+            self._conn.rollback()
+            # Более новые изменения важнее неудачной партии
+            batch.update(self._dirty)
+            self._dirty = batch
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        self.flush()
+        self._conn.close()
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Создание хранилища FSM по настройке FSM_STORAGE"""
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SqliteStorage()
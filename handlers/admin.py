@@ -1,19 +1,27 @@
 import os
 import logging
+from datetime import datetime
+from typing import Union
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import BaseFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from data import user_data
+from admins import AdminRegistry
+from broadcast import broadcaster, daily_quiz_text, ANNOUNCEMENT, DAILY_QUIZ, RUNNING, DONE, CANCELLED
+from templates import templates
+import metrics
 
 # Получаем список админов из переменных окружения
 admin_ids_str = os.getenv("ADMIN_IDS", "")
 if admin_ids_str.strip():
-    ADMIN_IDS = set(map(int, admin_ids_str.split(',')))
+    initial_admin_ids = set(map(int, admin_ids_str.split(',')))
 else:
     # По умолчанию ваш Telegram ID
-    ADMIN_IDS = {1009310689}
+    initial_admin_ids = {1009310689}
+# Вместе с назначенными через админ-панель (сохраняются в ADMINS_PATH)
+ADMIN_IDS = AdminRegistry(initial_admin_ids)
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -24,12 +32,222 @@ class AdminStates(StatesGroup):
     waiting_points_grant = State()
     waiting_user_id_reset = State()
     waiting_user_id_fullaccess = State()
+    waiting_broadcast_text = State()
 
 class IsAdmin(BaseFilter):
-    async def __call__(self, message: Message) -> bool:
-        is_admin = message.from_user.id in ADMIN_IDS
-        logger.info(f"Проверка админ-прав для пользователя {message.from_user.id}: {is_admin}")
-        return is_admin
+    async def __call__(self, event: Union[Message, CallbackQuery]) -> bool:
+        return event.from_user is not None and event.from_user.id in ADMIN_IDS
+
+# Фильтр на весь роутер: сообщения и нажатия не-админов отсеиваются одной
+# проверкой, до перебора обработчиков
+router.message.filter(IsAdmin())
+router.callback_query.filter(IsAdmin())
+
+ADMIN_MENU_TEXT = templates.register("admin.menu", """
+🔧 <b>АДМИН-ПАНЕЛЬ</b> 🔧
+
+Добро пожаловать в панель администратора!
+Выберите необходимое действие:
+
+💰 <b>Выдать очки</b> - начислить очки пользователю
+🔄 <b>Сбросить данные</b> - обнулить статистику пользователя
+🔑 <b>Полный доступ</b> - предоставить админские права
+📊 <b>Статистика</b> - общая статистика бота
+👥 <b>Список пользователей</b> - активные пользователи
+🔧 <b>Системная информация</b> - техническая информация
+📢 <b>Рассылка</b> - объявление или вопрос дня всем пользователям
+
+<i>Используйте кнопки ниже для навигации</i>
+""")
+
+GRANT_PROMPT_TEXT = templates.register("admin.grant_prompt", """
+💰 <b>ВЫДАЧА ОЧКОВ</b>
+
+Введите ID пользователя, которому хотите начислить очки:
+
+<i>Пример: 123456789</i>
+
+❗️ Для отмены отправьте /cancel
+""")
+
+GRANT_POINTS_TEXT = templates.register("admin.grant_points", """
+💰 <b>ВЫДАЧА ОЧКОВ</b>
+
+Пользователь: <code>{user_id}</code>
+
+Введите количество очков для начисления:
+
+<i>Пример: 100</i>
+<i>Для отрицательных значений: -50</i>
+
+❗️ Для отмены отправьте /cancel
+""")
+
+GRANT_CONFIRM_TEXT = templates.register("admin.grant_confirm", """
+💰 <b>ПОДТВЕРЖДЕНИЕ ВЫДАЧИ ОЧКОВ</b>
+
+Пользователь: <code>{user_id}</code>
+Очки: <b>{points:+}</b>
+
+Подтвердите действие:
+""")
+
+GRANT_DONE_TEXT = templates.register("admin.grant_done", """
+✅ <b>ОЧКИ УСПЕШНО НАЧИСЛЕНЫ</b>
+
+Пользователь: <code>{user_id}</code>
+Начислено: <b>{points:+}</b> очков
+Было: <b>{old_score}</b> очков
+Стало: <b>{new_score}</b> очков
+
+Операция выполнена успешно!
+""")
+
+RESET_PROMPT_TEXT = templates.register("admin.reset_prompt", """
+🔄 <b>СБРОС ДАННЫХ ПОЛЬЗОВАТЕЛЯ</b>
+
+Введите ID пользователя, данные которого хотите сбросить:
+
+<i>Пример: 123456789</i>
+
+⚠️ <b>ВНИМАНИЕ!</b> Эта операция сбросит:
+• Очки (score)
+• Отвеченные вопросы (answered)
+• Правильные ответы (correct)
+• Игры (games_played)
+• Загадки (riddles_solved)
+• Угаданные слова (words_guessed)
+• Текущую серию (streak)
+• Максимальную серию (max_streak)
+• Достижения (achievements)
+
+❗️ Для отмены отправьте /cancel
+""")
+
+RESET_CONFIRM_TEXT = templates.register("admin.reset_confirm", """
+🔄 <b>ПОДТВЕРЖДЕНИЕ СБРОСА ДАННЫХ</b>
+
+Пользователь: <code>{user_id}</code>
+Текущие очки: <b>{score}</b>
+Игр сыграно: <b>{games_played}</b>
+
+⚠️ <b>ВСЕ ДАННЫЕ БУДУТ УДАЛЕНЫ!</b>
+
+Подтвердите действие:
+""")
+
+RESET_DONE_TEXT = templates.register("admin.reset_done", """
+✅ <b>ДАННЫЕ УСПЕШНО СБРОШЕНЫ</b>
+
+Пользователь: <code>{user_id}</code>
+
+<b>Сброшенные данные:</b>
+• Очки: <s>{score}</s> → 0
+• Игры: <s>{games_played}</s> → 0
+• Достижения: <s>{achievements_count}</s> → 0
+
+Все статистики обнулены!
+""")
+
+FULLACCESS_PROMPT_TEXT = templates.register("admin.fullaccess_prompt", """
+🔑 <b>ПРЕДОСТАВЛЕНИЕ ПОЛНОГО ДОСТУПА</b>
+
+Введите ID пользователя, которому хотите предоставить админские права:
+
+<i>Пример: 123456789</i>
+
+⚠️ <b>ВНИМАНИЕ!</b> Пользователь получит:
+• Доступ к админ-панели
+• Возможность управлять другими пользователями
+• Полные права в системе
+
+❗️ Для отмены отправьте /cancel
+""")
+
+FULLACCESS_CONFIRM_TEXT = templates.register("admin.fullaccess_confirm", """
+🔑 <b>ПОДТВЕРЖДЕНИЕ ВЫДАЧИ ПРАВ</b>
+
+Пользователь: <code>{user_id}</code>
+Текущий статус: {status}
+
+{notice}
+
+Подтвердите действие:
+""")
+
+FULLACCESS_DONE_TEXT = templates.register("admin.fullaccess_done", """
+✅ <b>ПРАВА УСПЕШНО {status}</b>
+
+Пользователь: <code>{user_id}</code>
+Новый статус: <b>Администратор</b>
+
+🔑 Пользователь теперь имеет полный доступ к системе!
+""")
+
+STATS_TEXT = templates.register("admin.stats", """
+📊 <b>СТАТИСТИКА БОТА</b>
+
+<b>Общая информация:</b>
+👥 Всего пользователей: <b>{total_users}</b>
+🎮 Активных пользователей: <b>{active_users}</b>
+🔑 Администраторов: <b>{admin_users}</b>
+
+<b>Игровая статистика:</b>
+🎯 Всего игр: <b>{total_games}</b>
+💰 Общий счет: <b>{total_score}</b>
+📈 Среднее очков на игрока: <b>{average_score}</b>
+
+<b>ТОП-5 игроков:</b>
+{top_list}
+
+<i>Обновлено: сейчас</i>
+""")
+
+SYSTEM_INFO_TEXT = templates.register("admin.system_info", """
+🔧 <b>СИСТЕМНАЯ ИНФОРМАЦИЯ</b>
+
+<b>Платформа:</b>
+🖥 Система: <code>{platform_info}</code>
+🐍 Python: <code>{python_version}</code>
+
+<b>Ресурсы:</b>
+{memory_info}
+{data_info}
+
+<b>Статус:</b>
+✅ Бот работает
+🕐 Проверка: {start_time}
+
+<b>Нагрузка (самые затратные обработчики):</b>
+{load}
+
+<b>Администраторы:</b>
+{admins}
+
+<i>Обновлено: сейчас</i>
+""")
+
+BROADCASTS_TEXT = templates.register("admin.broadcasts", """
+📢 <b>РАССЫЛКИ</b>
+
+👥 Пользователей: <b>{total_users}</b>
+🚫 Недоступны (пропускаются): <b>{unreachable}</b>
+
+<b>Последние рассылки:</b>
+{jobs}
+
+<i>✅ отправлено | 🚫 заблокировали | ⚠️ ошибки | ⏭ пропущено</i>
+🕐 Обновлено: {updated}
+""")
+
+BROADCAST_PROMPT_TEXT = templates.register("admin.broadcast_prompt", """
+📢 <b>НОВОЕ ОБЪЯВЛЕНИЕ</b>
+
+Отправьте текст объявления одним сообщением.
+Форматирование (жирный, курсив, ссылки) сохранится.
+
+❗️ Для отмены отправьте /cancel
+""")
 
 def get_admin_menu():
     """Создает главное админское меню"""
@@ -47,6 +265,7 @@ def get_admin_menu():
             InlineKeyboardButton(text="🔧 Системная информация", callback_data="admin_system_info")
         ],
         [
+            InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast"),
             InlineKeyboardButton(text="❌ Закрыть меню", callback_data="admin_close")
         ]
     ])
@@ -68,29 +287,15 @@ def get_confirmation_menu(action_data: str):
     ])
 
 # Отладочный хэндлер для проверки
-@router.message(IsAdmin(), F.text == '/test_admin')
+@router.message(F.text == '/test_admin')
 async def test_admin(message: Message):
     """Тестовая админ-команда"""
     await message.answer(f"✅ Админ-права работают! Ваш ID: {message.from_user.id}")
 
-@router.message(IsAdmin(), F.text.in_(['/admin', '/panel']))
+@router.message(F.text.in_(['/admin', '/panel']))
 async def admin_panel(message: Message):
     """Главная команда админ-панели"""
-    admin_text = """
-🔧 <b>АДМИН-ПАНЕЛЬ</b> 🔧
-
-Добро пожаловать в панель администратора!
-Выберите необходимое действие:
-
-💰 <b>Выдать очки</b> - начислить очки пользователю
-🔄 <b>Сбросить данные</b> - обнулить статистику пользователя
-🔑 <b>Полный доступ</b> - предоставить админские права
-📊 <b>Статистика</b> - общая статистика бота
-👥 <b>Список пользователей</b> - активные пользователи
-🔧 <b>Системная информация</b> - техническая информация
-
-<i>Используйте кнопки ниже для навигации</i>
-    """
+    admin_text = ADMIN_MENU_TEXT.static
 
     await message.answer(
         admin_text,
@@ -101,21 +306,7 @@ async def admin_panel(message: Message):
 @router.callback_query(F.data == "admin_menu")
 async def show_admin_menu(callback: CallbackQuery):
     """Показать главное админское меню"""
-    admin_text = """
-🔧 <b>АДМИН-ПАНЕЛЬ</b> 🔧
-
-Добро пожаловать в панель администратора!
-Выберите необходимое действие:
-
-💰 <b>Выдать очки</b> - начислить очки пользователю
-🔄 <b>Сбросить данные</b> - обнулить статистику пользователя
-🔑 <b>Полный доступ</b> - предоставить админские права
-📊 <b>Статистика</b> - общая статистика бота
-👥 <b>Список пользователей</b> - активные пользователи
-🔧 <b>Системная информация</b> - техническая информация
-
-<i>Используйте кнопки ниже для навигации</i>
-    """
+    admin_text = ADMIN_MENU_TEXT.static
 
     await callback.message.edit_text(
         admin_text,
@@ -128,15 +319,7 @@ async def start_grant_points(callback: CallbackQuery, state: FSMContext):
     """Начать процесс выдачи очков"""
     await state.set_state(AdminStates.waiting_user_id_grant)
 
-    text = """
-💰 <b>ВЫДАЧА ОЧКОВ</b>
-
-Введите ID пользователя, которому хотите начислить очки:
-
-<i>Пример: 123456789</i>
-
-❗️ Для отмены отправьте /cancel
-    """
+    text = GRANT_PROMPT_TEXT.static
 
     await callback.message.edit_text(
         text,
@@ -144,7 +327,7 @@ async def start_grant_points(callback: CallbackQuery, state: FSMContext):
         parse_mode='HTML'
     )
 
-@router.message(AdminStates.waiting_user_id_grant, IsAdmin())
+@router.message(AdminStates.waiting_user_id_grant)
 async def process_user_id_grant(message: Message, state: FSMContext):
     """Обработать ID пользователя для выдачи очков"""
     if message.text == '/cancel':
@@ -156,18 +339,7 @@ async def process_user_id_grant(message: Message, state: FSMContext):
         await state.update_data(user_id=user_id)
         await state.set_state(AdminStates.waiting_points_grant)
 
-        text = f"""
-💰 <b>ВЫДАЧА ОЧКОВ</b>
-
-Пользователь: <code>{user_id}</code>
-
-Введите количество очков для начисления:
-
-<i>Пример: 100</i>
-<i>Для отрицательных значений: -50</i>
-
-❗️ Для отмены отправьте /cancel
-        """
+        text = GRANT_POINTS_TEXT.render(user_id=user_id)
 
         await message.answer(text, parse_mode='HTML')
 
@@ -177,7 +349,7 @@ async def process_user_id_grant(message: Message, state: FSMContext):
             "Введите числовой ID пользователя:"
         )
 
-@router.message(AdminStates.waiting_points_grant, IsAdmin())
+@router.message(AdminStates.waiting_points_grant)
 async def process_points_grant(message: Message, state: FSMContext):
     """Обработать количество очков для выдачи"""
     if message.text == '/cancel':
@@ -190,14 +362,7 @@ async def process_points_grant(message: Message, state: FSMContext):
         user_id = data['user_id']
 
         # Подтверждение действия
-        text = f"""
-💰 <b>ПОДТВЕРЖДЕНИЕ ВЫДАЧИ ОЧКОВ</b>
-
-Пользователь: <code>{user_id}</code>
-Очки: <b>{points:+}</b>
-
-Подтвердите действие:
-        """
+        text = GRANT_CONFIRM_TEXT.render(user_id=user_id, points=points)
 
         await state.update_data(points=points)
         await message.answer(
@@ -225,18 +390,12 @@ async def confirm_grant_points(callback: CallbackQuery, state: FSMContext):
         old_score = user_info.get('score', 0)
 
         await user_data.update_score(user_id, points)
+        await user_data.flush()
         new_score = old_score + points
 
-        success_text = f"""
-✅ <b>ОЧКИ УСПЕШНО НАЧИСЛЕНЫ</b>
-
-Пользователь: <code>{user_id}</code>
-Начислено: <b>{points:+}</b> очков
-Было: <b>{old_score}</b> очков
-Стало: <b>{new_score}</b> очков
-
-Операция выполнена успешно!
-        """
+        success_text = GRANT_DONE_TEXT.render(
+            user_id=user_id, points=points, old_score=old_score, new_score=new_score
+        )
 
         await callback.message.edit_text(
             success_text,
@@ -261,26 +420,7 @@ async def start_reset_user(callback: CallbackQuery, state: FSMContext):
     """Начать процесс сброса данных пользователя"""
     await state.set_state(AdminStates.waiting_user_id_reset)
 
-    text = """
-🔄 <b>СБРОС ДАННЫХ ПОЛЬЗОВАТЕЛЯ</b>
-
-Введите ID пользователя, данные которого хотите сбросить:
-
-<i>Пример: 123456789</i>
-
-⚠️ <b>ВНИМАНИЕ!</b> Эта операция сбросит:
-• Очки (score)
-• Отвеченные вопросы (answered)
-• Правильные ответы (correct)
-• Игры (games_played)
-• Загадки (riddles_solved)
-• Угаданные слова (words_guessed)
-• Текущую серию (streak)
-• Максимальную серию (max_streak)
-• Достижения (achievements)
-
-❗️ Для отмены отправьте /cancel
-    """
+    text = RESET_PROMPT_TEXT.static
 
     await callback.message.edit_text(
         text,
@@ -288,7 +428,7 @@ async def start_reset_user(callback: CallbackQuery, state: FSMContext):
         parse_mode='HTML'
     )
 
-@router.message(AdminStates.waiting_user_id_reset, IsAdmin())
+@router.message(AdminStates.waiting_user_id_reset)
 async def process_reset_user(message: Message, state: FSMContext):
     """Обработать сброс данных пользователя"""
     if message.text == '/cancel':
@@ -301,17 +441,9 @@ async def process_reset_user(message: Message, state: FSMContext):
         # Проверяем, существует ли пользователь
         user_info = user_data.ensure_user(user_id)
 
-        text = f"""
-🔄 <b>ПОДТВЕРЖДЕНИЕ СБРОСА ДАННЫХ</b>
-
-Пользователь: <code>{user_id}</code>
-Текущие очки: <b>{user_info.get('score', 0)}</b>
-Игр сыграно: <b>{user_info.get('games_played', 0)}</b>
-
-⚠️ <b>ВСЕ ДАННЫЕ БУДУТ УДАЛЕНЫ!</b>
-
-Подтвердите действие:
-        """
+        text = RESET_CONFIRM_TEXT.render(
+            user_id=user_id, score=user_info.get('score', 0), games_played=user_info.get('games_played', 0)
+        )
 
         await state.update_data(user_id=user_id)
         await message.answer(
@@ -346,24 +478,12 @@ async def confirm_reset_user(callback: CallbackQuery, state: FSMContext):
         reset_fields = ['score', 'answered', 'correct', 'games_played',
                         'riddles_solved', 'words_guessed', 'streak', 'max_streak']
 
-        for field in reset_fields:
-            user_info[field] = 0
-        user_info['achievements'] = []
-
-        await user_data.save()
-
-        success_text = f"""
-✅ <b>ДАННЫЕ УСПЕШНО СБРОШЕНЫ</b>
-
-Пользователь: <code>{user_id}</code>
-
-<b>Сброшенные данные:</b>
-• Очки: <s>{old_data['score']}</s> → 0
-• Игры: <s>{old_data['games_played']}</s> → 0
-• Достижения: <s>{old_data['achievements_count']}</s> → 0
+        await user_data.set_fields(
+            user_id, achievements=[], **{field: 0 for field in reset_fields}
+        )
+        await user_data.flush()
 
-Все статистики обнулены!
-        """
+        success_text = RESET_DONE_TEXT.render(old_data, user_id=user_id)
 
         await callback.message.edit_text(
             success_text,
@@ -388,20 +508,7 @@ async def start_full_access(callback: CallbackQuery, state: FSMContext):
     """Начать процесс выдачи полного доступа"""
     await state.set_state(AdminStates.waiting_user_id_fullaccess)
 
-    text = """
-🔑 <b>ПРЕДОСТАВЛЕНИЕ ПОЛНОГО ДОСТУПА</b>
-
-Введите ID пользователя, которому хотите предоставить админские права:
-
-<i>Пример: 123456789</i>
-
-⚠️ <b>ВНИМАНИЕ!</b> Пользователь получит:
-• Доступ к админ-панели
-• Возможность управлять другими пользователями
-• Полные права в системе
-
-❗️ Для отмены отправьте /cancel
-    """
+    text = FULLACCESS_PROMPT_TEXT.static
 
     await callback.message.edit_text(
         text,
@@ -409,7 +516,7 @@ async def start_full_access(callback: CallbackQuery, state: FSMContext):
         parse_mode='HTML'
     )
 
-@router.message(AdminStates.waiting_user_id_fullaccess, IsAdmin())
+@router.message(AdminStates.waiting_user_id_fullaccess)
 async def process_full_access(message: Message, state: FSMContext):
     """Обработать выдачу полного доступа"""
     if message.text == '/cancel':
@@ -420,18 +527,14 @@ async def process_full_access(message: Message, state: FSMContext):
         user_id = int(message.text.strip())
 
         user_info = user_data.ensure_user(user_id)
-        is_already_admin = user_info.get('is_admin', False)
-
-        text = f"""
-🔑 <b>ПОДТВЕРЖДЕНИЕ ВЫДАЧИ ПРАВ</b>
-
-Пользователь: <code>{user_id}</code>
-Текущий статус: {'Уже админ' if is_already_admin else 'Обычный пользователь'}
+        is_already_admin = user_id in ADMIN_IDS or user_info.get('is_admin', False)
 
-{'⚠️ Пользователь уже имеет админские права!' if is_already_admin else '🔓 Пользователь получит полный доступ!'}
-
-Подтвердите действие:
-        """
+        text = FULLACCESS_CONFIRM_TEXT.render(
+            user_id=user_id,
+            status='Уже админ' if is_already_admin else 'Обычный пользователь',
+            notice=('⚠️ Пользователь уже имеет админские права!' if is_already_admin
+                    else '🔓 Пользователь получит полный доступ!')
+        )
 
         await state.update_data(user_id=user_id, is_already_admin=is_already_admin)
         await message.answer(
@@ -454,24 +557,15 @@ async def confirm_full_access(callback: CallbackQuery, state: FSMContext):
         user_id = data['user_id']
         was_admin = data['is_already_admin']
 
-        user_info = user_data.ensure_user(user_id)
-        user_info['is_admin'] = True
-
         # Добавляем в список админов
         ADMIN_IDS.add(user_id)
 
-        await user_data.save()
+        await user_data.set_fields(user_id, is_admin=True)
+        await user_data.flush()
 
         status_text = "подтверждены" if was_admin else "предоставлены"
 
-        success_text = f"""
-✅ <b>ПРАВА УСПЕШНО {status_text.upper()}</b>
-
-Пользователь: <code>{user_id}</code>
-Новый статус: <b>Администратор</b>
-
-🔑 Пользователь теперь имеет полный доступ к системе!
-        """
+        success_text = FULLACCESS_DONE_TEXT.render(status=status_text.upper(), user_id=user_id)
 
         await callback.message.edit_text(
             success_text,
@@ -512,24 +606,15 @@ async def show_admin_stats(callback: CallbackQuery):
             games = data.get('games_played', 0)
             top_list += f"{i}. ID: <code>{uid}</code> | {score} очков | {games} игр\n"
 
-        stats_text = f"""
-📊 <b>СТАТИСТИКА БОТА</b>
-
-<b>Общая информация:</b>
-👥 Всего пользователей: <b>{total_users}</b>
-🎮 Активных пользователей: <b>{active_users}</b>
-🔑 Администраторов: <b>{admin_users}</b>
-
-<b>Игровая статистика:</b>
-🎯 Всего игр: <b>{total_games}</b>
-💰 Общий счет: <b>{total_score}</b>
-📈 Среднее очков на игрока: <b>{total_score // max(active_users, 1)}</b>
-
-<b>ТОП-5 игроков:</b>
-{top_list}
-
-<i>Обновлено: сейчас</i>
-        """
+        stats_text = STATS_TEXT.render(
+            total_users=total_users,
+            active_users=active_users,
+            admin_users=admin_users,
+            total_games=total_games,
+            total_score=total_score,
+            average_score=total_score // max(active_users, 1),
+            top_list=top_list
+        )
 
         await callback.message.edit_text(
             stats_text,
@@ -589,7 +674,6 @@ async def show_system_info(callback: CallbackQuery):
     """Показать системную информацию"""
     try:
         import sys
-        import psutil
         import platform
         from datetime import datetime
 
@@ -599,6 +683,7 @@ async def show_system_info(callback: CallbackQuery):
 
         # Память (если доступно)
         try:
+            import psutil
             memory = psutil.virtual_memory()
             memory_info = f"💾 Память: {memory.percent}% ({memory.used // 1024 // 1024} MB)"
         except:
@@ -614,40 +699,167 @@ async def show_system_info(callback: CallbackQuery):
         except:
             data_info = "📦 Размер данных: недоступно"
 
-        system_text = f"""
-🔧 <b>СИСТЕМНАЯ ИНФОРМАЦИЯ</b>
+        system_text = SYSTEM_INFO_TEXT.render(
+            platform_info=platform_info,
+            python_version=python_version,
+            memory_info=memory_info,
+            data_info=data_info,
+            start_time=start_time,
+            load=metrics.registry.summary(),
+            admins=', '.join(f'<code>{admin_id}</code>' for admin_id in ADMIN_IDS)
+        )
 
-<b>Платформа:</b>
-🖥 Система: <code>{platform_info}</code>
-🐍 Python: <code>{python_version}</code>
+        await callback.message.edit_text(
+            system_text,
+            reply_markup=get_back_menu(),
+            parse_mode='HTML'
+        )
 
-<b>Ресурсы:</b>
-{memory_info}
-{data_info}
+    except Exception as e:
+        logger.error(f'Ошибка получения системной информации: {e}')
+        await callback.message.edit_text(
+            "❌ <b>ОШИБКА</b>\n\nНе удалось получить системную информацию.",
+            reply_markup=get_back_menu(),
+            parse_mode='HTML'
+        )
 
-<b>Статус:</b>
-✅ Бот работает
-🕐 Проверка: {start_time}
+BROADCAST_KINDS = {ANNOUNCEMENT: "Объявление", DAILY_QUIZ: "Вопрос дня"}
+BROADCAST_STATUSES = {RUNNING: "⏳ идет", DONE: "✅ завершена", CANCELLED: "⛔ остановлена"}
 
-<b>Администраторы:</b>
-{', '.join(f'<code>{admin_id}</code>' for admin_id in ADMIN_IDS)}
+@router.callback_query(F.data == "admin_broadcast")
+async def show_broadcasts(callback: CallbackQuery):
+    """Показать последние рассылки и их прогресс"""
+    try:
+        jobs = broadcaster.recent()
+        lines = []
+        for job in jobs:
+            lines.append(
+                f"<b>#{job.id}</b> {BROADCAST_KINDS.get(job.kind, job.kind)} - "
+                f"{BROADCAST_STATUSES.get(job.status, job.status)}\n"
+                f"✅ {job.sent} | 🚫 {job.blocked} | ⚠️ {job.failed} | ⏭ {job.skipped}"
+            )
+
+        text = BROADCASTS_TEXT.render(
+            total_users=user_data.count_users(),
+            unreachable=broadcaster.unreachable_count(),
+            jobs='\n'.join(lines) if lines else 'Рассылок еще не было',
+            updated=datetime.now().strftime("%H:%M:%S")
+        )
 
-<i>Обновлено: сейчас</i>
-        """
+        buttons = [
+            [
+                InlineKeyboardButton(text="✍️ Объявление", callback_data="admin_broadcast_new"),
+                InlineKeyboardButton(text="🧠 Вопрос дня", callback_data="admin_broadcast_daily")
+            ]
+        ]
+        for job in jobs:
+            if job.status == RUNNING:
+                buttons.append([InlineKeyboardButton(
+                    text=f"⛔ Остановить #{job.id}", callback_data=f"admin_broadcast_cancel_{job.id}"
+                )])
+        buttons.append([
+            InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_broadcast"),
+            InlineKeyboardButton(text="🔙 Назад в меню", callback_data="admin_menu")
+        ])
 
         await callback.message.edit_text(
-            system_text,
-            reply_markup=get_back_menu(),
+            text,
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
             parse_mode='HTML'
         )
 
     except Exception as e:
-        logger.error(f'Ошибка получения системной информации: {e}')
+        logger.error(f'Ошибка получения рассылок: {e}')
         await callback.message.edit_text(
-            "❌ <b>ОШИБКА</b>\n\nНе удалось получить системную информацию.",
+            "❌ <b>ОШИБКА</b>\n\nНе удалось получить список рассылок.",
+            reply_markup=get_back_menu(),
+            parse_mode='HTML'
+        )
+
+@router.callback_query(F.data == "admin_broadcast_new")
+async def start_broadcast(callback: CallbackQuery, state: FSMContext):
+    """Начать подготовку объявления"""
+    await state.set_state(AdminStates.waiting_broadcast_text)
+
+    text = BROADCAST_PROMPT_TEXT.static
+
+    await callback.message.edit_text(
+        text,
+        reply_markup=get_back_menu(),
+        parse_mode='HTML'
+    )
+
+@router.message(AdminStates.waiting_broadcast_text)
+async def process_broadcast_text(message: Message, state: FSMContext):
+    """Показать предпросмотр объявления"""
+    if message.text == '/cancel':
+        await state.clear()
+        return await admin_panel(message)
+
+    if not message.text:
+        await message.answer("❌ Отправьте объявление текстом:")
+        return
+
+    await state.update_data(broadcast_text=message.html_text, broadcast_kind=ANNOUNCEMENT)
+    await message.answer("📢 <b>ПРЕДПРОСМОТР ОБЪЯВЛЕНИЯ</b>", parse_mode='HTML')
+    await message.answer(message.html_text, parse_mode='HTML')
+    await message.answer(
+        f"Объявление получат все пользователи (<b>{user_data.count_users()}</b>), "
+        "кроме заблокировавших бота.\n\nПодтвердите отправку:",
+        reply_markup=get_confirmation_menu("broadcast"),
+        parse_mode='HTML'
+    )
+
+@router.callback_query(F.data == "admin_broadcast_daily")
+async def prepare_daily_broadcast(callback: CallbackQuery, state: FSMContext):
+    """Подготовить внеочередной вопрос дня"""
+    text = await daily_quiz_text()
+    await state.update_data(broadcast_text=text, broadcast_kind=DAILY_QUIZ)
+
+    await callback.message.edit_text(
+        f"🧠 <b>ВОПРОС ДНЯ</b>\n\nВсе пользователи получат сообщение:\n\n{text}\n\nПодтвердите отправку:",
+        reply_markup=get_confirmation_menu("broadcast"),
+        parse_mode='HTML'
+    )
+
+@router.callback_query(F.data == "confirm_broadcast")
+async def confirm_broadcast(callback: CallbackQuery, state: FSMContext):
+    """Запустить рассылку"""
+    data = await state.get_data()
+    await state.clear()
+    text = data.get('broadcast_text')
+    if not text:
+        await callback.message.edit_text(
+            "❌ <b>ОШИБКА</b>\n\nТекст рассылки не найден. Подготовьте ее заново.",
             reply_markup=get_back_menu(),
             parse_mode='HTML'
         )
+        return
+
+    job_id = broadcaster.create(data.get('broadcast_kind', ANNOUNCEMENT), text, created_by=callback.from_user.id)
+    broadcaster.start(callback.bot, job_id)
+
+    await callback.message.edit_text(
+        f"✅ <b>РАССЫЛКА #{job_id} ЗАПУЩЕНА</b>\n\n"
+        "Прогресс - в разделе «Рассылка», по завершении придет отчет.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📢 Рассылки", callback_data="admin_broadcast")],
+            [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="admin_menu")]
+        ]),
+        parse_mode='HTML'
+    )
+    logger.info(f"Админ {callback.from_user.id} запустил рассылку #{job_id}")
+
+@router.callback_query(F.data.startswith("admin_broadcast_cancel_"))
+async def cancel_broadcast(callback: CallbackQuery):
+    """Остановить рассылку"""
+    job_id = int(callback.data.rsplit("_", 1)[1])
+    if broadcaster.cancel(job_id):
+        await callback.answer(f"Рассылка #{job_id} остановлена")
+        logger.info(f"Админ {callback.from_user.id} остановил рассылку #{job_id}")
+    else:
+        await callback.answer(f"Рассылка #{job_id} уже завершена")
+    await show_broadcasts(callback)
 
 @router.callback_query(F.data == "admin_close")
 async def close_admin_panel(callback: CallbackQuery):
@@ -659,7 +871,7 @@ async def close_admin_panel(callback: CallbackQuery):
     )
 
 # Обработка отмены во время ввода
-@router.message(F.text == '/cancel', IsAdmin())
+@router.message(F.text == '/cancel')
 async def cancel_admin_action(message: Message, state: FSMContext):
     """Отменить текущее админское действие"""
     await state.clear()
@@ -667,7 +879,7 @@ async def cancel_admin_action(message: Message, state: FSMContext):
     await admin_panel(message)
 
 # Старые команды для совместимости
-@router.message(IsAdmin(), F.text.startswith('/grant'))
+@router.message(F.text.startswith('/grant'))
 async def old_grant_command(message: Message):
     """Обработка старой команды /grant с переадресацией на новый интерфейс"""
     await message.answer(
@@ -678,7 +890,7 @@ async def old_grant_command(message: Message):
         ])
     )
 
-@router.message(IsAdmin(), F.text.startswith('/reset'))
+@router.message(F.text.startswith('/reset'))
 async def old_reset_command(message: Message):
     """Обработка старой команды /reset с переадресацией на новый интерфейс"""
     await message.answer(
@@ -689,7 +901,7 @@ async def old_reset_command(message: Message):
         ])
     )
 
-@router.message(IsAdmin(), F.text.startswith('/fullaccess'))
+@router.message(F.text.startswith('/fullaccess'))
 async def old_fullaccess_command(message: Message):
     """Обработка старой команды /fullaccess с переадресацией на новый интерфейс"""
     await message.answer(
@@ -1,14 +1,16 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message, CallbackQuery
+from callbacks import Action, GameCallback, RpsCallback
 from keyboards import games_menu, rps_keyboard, back_button, main_menu
 from data import user_data
 import logging
 import random
+from typing import Awaitable, Callable, Dict
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-@router.callback_query(F.data == "games")
+@router.callback_query(Action("games"))
 async def games_menu_callback(callback: CallbackQuery):
     """Показать меню игр"""
     await callback.message.edit_text(
@@ -17,25 +19,16 @@ async def games_menu_callback(callback: CallbackQuery):
     )
     await callback.answer()
 
-@router.callback_query(F.data.startswith("game:"))
-async def game_handler(callback: CallbackQuery):
+@router.callback_query(GameCallback.filter())
+async def game_handler(callback: CallbackQuery, callback_data: GameCallback):
     """Обработчик игр"""
-    game_type = callback.data.split(":")[1]
+    game_type = callback_data.game
     user_id = callback.from_user.id
 
     try:
-        if game_type == "dice":
-            await play_dice(callback, user_id)
-        elif game_type == "coin":
-            await play_coin(callback, user_id)
-        elif game_type == "roulette":
-            await play_roulette(callback, user_id)
-        elif game_type == "number":
-            await play_number_guess(callback, user_id)
-        elif game_type == "rps":
-            await show_rps_menu(callback)
-        elif game_type == "double_dice":
-            await play_double_dice(callback, user_id)
+        play = GAMES.get(game_type)
+        if play is not None:
+            await play(callback, user_id)
         else:
             await callback.message.edit_text(
                 "❌ Неизвестная игра",
@@ -58,17 +51,14 @@ async def play_dice(callback: CallbackQuery, user_id: int):
     if user_roll > bot_roll:
         result = "🎉 Ты выиграл!"
         points = 3
-        await user_data.update_score(user_id, points)
     elif user_roll < bot_roll:
         result = "😔 Ты проиграл!"
         points = -1
-        await user_data.update_score(user_id, points)
     else:
         result = "🤝 Ничья!"
         points = 1
-        await user_data.update_score(user_id, points)
 
-    await user_data.update_stat(user_id, "games_played", 1)
+    await user_data.apply(user_id, {"score": points, "games_played": 1})
 
     text = f"""
 🎲 <b>Игра в кубик</b>
@@ -90,13 +80,11 @@ async def play_coin(callback: CallbackQuery, user_id: int):
     if user_choice == result:
         outcome = "🎉 Угадал!"
         points = 2
-        await user_data.update_score(user_id, points)
     else:
         outcome = "😔 Не угадал!"
         points = -1
-        await user_data.update_score(user_id, points)
 
-    await user_data.update_stat(user_id, "games_played", 1)
+    await user_data.apply(user_id, {"score": points, "games_played": 1})
 
     text = f"""
 🪙 <b>Игра в монетку</b>
@@ -128,8 +116,7 @@ async def play_roulette(callback: CallbackQuery, user_id: int):
         result = "😔 Не повезло!"
         points = -1
 
-    await user_data.update_score(user_id, points)
-    await user_data.update_stat(user_id, "games_played", 1)
+    await user_data.apply(user_id, {"score": points, "games_played": 1})
 
     text = f"""
 🎰 <b>Рулетка</b>
@@ -158,8 +145,7 @@ async def play_number_guess(callback: CallbackQuery, user_id: int):
         result = "😔 Не угадал!"
         points = -1
 
-    await user_data.update_score(user_id, points)
-    await user_data.update_stat(user_id, "games_played", 1)
+    await user_data.apply(user_id, {"score": points, "games_played": 1})
 
     text = f"""
 🎯 <b>Угадай число (1-10)</b>
@@ -198,8 +184,7 @@ async def play_double_dice(callback: CallbackQuery, user_id: int):
         points += 2
         result += "\n🎊 Бонус за дубль: +2"
 
-    await user_data.update_score(user_id, points)
-    await user_data.update_stat(user_id, "games_played", 1)
+    await user_data.apply(user_id, {"score": points, "games_played": 1})
 
     text = f"""
 🎲🎲 <b>Два кубика</b>
@@ -213,17 +198,27 @@ async def play_double_dice(callback: CallbackQuery, user_id: int):
 
     await callback.message.edit_text(text, reply_markup=games_menu())
 
-async def show_rps_menu(callback: CallbackQuery):
+async def show_rps_menu(callback: CallbackQuery, user_id: int):
     """Показать меню камень-ножницы-бумага"""
     await callback.message.edit_text(
         "🎮 <b>Камень-Ножницы-Бумага</b>\n\nВыбери свой ход:",
         reply_markup=rps_keyboard()
     )
 
-@router.callback_query(F.data.startswith("rps:"))
-async def rps_game(callback: CallbackQuery):
+# Игра по кнопке "game:<игра>"
+GAMES: Dict[str, Callable[[CallbackQuery, int], Awaitable[None]]] = {
+    "dice": play_dice,
+    "coin": play_coin,
+    "roulette": play_roulette,
+    "number": play_number_guess,
+    "rps": show_rps_menu,
+    "double_dice": play_double_dice,
+}
+
+@router.callback_query(RpsCallback.filter())
+async def rps_game(callback: CallbackQuery, callback_data: RpsCallback):
     """Игра камень-ножницы-бумага"""
-    user_choice = callback.data.split(":")[1]
+    user_choice = callback_data.choice
     user_id = callback.from_user.id
 
     choices = ["rock", "scissors", "paper"]
@@ -248,8 +243,7 @@ async def rps_game(callback: CallbackQuery):
         result = "😔 Ты проиграл!"
         points = -1
 
-    await user_data.update_score(user_id, points)
-    await user_data.update_stat(user_id, "games_played", 1)
+    await user_data.apply(user_id, {"score": points, "games_played": 1})
 
     text = f"""
 🎮 <b>Камень-Ножницы-Бумага</b>
@@ -1,43 +1,19 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, CommandStart
-from keyboards import main_menu, help_keyboard, stats_keyboard, pagination_keyboard
+from callbacks import Action, LeaderboardCallback
+from keyboards import main_menu, help_keyboard, stats_keyboard, pagination_keyboard, menu_with_back
 from data import user_data
+from broadcast import broadcaster
+from templates import templates, RenderCache
 import logging
 from datetime import datetime
+from typing import Any, Dict
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-@router.message(CommandStart())
-async def start_command(message: Message):
-    """Обработчик команды /start"""
-    user_id = message.from_user.id
-    username = message.from_user.username or message.from_user.first_name
-
-    # Регистрируем пользователя
-    user_info = user_data.get_info(user_id)
-
-    welcome_text = f"""
-🎉 <b>Добро пожаловать в Quiz Bot, {username}!</b>
-
-🧠 <b>Викторина</b> - проверь свои знания
-🎲 <b>Игры</b> - развлекись с мини-играми  
-🧩 <b>Загадки</b> - разгадай головоломки
-🔤 <b>Угадай слово</b> - классическая игра
-📊 <b>Статистика</b> - отслеживай прогресс
-🏆 <b>Достижения</b> - собирай награды
-
-💡 <i>Отвечай правильно, зарабатывай очки и открывай достижения!</i>
-"""
-
-    await message.answer(welcome_text, reply_markup=main_menu())
-    logger.info(f"Пользователь {user_id} ({username}) запустил бота")
-
-@router.message(Command("help"))
-async def help_command(message: Message):
-    """Обработчик команды /help"""
-    help_text = """
+HELP_TEXT = templates.register("main.help", """
 📖 <b>Помощь по боту</b>
 
 <b>Основные команды:</b>
@@ -45,6 +21,7 @@ async def help_command(message: Message):
 /help - Эта справка
 /stats - Моя статистика
 /top - Рейтинг игроков
+/rank - Мое место в рейтинге
 
 <b>Как играть:</b>
 • Выбирай категории и отвечай на вопросы
@@ -63,112 +40,206 @@ async def help_command(message: Message):
 
 <b>Достижения:</b>
 Выполняй различные задания и получай особые награды!
-"""
+""")
 
-    await message.answer(help_text, reply_markup=help_keyboard())
+HELP_SHORT_TEXT = templates.register("main.help_short", """
+❓ <b>Помощь</b>
 
-@router.message(Command("stats"))
-async def stats_command(message: Message):
-    """Обработчик команды /stats"""
-    await show_user_stats(message, message.from_user.id)
+<b>Как пользоваться ботом:</b>
+1. Выбери раздел в главном меню
+2. Отвечай на вопросы, набирай очки
+3. Следи за своей статистикой
+4. Собирай достижения
 
-@router.message(Command("top"))
-async def top_command(message: Message):
-    """Обработчик команды /top"""
-    await show_leaderboard(message)
+<b>Система очков:</b>
+• Легкие вопросы: +2 очка
+• Средние вопросы: +4 очка  
+• Сложные вопросы: +6 очков
+• Загадки: +3 очка
+• Угаданные слова: +5 очков
+• Неправильный ответ: -1 очко
 
-@router.callback_query(F.data == "back_to_main")
-async def back_to_main(callback: CallbackQuery):
-    """Возврат в главное меню"""
-    await callback.message.edit_text(
-        "🏠 <b>Главное меню</b>\n\nВыбери, что хочешь делать:",
-        reply_markup=main_menu()
-    )
-    await callback.answer()
+<b>Советы:</b>
+• Играй каждый день для поддержания серии
+• Изучай объяснения к вопросам
+• Попробуй все категории для разнообразия
+""")
 
-@router.callback_query(F.data == "stats")
-async def stats_callback(callback: CallbackQuery):
-    """Показать статистику пользователя"""
-    await show_user_stats(callback.message, callback.from_user.id, edit=True)
-    await callback.answer()
+MAIN_MENU_TEXT = templates.register("main.menu", "🏠 <b>Главное меню</b>\n\nВыбери, что хочешь делать:")
 
-@router.callback_query(F.data == "stats:detailed")
-async def detailed_stats(callback: CallbackQuery):
-    """Подробная статистика пользователя"""
-    user_info = user_data.get_info(callback.from_user.id)
+ACHIEVEMENTS_EMPTY_TEXT = templates.register("main.achievements_empty", """
+🏆 <b>Достижения</b>
 
-    # Вычисляем дополнительные метрики
-    accuracy = 0
-    if user_info["answered"] > 0:
-        accuracy = (user_info["correct"] / user_info["answered"]) * 100
+😔 У тебя пока нет достижений.
 
-    avg_score_per_game = 0
-    if user_info["games_played"] > 0:
-        avg_score_per_game = user_info["score"] / user_info["games_played"]
+<b>Доступные достижения:</b>
+🎯 Первый ответ - ответь на первый вопрос
+🔥 Серия 3 - ответь правильно 3 раза подряд
+🔥🔥 Серия 7 - ответь правильно 7 раз подряд
+🔥🔥🔥 Серия 30 - ответь правильно 30 раз подряд
+💯 100 очков - набери 100 очков
+🏆 500 очков - набери 500 очков
+👑 1000 очков - набери 1000 очков
+🧠 Мастер викторин - ответь правильно на 50 вопросов
+🧩 Разгадчик загадок - реши 20 загадок
+📝 Чемпион слов - угадай 10 слов
 
-    # Определяем уровень игрока
-    level = calculate_user_level(user_info["score"])
+Играй больше, чтобы получить их!
+""")
+
+STATS_TEXT = templates.register("main.stats", """
+📊 <b>Твоя статистика</b>
+
+🎯 <b>Уровень:</b> {level}
+🏆 <b>Очки:</b> {score}
+❓ <b>Всего ответов:</b> {answered}
+✅ <b>Правильных:</b> {correct}
+📈 <b>Точность:</b> {accuracy:.1f}%
+
+🔥 <b>Текущая серия:</b> {streak}
+🏆 <b>Лучшая серия:</b> {max_streak}
 
-    created_date = datetime.fromisoformat(user_info["created_at"]).strftime("%d.%m.%Y")
+🎮 <b>Активность:</b>
+🧩 Загадок решено: {riddles_solved}
+🔤 Слов угадано: {words_guessed}
+🎲 Игр сыграно: {games_played}
+
+🏅 <b>Достижений:</b> {achievements_count}
+""")
 
-    detailed_text = f"""
+DETAILED_STATS_TEXT = templates.register("main.stats_detailed", """
 📊 <b>Подробная статистика</b>
 
 👤 <b>Общая информация:</b>
 🎯 Уровень: {level}
 📅 Дата регистрации: {created_date}
-🏆 Общий счет: {user_info['score']}
+🏆 Общий счет: {score}
 
 🎲 <b>Игровая активность:</b>
-❓ Всего ответов: {user_info['answered']}
-✅ Правильных: {user_info['correct']}
-❌ Неправильных: {user_info['answered'] - user_info['correct']}
+❓ Всего ответов: {answered}
+✅ Правильных: {correct}
+❌ Неправильных: {wrong}
 📈 Точность: {accuracy:.1f}%
 
 🎮 <b>По категориям:</b>
-🧠 Викторины: {user_info.get('quiz_answered', 0)}
-🧩 Загадки: {user_info['riddles_solved']}
-🔤 Слова: {user_info['words_guessed']}
-🎲 Игры: {user_info['games_played']}
+🧠 Викторины: {quiz_answered}
+🧩 Загадки: {riddles_solved}
+🔤 Слова: {words_guessed}
+🎲 Игры: {games_played}
 
 🔥 <b>Серии:</b>
-⚡ Текущая серия: {user_info['streak']}
-🏆 Лучшая серия: {user_info['max_streak']}
+⚡ Текущая серия: {streak}
+🏆 Лучшая серия: {max_streak}
 
 📊 <b>Средние показатели:</b>
 💰 Очков за игру: {avg_score_per_game:.1f}
-🎯 Достижений: {len(user_info['achievements'])}
+🎯 Достижений: {achievements_count}
+""")
+
+# Карточки статистики перерисовываются, только когда меняются данные пользователя
+STATS_CARDS = RenderCache(STATS_TEXT)
+DETAILED_STATS_CARDS = RenderCache(DETAILED_STATS_TEXT)
+
+def stats_context(user_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Контекст карточек статистики"""
+    accuracy = 0
+    if user_info["answered"] > 0:
+        accuracy = (user_info["correct"] / user_info["answered"]) * 100
+
+    avg_score_per_game = 0
+    if user_info["games_played"] > 0:
+        avg_score_per_game = user_info["score"] / user_info["games_played"]
+
+    return {
+        **user_info,
+        "level": calculate_user_level(user_info["score"]),
+        "created_date": datetime.fromisoformat(user_info["created_at"]).strftime("%d.%m.%Y"),
+        "wrong": user_info["answered"] - user_info["correct"],
+        "accuracy": accuracy,
+        "quiz_answered": user_info.get("quiz_answered", 0),
+        "avg_score_per_game": avg_score_per_game,
+        "achievements_count": len(user_info["achievements"]),
+    }
+
+@router.message(CommandStart())
+async def start_command(message: Message):
+    """Обработчик команды /start"""
+    user_id = message.from_user.id
+    username = message.from_user.username or message.from_user.first_name
+
+    # Регистрируем пользователя
+    user_info = user_data.get_info(user_id)
+    # Мог разблокировать бота: снова получает рассылки
+    broadcaster.mark_reachable(user_id)
+
+    welcome_text = f"""
+🎉 <b>Добро пожаловать в Quiz Bot, {username}!</b>
+
+🧠 <b>Викторина</b> - проверь свои знания
+🎲 <b>Игры</b> - развлекись с мини-играми  
+🧩 <b>Загадки</b> - разгадай головоломки
+🔤 <b>Угадай слово</b> - классическая игра
+📊 <b>Статистика</b> - отслеживай прогресс
+🏆 <b>Достижения</b> - собирай награды
+
+💡 <i>Отвечай правильно, зарабатывай очки и открывай достижения!</i>
 """
 
+    await message.answer(welcome_text, reply_markup=main_menu())
+    logger.info(f"Пользователь {user_id} ({username}) запустил бота")
+
+@router.message(Command("help"))
+async def help_command(message: Message):
+    """Обработчик команды /help"""
+    await message.answer(HELP_TEXT.static, reply_markup=help_keyboard())
+
+@router.message(Command("stats"))
+async def stats_command(message: Message):
+    """Обработчик команды /stats"""
+    await show_user_stats(message, message.from_user.id)
+
+@router.message(Command("top"))
+async def top_command(message: Message):
+    """Обработчик команды /top"""
+    await show_leaderboard(message)
+
+@router.message(Command("rank"))
+async def rank_command(message: Message):
+    """Обработчик команды /rank"""
+    await show_my_rank(message, message.from_user.id)
+
+@router.callback_query(Action("back_to_main"))
+async def back_to_main(callback: CallbackQuery):
+    """Возврат в главное меню"""
+    await callback.message.edit_text(MAIN_MENU_TEXT.static, reply_markup=main_menu())
+    await callback.answer()
+
+@router.callback_query(Action("stats"))
+async def stats_callback(callback: CallbackQuery):
+    """Показать статистику пользователя"""
+    await show_user_stats(callback.message, callback.from_user.id, edit=True)
+    await callback.answer()
+
+@router.callback_query(Action("stats:detailed"))
+async def detailed_stats(callback: CallbackQuery):
+    """Подробная статистика пользователя"""
+    user_id = callback.from_user.id
+    user_info = user_data.get_info(user_id)
+    detailed_text = DETAILED_STATS_CARDS.render(
+        user_id, user_data.version(user_id), lambda: stats_context(user_info)
+    )
+
     await callback.message.edit_text(detailed_text, reply_markup=stats_keyboard())
     await callback.answer()
 
-@router.callback_query(F.data == "achievements")
+@router.callback_query(Action("achievements"))
 async def show_achievements(callback: CallbackQuery):
     """Показать достижения пользователя"""
     user_info = user_data.get_info(callback.from_user.id)
     achievements = user_info["achievements"]
 
     if not achievements:
-        text = """
-🏆 <b>Достижения</b>
-
-😔 У тебя пока нет достижений.
-
-<b>Доступные достижения:</b>
-🎯 Первый ответ - ответь на первый вопрос
-🔥 Серия 3 - ответь правильно 3 раза подряд
-🔥🔥 Серия 7 - ответь правильно 7 раз подряд
-🔥🔥🔥 Серия 30 - ответь правильно 30 раз подряд
-💯 100 очков - набери 100 очков
-🏆 500 очков - набери 500 очков
-👑 1000 очков - набери 1000 очков
-🧠 Мастер викторин - ответь правильно на 50 вопросов
-🧩 Разгадчик загадок - реши 20 загадок
-📝 Чемпион слов - угадай 10 слов
-
-Играй больше, чтобы получить их!
-"""
+        text = ACHIEVEMENTS_EMPTY_TEXT.static
     else:
         text = f"""
 🏆 <b>Твои достижения ({len(achievements)})</b>
@@ -182,79 +253,34 @@ async def show_achievements(callback: CallbackQuery):
     await callback.message.edit_text(text, reply_markup=main_menu())
     await callback.answer()
 
-@router.callback_query(F.data == "leaderboard")
+@router.callback_query(Action("leaderboard"))
 async def show_leaderboard_callback(callback: CallbackQuery):
     """Показать рейтинг игроков"""
     await show_leaderboard(callback.message, edit=True)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("leaderboard:page:"))
-async def leaderboard_page(callback: CallbackQuery):
+@router.callback_query(LeaderboardCallback.filter(F.action == "page"))
+async def leaderboard_page(callback: CallbackQuery, callback_data: LeaderboardCallback):
     """Показать страницу рейтинга"""
-    page = int(callback.data.split(":")[-1])
-    await show_leaderboard(callback.message, page=page, edit=True)
+    await show_leaderboard(callback.message, page=callback_data.page, edit=True)
     await callback.answer()
 
-@router.callback_query(F.data == "help")
+@router.callback_query(Action("leaderboard:me"))
+async def my_rank_callback(callback: CallbackQuery):
+    """Показать место пользователя в рейтинге"""
+    await show_my_rank(callback.message, callback.from_user.id, edit=True)
+    await callback.answer()
+
+@router.callback_query(Action("help"))
 async def help_callback(callback: CallbackQuery):
     """Показать помощь"""
-    help_text = """
-❓ <b>Помощь</b>
-
-<b>Как пользоваться ботом:</b>
-1. Выбери раздел в главном меню
-2. Отвечай на вопросы, набирай очки
-3. Следи за своей статистикой
-4. Собирай достижения
-
-<b>Система очков:</b>
-• Легкие вопросы: +2 очка
-• Средние вопросы: +4 очка  
-• Сложные вопросы: +6 очков
-• Загадки: +3 очка
-• Угаданные слова: +5 очков
-• Неправильный ответ: -1 очко
-
-<b>Советы:</b>
-• Играй каждый день для поддержания серии
-• Изучай объяснения к вопросам
-• Попробуй все категории для разнообразия
-"""
-
-    await callback.message.edit_text(help_text, reply_markup=help_keyboard())
+    await callback.message.edit_text(HELP_SHORT_TEXT.static, reply_markup=help_keyboard())
     await callback.answer()
 
 async def show_user_stats(message: Message, user_id: int, edit: bool = False):
     """Показать статистику пользователя"""
     user_info = user_data.get_info(user_id)
-
-    # Вычисляем точность
-    accuracy = 0
-    if user_info["answered"] > 0:
-        accuracy = (user_info["correct"] / user_info["answered"]) * 100
-
-    # Определяем уровень
-    level = calculate_user_level(user_info["score"])
-
-    stats_text = f"""
-📊 <b>Твоя статистика</b>
-
-🎯 <b>Уровень:</b> {level}
-🏆 <b>Очки:</b> {user_info['score']}
-❓ <b>Всего ответов:</b> {user_info['answered']}
-✅ <b>Правильных:</b> {user_info['correct']}
-📈 <b>Точность:</b> {accuracy:.1f}%
-
-🔥 <b>Текущая серия:</b> {user_info['streak']}
-🏆 <b>Лучшая серия:</b> {user_info['max_streak']}
-
-🎮 <b>Активность:</b>
-🧩 Загадок решено: {user_info['riddles_solved']}
-🔤 Слов угадано: {user_info['words_guessed']}
-🎲 Игр сыграно: {user_info['games_played']}
-
-🏅 <b>Достижений:</b> {len(user_info['achievements'])}
-"""
+    stats_text = STATS_CARDS.render(user_id, user_data.version(user_id), lambda: stats_context(user_info))
 
     if edit:
         await message.edit_text(stats_text, reply_markup=stats_keyboard())
@@ -263,19 +289,19 @@ async def show_user_stats(message: Message, user_id: int, edit: bool = False):
 
 async def show_leaderboard(message: Message, page: int = 1, edit: bool = False):
     """Показать рейтинг игроков"""
-    leaderboard = user_data.get_leaderboard(50)  # Получаем топ-50
+    total = min(user_data.count_users(), 50)  # Показываем топ-50
 
-    if not leaderboard:
+    if not total:
         text = "📊 <b>Рейтинг игроков</b>\n\n😔 Рейтинг пуст. Будь первым!"
         keyboard = main_menu()
     else:
-        # Пагинация
+        # Пагинация: берем из индекса рейтинга только текущую страницу
         items_per_page = 10
-        total_pages = (len(leaderboard) - 1) // items_per_page + 1
+        total_pages = (total - 1) // items_per_page + 1
         start_idx = (page - 1) * items_per_page
-        end_idx = start_idx + items_per_page
+        end_idx = min(start_idx + items_per_page, total)
 
-        current_page_leaders = leaderboard[start_idx:end_idx]
+        current_page_leaders = user_data.get_leaderboard(max(end_idx - start_idx, 0), offset=start_idx)
 
         text = f"📊 <b>Рейтинг игроков</b>\n<i>Страница {page}/{total_pages}</i>\n\n"
 
@@ -298,7 +324,29 @@ async def show_leaderboard(message: Message, page: int = 1, edit: bool = False):
             text += f"{medal}<b>{i}.</b> {user_display}\n"
             text += f"   🏆 {user_info['score']} очков | 📈 {accuracy:.0f}% | 🔥 {user_info['max_streak']}\n\n"
 
-        keyboard = pagination_keyboard(page, total_pages, "leaderboard")
+        keyboard = pagination_keyboard(page, total_pages, "leaderboard",
+                                       extra=[("📍 Мое место", "leaderboard:me")])
+
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard)
+    else:
+        await message.answer(text, reply_markup=keyboard)
+
+async def show_my_rank(message: Message, user_id: int, edit: bool = False):
+    """Показать место пользователя и соседей по рейтингу"""
+    user_data.get_info(user_id)  # Регистрируем пользователя, если его еще нет
+    rank = user_data.get_rank(user_id)
+    neighbours = user_data.get_around(user_id, radius=2)
+
+    text = f"📍 <b>Твое место в рейтинге</b>\n<i>{rank} из {user_data.count_users()}</i>\n\n"
+
+    for i, uid, user_info in neighbours:
+        is_me = uid == str(user_id)
+        user_display = "<b>Ты</b>" if is_me else f"User{uid[:4]}***"
+        marker = "👉 " if is_me else ""
+        text += f"{marker}<b>{i}.</b> {user_display} — 🏆 {user_info['score']} очков | 🔥 {user_info['max_streak']}\n"
+
+    keyboard = menu_with_back([("👥 Топ игроков", "leaderboard")])
 
     if edit:
         await message.edit_text(text, reply_markup=keyboard)
@@ -328,7 +376,7 @@ def calculate_user_level(score: int) -> int:
     else:
         return 10
 
-@router.callback_query(F.data == "noop")
+@router.callback_query(Action("noop"))
 async def noop_callback(callback: CallbackQuery):
     """Заглушка для неактивных кнопок"""
     await callback.answer()
\ No newline at end of file
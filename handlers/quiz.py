@@ -1,17 +1,61 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import BaseFilter  # +++
+from callbacks import Action, QuizCallback
 from keyboards import quiz_menu, back_button
 from data import user_data
 from questions import question_bank, Difficulty, Category, check_answer
+from pending_questions import PendingQuestions
+from templates import templates
 import logging
 import random
+from typing import Callable, Dict, Optional, Tuple
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-# Временное хранение текущих вопросов для пользователей
-user_questions = {}
+# Текущие вопросы пользователей (ограничены по времени и количеству)
+user_questions = PendingQuestions()
+
+QUIZ_MENU_TEXT = templates.register("quiz.menu", "🧠 <b>Викторина</b>\n\nВыбери уровень сложности:")
+
+QUESTION_TEXT = templates.register("quiz.question", """
+🧠 <b>Викторина</b>
+
+📝 <b>Вопрос:</b>
+{question}
+
+🎯 <b>Сложность:</b> {difficulty}
+💰 <b>Очков за правильный ответ:</b> {points}
+
+<i>Напиши ответ сообщением:</i>
+""")
+
+CORRECT_TEXT = templates.register("quiz.correct", """
+✅ <b>Правильно!</b>
+
+💰 <b>Получено очков:</b> +{points}
+{streak_text}
+
+📚 <b>Объяснение:</b>
+{explanation}
+
+Хочешь продолжить?
+""")
+
+WRONG_TEXT = templates.register("quiz.wrong", """
+❌ <b>Неправильно!</b>
+
+💰 <b>Потеряно очков:</b> -1
+🔥 <b>Серия сброшена</b>
+
+✅ <b>Правильный ответ:</b> {correct_answer}
+
+📚 <b>Объяснение:</b>
+{explanation}
+
+Не расстраивайся, попробуй еще раз!
+""")
 
 # --------------------------------------------------------------------------- #
 #                              ДОБАВЛЕН ФИЛЬТР                                #
@@ -22,60 +66,45 @@ class HasActiveQuiz(BaseFilter):
         return message.from_user.id in user_questions
 # --------------------------------------------------------------------------- #
 
-@router.callback_query(F.data == "quiz")
+@router.callback_query(Action("quiz"))
 async def quiz_menu_callback(callback: CallbackQuery):
     """Показать меню викторины"""
-    await callback.message.edit_text(
-        "🧠 <b>Викторина</b>\n\nВыбери уровень сложности:",
-        reply_markup=quiz_menu()
-    )
+    await callback.message.edit_text(QUIZ_MENU_TEXT.static, reply_markup=quiz_menu())
     await callback.answer()
 
-@router.callback_query(F.data.startswith("quiz:"))
-async def quiz_handler(callback: CallbackQuery):
+# Параметры вопроса (категория, сложность) по кнопке "quiz:<режим>"
+DIFFICULTIES = (Difficulty.EASY, Difficulty.MEDIUM, Difficulty.HARD)
+QUIZ_MODES: Dict[str, Callable[[], Tuple[Optional[Category], Optional[Difficulty]]]] = {
+    "easy": lambda: (None, Difficulty.EASY),
+    "medium": lambda: (None, Difficulty.MEDIUM),
+    "hard": lambda: (None, Difficulty.HARD),
+    "random": lambda: (None, random.choice(DIFFICULTIES)),
+    # Быстрая викторина - только легкие вопросы
+    "speed": lambda: (None, Difficulty.EASY),
+    # Смешанная викторина - случайная категория и сложность
+    "mixed": lambda: (random.choice(list(Category)), random.choice(DIFFICULTIES)),
+}
+
+@router.callback_query(QuizCallback.filter())
+async def quiz_handler(callback: CallbackQuery, callback_data: QuizCallback):
     """Обработчик викторины"""
-    quiz_type = callback.data.split(":")[1]
     user_id = callback.from_user.id
 
-    # Определяем параметры вопроса
-    category = None
-    difficulty = None
-
-    if quiz_type == "easy":
-        difficulty = Difficulty.EASY
-    elif quiz_type == "medium":
-        difficulty = Difficulty.MEDIUM
-    elif quiz_type == "hard":
-        difficulty = Difficulty.HARD
-    elif quiz_type == "random":
-        difficulty = random.choice([Difficulty.EASY, Difficulty.MEDIUM, Difficulty.HARD])
-    elif quiz_type == "speed":
-        # Быстрая викторина - только легкие вопросы
-        difficulty = Difficulty.EASY
-    elif quiz_type == "mixed":
-        # Смешанная викторина - случайная категория и сложность
-        category = random.choice(list(Category))
-        difficulty = random.choice([Difficulty.EASY, Difficulty.MEDIUM, Difficulty.HARD])
+    # Неизвестный режим - любой вопрос
+    mode = QUIZ_MODES.get(callback_data.level)
+    category, difficulty = mode() if mode is not None else (None, None)
 
     try:
         # Получаем вопрос
-        question = question_bank.get_question(category, difficulty)
+        question = await question_bank.get_question_async(category, difficulty)
         user_questions[user_id] = question
 
         # Определяем очки за вопрос
         points = get_question_points(question["difficulty"])
 
-        question_text = f"""
-🧠 <b>Викторина</b>
-
-📝 <b>Вопрос:</b>
-{question['q']}
-
-🎯 <b>Сложность:</b> {get_difficulty_name(question['difficulty'])}
-💰 <b>Очков за правильный ответ:</b> {points}
-
-<i>Напиши ответ сообщением:</i>
-"""
+        question_text = QUESTION_TEXT.render(
+            question=question['q'], difficulty=get_difficulty_name(question['difficulty']), points=points
+        )
 
         await callback.message.edit_text(question_text, reply_markup=back_button("quiz"))
         await callback.answer()
@@ -96,8 +125,10 @@ async def handle_quiz_answer(message: Message):
     """Обработчик ответов на вопросы викторины"""
     user_id = message.from_user.id
 
-    # Проверка более не нужна – фильтр гарантирует наличие вопроса
-    question = user_questions[user_id]
+    # Вопрос мог истечь между фильтром и обработчиком
+    question = user_questions.get(user_id)
+    if question is None:
+        return
     user_answer = message.text.strip()
 
     try:
@@ -107,55 +138,31 @@ async def handle_quiz_answer(message: Message):
 
         if is_correct:
             # Правильный ответ
-            await user_data.update_stat(user_id, "answered", 1)
-            await user_data.update_stat(user_id, "correct", 1)
-            await user_data.update_score(user_id, points)
-
-            # Обновляем серию
-            streak, streak_updated = await user_data.update_streak(user_id)
+            result = await user_data.apply(
+                user_id, {"answered": 1, "correct": 1, "score": points}, touch_streak=True
+            )
 
             streak_text = ""
-            if streak_updated:
-                streak_text = f"\n🔥 <b>Серия:</b> {streak}"
-
-            response_text = f"""
-✅ <b>Правильно!</b>
-
-💰 <b>Получено очков:</b> +{points}
-{streak_text}
-
-📚 <b>Объяснение:</b>
-{question.get('explanation', 'Молодец!')}
-
-Хочешь продолжить?
-"""
+            if result.streak_updated:
+                streak_text = f"\n🔥 <b>Серия:</b> {result.user['streak']}"
+            for achievement in result.achievements:
+                streak_text += f"\n🏆 <b>Новое достижение:</b> {achievement}"
+
+            response_text = CORRECT_TEXT.render(
+                points=points, streak_text=streak_text, explanation=question.get('explanation', 'Молодец!')
+            )
         else:
             # Неправильный ответ
-            await user_data.update_stat(user_id, "answered", 1)
-            await user_data.update_score(user_id, -1)
-
             # Сбрасываем серию
-            user_info = user_data.get_info(user_id)
-            user_info["streak"] = 0
-            await user_data.save()
+            await user_data.apply(user_id, {"answered": 1, "score": -1}, values={"streak": 0})
 
             correct_answer = question["a"][0]
-            response_text = f"""
-❌ <b>Неправильно!</b>
-
-💰 <b>Потеряно очков:</b> -1
-🔥 <b>Серия сброшена</b>
-
-✅ <b>Правильный ответ:</b> {correct_answer}
-
-📚 <b>Объяснение:</b>
-{question.get('explanation', 'Изучай больше!')}
-
-Не расстраивайся, попробуй еще раз!
-"""
+            response_text = WRONG_TEXT.render(
+                correct_answer=correct_answer, explanation=question.get('explanation', 'Изучай больше!')
+            )
 
         # Удаляем вопрос из памяти
-        del user_questions[user_id]
+        user_questions.pop(user_id)
 
         await message.answer(response_text, reply_markup=quiz_menu())
 
@@ -3,6 +3,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import StateFilter, state
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from callbacks import Action, RiddleCallback
 from keyboards import riddles_menu, back_button
 from data import user_data
 from questions import question_bank
@@ -16,7 +17,7 @@ class RiddleState(StatesGroup):
     """Состояния для игры в загадки."""
     waiting_answer = State()
 
-@router.callback_query(F.data == "riddles")
+@router.callback_query(Action("riddles"))
 async def riddles_menu_callback(callback: CallbackQuery):
     """Показать меню загадок"""
     await callback.message.edit_text(
@@ -25,10 +26,10 @@ async def riddles_menu_callback(callback: CallbackQuery):
     )
     await callback.answer()
 
-@router.callback_query(F.data.startswith("riddles:"))
-async def riddle_handler(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(RiddleCallback.filter())
+async def riddle_handler(callback: CallbackQuery, callback_data: RiddleCallback, state: FSMContext):
     """Обработчик загадок"""
-    riddle_type = callback.data.split(":")[1]
+    riddle_type = callback_data.level
     user_id = callback.from_user.id
 
     try:
@@ -71,24 +72,21 @@ async def handle_riddle_answer(message: Message, state: FSMContext):
             await state.clear()
             return
 
-        user_answer = message.text.lower().strip()
-
         # Проверяем ответ
-        correct_answers = [ans.lower() for ans in riddle["a"]]
-        is_correct = user_answer in correct_answers
+        is_correct = question_bank.check_answer(riddle, message.text)
 
         if is_correct:
             # Правильный ответ
             points = 3
-            await user_data.update_score(user_id, points)
-            await user_data.update_stat(user_id, "riddles_solved", 1)
-
-            # Обновляем серию
-            streak, streak_updated = await user_data.update_streak(user_id)
+            result = await user_data.apply(
+                user_id, {"score": points, "riddles_solved": 1}, touch_streak=True
+            )
 
             streak_text = ""
-            if streak_updated:
-                streak_text = f"\n🔥 <b>Серия:</b> {streak}"
+            if result.streak_updated:
+                streak_text = f"\n🔥 <b>Серия:</b> {result.user['streak']}"
+            for achievement in result.achievements:
+                streak_text += f"\n🏆 <b>Новое достижение:</b> {achievement}"
 
             response_text = f"""
 ✅ <b>Правильно!</b>
@@ -128,7 +126,7 @@ async def handle_riddle_answer(message: Message, state: FSMContext):
             reply_markup=riddles_menu()
         )
 
-@router.callback_query(F.data == "riddle_hint")
+@router.callback_query(Action("riddle_hint"))
 async def show_riddle_hint(callback: CallbackQuery):
     """Показать подсказку к загадке"""
     user_id = callback.from_user.id
@@ -146,7 +144,7 @@ async def show_riddle_hint(callback: CallbackQuery):
         await state.clear()
         await callback.answer("Ошибка", show_alert=True)
 
-@router.callback_query(F.data == "riddle_skip")
+@router.callback_query(Action("riddle_skip"))
 async def skip_riddle(callback: CallbackQuery):
     """Пропустить текущую загадку"""
     user_id = callback.from_user.id
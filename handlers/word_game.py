@@ -3,14 +3,18 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from callbacks import Action, WordCallback
 from keyboards import word_game_menu, back_button
 from data import user_data
 from questions import question_bank
 import logging
 import random
+from typing import Collection
 
 router = Router()
 logger = logging.getLogger(__name__)
+# Ход игры логируется на каждую букву, поэтому пишется в отдельный (прореживаемый) логгер
+trace_logger = logging.getLogger(f"{__name__}.trace")
 
 
 class WordState(StatesGroup):
@@ -19,9 +23,8 @@ class WordState(StatesGroup):
 
 
 
-def create_word_mask(word: str, guessed: set[str] = None) -> list[str]:
+def create_word_mask(word: str, guessed: Collection[str] = "") -> list[str]:
     """Возвращает список символов: либо букву, если она угадана, либо '_'."""
-    guessed = guessed or set()
     return [letter if letter in guessed else "_" for letter in word]
 
 
@@ -59,7 +62,7 @@ def get_category_hint(word: str) -> str:
     return categories.get(word, "Общие слова")
 
 
-def show_letter_hint(word: str, guessed: set[str]) -> str:
+def show_letter_hint(word: str, guessed: Collection[str]) -> str:
     """Показывает подсказку с первой или последней буквой."""
     if not guessed:
         return f"🔤 Первая буква: <b>{word[0].upper()}</b>"
@@ -68,10 +71,10 @@ def show_letter_hint(word: str, guessed: set[str]) -> str:
     return ""
 
 
-@router.callback_query(F.data == "word")
+@router.callback_query(Action("word"))
 async def word_menu_callback(callback: CallbackQuery):
     """Показать меню игры в слова."""
-    logger.info("Opened word game menu")
+    trace_logger.info("Opened word game menu")
     await callback.message.edit_text(
         "🔤 <b>Угадай слово</b>\n\nВыбери уровень сложности:",
         reply_markup=word_game_menu()
@@ -79,11 +82,11 @@ async def word_menu_callback(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("word:"))
-async def word_handler(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(WordCallback.filter())
+async def word_handler(callback: CallbackQuery, callback_data: WordCallback, state: FSMContext):
     """Старт новой игры: выбираем слово, сохраняем состояние."""
-    logger.info(f"word_handler triggered with {callback.data}")
-    word_type = callback.data.split(":", 1)[1]
+    trace_logger.info(f"word_handler triggered with {callback.data}")
+    word_type = callback_data.level
     user_id = callback.from_user.id
 
     difficulty = {
@@ -97,7 +100,7 @@ async def word_handler(callback: CallbackQuery, state: FSMContext):
 
     game = {
         "word": word,
-        "guessed_letters": set(),
+        "guessed_letters": "",  # угаданные буквы строкой: состояние хранится в JSON
         "mask": create_word_mask(word),
         "attempts": 6,
         "difficulty": difficulty,
@@ -107,7 +110,7 @@ async def word_handler(callback: CallbackQuery, state: FSMContext):
 
     await state.set_state(WordState.guessing)
     await state.update_data(game=game)
-    logger.info(f"Game started for user {user_id}: {word!r}")
+    trace_logger.info(f"Game started for user {user_id}: {word!r}")
 
     display_mask = " ".join(game["mask"])
     hint = get_word_hint(word, difficulty)
@@ -133,7 +136,7 @@ async def word_guess_handler(message: Message, state: FSMContext):
     """Обработка хода игрока, когда он в состоянии угадывания."""
     user_id = message.from_user.id
     guess = message.text.strip().lower()
-    logger.info(f"User {user_id} guessed: {guess!r}")
+    trace_logger.info(f"User {user_id} guessed: {guess!r}")
 
     data = await state.get_data()
     game = data.get("game")
@@ -142,7 +145,7 @@ async def word_guess_handler(message: Message, state: FSMContext):
         return
 
     word = game["word"]
-    guessed = game["guessed_letters"]
+    guessed = set(game["guessed_letters"])
     attempts = game["attempts"]
     points = game["points"]
 
@@ -158,7 +161,7 @@ async def word_guess_handler(message: Message, state: FSMContext):
                 guessed.update(vowels_in_word)
                 mask = create_word_mask(word, guessed)
                 game["mask"] = mask
-                game["guessed_letters"] = guessed
+                game["guessed_letters"] = "".join(sorted(guessed))
                 response = f"💡 Подсказка: открыты все гласные буквы! (осталось {2 - game['hints_used']} подсказок)"
                 await state.update_data(game=game)
             else:
@@ -172,8 +175,7 @@ async def word_guess_handler(message: Message, state: FSMContext):
             total = points + bonus
             bonus_text = f" (+{bonus} бонус!)" if bonus > 0 else ""
             response = f"🎉 Правильно! Было слово <b>{word}</b>. +{total} очков{bonus_text}."
-            await user_data.update_score(user_id, total)
-            await user_data.update_stat(user_id, "words_guessed", 1)
+            await user_data.apply(user_id, {"score": total, "words_guessed": 1})
             await state.clear()
         else:
             attempts -= 1
@@ -199,18 +201,17 @@ async def word_guess_handler(message: Message, state: FSMContext):
                     total = points + bonus
                     bonus_text = f" (+{bonus} бонус!)" if bonus > 0 else ""
                     response = f"🎉 Молодец! Слово <b>{word}</b> отгадано! +{total} очков{bonus_text}."
-                    await user_data.update_score(user_id, total)
-                    await user_data.update_stat(user_id, "words_guessed", 1)
+                    await user_data.apply(user_id, {"score": total, "words_guessed": 1})
                     await state.clear()
                 else:
                     count = word.count(letter)
                     response = f"✅ Есть буква <b>{letter}</b>! (открыто {count} букв)"
-                    game["guessed_letters"] = guessed
+                    game["guessed_letters"] = "".join(sorted(guessed))
                     await state.update_data(game=game)
             else:
                 attempts -= 1
                 game["attempts"] = attempts
-                game["guessed_letters"] = guessed
+                game["guessed_letters"] = "".join(sorted(guessed))
                 if attempts <= 0:
                     response = f"💥 Попытки закончились. Правильное слово: <b>{word}</b>."
                     await state.clear()
@@ -244,4 +245,4 @@ async def word_guess_handler(message: Message, state: FSMContext):
         status = ""
 
     await message.answer(status + response, reply_markup=back_button("word"))
-    logger.info(f"Sent to {user_id}: {status + response}")
+    trace_logger.info(f"Sent to {user_id}: {status + response}")
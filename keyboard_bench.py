@@ -0,0 +1,50 @@
+"""Микробенчмарк клавиатур: сборка заново против готовых и кешированных.
+
+Для каждой клавиатуры сравнивается время вызова без кеша (сборка
+InlineKeyboardMarkup из макета, как раньше в каждом обработчике) и
+вызова функции из keyboards.py.
+
+    python keyboard_bench.py --number 20000
+"""
+import timeit
+import argparse
+from typing import Callable, List, Tuple
+import keyboards
+from keyboards import KeyboardBuilder
+
+CASES: List[Tuple[str, Callable[[], object], Callable[[], object]]] = [
+    ("main_menu()",
+     lambda: KeyboardBuilder.make_keyboard(keyboards.MAIN_MENU_LAYOUT),
+     keyboards.main_menu),
+    ("quiz_menu()",
+     lambda: KeyboardBuilder.make_keyboard(keyboards.QUIZ_MENU_LAYOUT),
+     keyboards.quiz_menu),
+    ("games_menu()",
+     lambda: KeyboardBuilder.make_keyboard(keyboards.GAMES_MENU_LAYOUT),
+     keyboards.games_menu),
+    ('back_button("quiz")',
+     lambda: keyboards.back_button.__wrapped__("quiz"),
+     lambda: keyboards.back_button("quiz")),
+    ('pagination_keyboard(2, 10, "leaderboard", extra)',
+     lambda: keyboards._pagination_keyboard.__wrapped__(2, 10, "leaderboard", (("📍 Мое место", "leaderboard:me"),)),
+     lambda: keyboards.pagination_keyboard(2, 10, "leaderboard", extra=[("📍 Мое место", "leaderboard:me")])),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение сборки клавиатур с кешем")
+    parser.add_argument("--number", type=int, default=20000, help="вызовов на замер")
+    parser.add_argument("--repeat", type=int, default=5, help="замеров (берется лучший)")
+    args = parser.parse_args()
+
+    print(f"{'клавиатура':<50} {'сборка мкс':>11} {'кеш мкс':>9} {'ускорение':>10}")
+    for name, build, cached in CASES:
+        # Результаты должны совпадать, иначе сравнение бессмысленно
+        assert build() == cached(), name
+        built = min(timeit.repeat(build, number=args.number, repeat=args.repeat)) / args.number
+        fast = min(timeit.repeat(cached, number=args.number, repeat=args.repeat)) / args.number
+        print(f"{name:<50} {built * 1e6:>11.2f} {fast * 1e6:>9.3f} {built / fast:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,23 @@
+"""Клавиатуры бота.
+
+Статичные клавиатуры собираются один раз при импорте: функции вроде
+main_menu() возвращают один и тот же объект. Клавиатуры с параметрами
+(back_button, pagination_keyboard и т.п.) кешируются по аргументам в
+ограниченном LRU-кеше. Модели aiogram неизменяемы (frozen), поэтому
+общий объект можно отдавать всем обработчикам; списки рядов изменять
+нельзя.
+"""
+import os
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import List, Tuple, Optional
+from typing import List, Sequence, Tuple, Optional
+from callbacks import QuizCallback, GameCallback, RpsCallback, RiddleCallback, WordCallback
+
+# Размер кеша каждой клавиатуры с параметрами
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", "1024"))
+
+Layout = List[List[Tuple[str, str]]]
 
 class KeyboardBuilder:
     """Класс для создания клавиатур"""
@@ -36,57 +53,85 @@ class KeyboardBuilder:
         return builder.as_markup(**kwargs)
 
 # Основное меню
+MAIN_MENU_LAYOUT: Layout = [
+    [("🧠 Викторина", "quiz"), ("🎲 Игры", "games")],
+    [("🧩 Загадки", "riddles"), ("🔤 Угадай слово", "word")],
+    [("📊 Статистика", "stats"), ("🏆 Достижения", "achievements")],
+    [("👥 Рейтинг", "leaderboard"), ("ℹ️ Помощь", "help")]
+]
+MAIN_MENU = KeyboardBuilder.make_keyboard(MAIN_MENU_LAYOUT)
+
 def main_menu() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("🧠 Викторина", "quiz"), ("🎲 Игры", "games")],
-        [("🧩 Загадки", "riddles"), ("🔤 Угадай слово", "word")],
-        [("📊 Статистика", "stats"), ("🏆 Достижения", "achievements")],
-        [("👥 Рейтинг", "leaderboard"), ("ℹ️ Помощь", "help")]
-    ])
+    return MAIN_MENU
 
 # Меню викторины
+QUIZ_MENU_LAYOUT: Layout = [
+    [("🟢 Легкие вопросы", QuizCallback(level="easy").pack()),
+     ("🟡 Средние вопросы", QuizCallback(level="medium").pack())],
+    [("🔴 Сложные вопросы", QuizCallback(level="hard").pack()),
+     ("🎯 Случайный вопрос", QuizCallback(level="random").pack())],
+    [("🏃‍♂️ Быстрая викторина", QuizCallback(level="speed").pack()),
+     ("🎪 Смешанная викторина", QuizCallback(level="mixed").pack())],
+    [("⬅️ Назад", "back_to_main")]
+]
+QUIZ_MENU = KeyboardBuilder.make_keyboard(QUIZ_MENU_LAYOUT)
+
 def quiz_menu() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("🟢 Легкие вопросы", "quiz:easy"), ("🟡 Средние вопросы", "quiz:medium")],
-        [("🔴 Сложные вопросы", "quiz:hard"), ("🎯 Случайный вопрос", "quiz:random")],
-        [("🏃‍♂️ Быстрая викторина", "quiz:speed"), ("🎪 Смешанная викторина", "quiz:mixed")],
-        [("⬅️ Назад", "back_to_main")]
-    ])
+    return QUIZ_MENU
 
 # Меню игр
+GAMES_MENU_LAYOUT: Layout = [
+    [("🎲 Кубик", GameCallback(game="dice").pack()), ("🪙 Монета", GameCallback(game="coin").pack())],
+    [("🎰 Рулетка", GameCallback(game="roulette").pack()),
+     ("🎯 Угадай число", GameCallback(game="number").pack())],
+    [("🎮 Камень-ножницы-бумага", GameCallback(game="rps").pack()),
+     ("🎲 Два кубика", GameCallback(game="double_dice").pack())],
+    [("⬅️ Назад", "back_to_main")]
+]
+GAMES_MENU = KeyboardBuilder.make_keyboard(GAMES_MENU_LAYOUT)
+
 def games_menu() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("🎲 Кубик", "game:dice"), ("🪙 Монета", "game:coin")],
-        [("🎰 Рулетка", "game:roulette"), ("🎯 Угадай число", "game:number")],
-        [("🎮 Камень-ножницы-бумага", "game:rps"), ("🎲 Два кубика", "game:double_dice")],
-        [("⬅️ Назад", "back_to_main")]
-    ])
+    return GAMES_MENU
 
 # Меню загадок
+RIDDLES_MENU_LAYOUT: Layout = [
+    [("🧩 Простые загадки", RiddleCallback(level="easy").pack()),
+     ("🤔 Сложные загадки", RiddleCallback(level="hard").pack())],
+    [("🎭 Загадки-шутки", RiddleCallback(level="funny").pack()),
+     ("🔍 Логические загадки", RiddleCallback(level="logic").pack())],
+    [("⬅️ Назад", "back_to_main")]
+]
+RIDDLES_MENU = KeyboardBuilder.make_keyboard(RIDDLES_MENU_LAYOUT)
+
 def riddles_menu() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("🧩 Простые загадки", "riddles:easy"), ("🤔 Сложные загадки", "riddles:hard")],
-        [("🎭 Загадки-шутки", "riddles:funny"), ("🔍 Логические загадки", "riddles:logic")],
-        [("⬅️ Назад", "back_to_main")]
-    ])
+    return RIDDLES_MENU
 
 # Меню слов
+WORD_GAME_MENU_LAYOUT: Layout = [
+    [("🔤 Короткие слова", WordCallback(level="short").pack()),
+     ("📝 Длинные слова", WordCallback(level="long").pack())],
+    [("🎯 Случайное слово", WordCallback(level="random").pack()),
+     ("🏆 Топ слова", WordCallback(level="hard").pack())],
+    [("⬅️ Назад", "back_to_main")]
+]
+WORD_GAME_MENU = KeyboardBuilder.make_keyboard(WORD_GAME_MENU_LAYOUT)
+
 def word_game_menu() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("🔤 Короткие слова", "word:short"), ("📝 Длинные слова", "word:long")],
-        [("🎯 Случайное слово", "word:random"), ("🏆 Топ слова", "word:hard")],
-        [("⬅️ Назад", "back_to_main")]
-    ])
+    return WORD_GAME_MENU
 
 # Меню настроек
+SETTINGS_MENU_LAYOUT: Layout = [
+    [("🔊 Звуки", "settings:sounds"), ("🌙 Ночной режим", "settings:night")],
+    [("📊 Сбросить статистику", "settings:reset"), ("🗃️ Экспорт данных", "settings:export")],
+    [("⬅️ Назад", "back_to_main")]
+]
+SETTINGS_MENU = KeyboardBuilder.make_keyboard(SETTINGS_MENU_LAYOUT)
+
 def settings_menu() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("🔊 Звуки", "settings:sounds"), ("🌙 Ночной режим", "settings:night")],
-        [("📊 Сбросить статистику", "settings:reset"), ("🗃️ Экспорт данных", "settings:export")],
-        [("⬅️ Назад", "back_to_main")]
-    ])
+    return SETTINGS_MENU
 
 # Кнопки подтверждения
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def confirm_keyboard(action: str) -> InlineKeyboardMarkup:
     return KeyboardBuilder.make_keyboard([
         [("✅ Да", f"confirm:{action}"), ("❌ Нет", f"cancel:{action}")],
@@ -94,7 +139,13 @@ def confirm_keyboard(action: str) -> InlineKeyboardMarkup:
     ])
 
 # Навигация по страницам
-def pagination_keyboard(current_page: int, total_pages: int, prefix: str) -> InlineKeyboardMarkup:
+def pagination_keyboard(current_page: int, total_pages: int, prefix: str,
+                        extra: Optional[Sequence[Tuple[str, str]]] = None) -> InlineKeyboardMarkup:
+    return _pagination_keyboard(current_page, total_pages, prefix, tuple(extra) if extra else ())
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _pagination_keyboard(current_page: int, total_pages: int, prefix: str,
+                         extra: Tuple[Tuple[str, str], ...]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
     # Кнопки навигации
@@ -110,19 +161,29 @@ def pagination_keyboard(current_page: int, total_pages: int, prefix: str) -> Inl
     if nav_buttons:
         builder.row(*nav_buttons)
 
+    # Дополнительные кнопки
+    if extra:
+        builder.row(*(InlineKeyboardButton(text=text, callback_data=cb) for text, cb in extra))
+
     # Кнопка "Назад"
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main"))
 
     return builder.as_markup()
 
 # Клавиатура для игры в камень-ножницы-бумага
+RPS_KEYBOARD_LAYOUT: Layout = [
+    [("🗿 Камень", RpsCallback(choice="rock").pack()),
+     ("✂️ Ножницы", RpsCallback(choice="scissors").pack()),
+     ("📄 Бумага", RpsCallback(choice="paper").pack())],
+    [("⬅️ Назад", "games")]
+]
+RPS_KEYBOARD = KeyboardBuilder.make_keyboard(RPS_KEYBOARD_LAYOUT)
+
 def rps_keyboard() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("🗿 Камень", "rps:rock"), ("✂️ Ножницы", "rps:scissors"), ("📄 Бумага", "rps:paper")],
-        [("⬅️ Назад", "games")]
-    ])
+    return RPS_KEYBOARD
 
 # Клавиатура выбора сложности
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def difficulty_keyboard(game_type: str) -> InlineKeyboardMarkup:
     return KeyboardBuilder.make_keyboard([
         [("🟢 Легко", f"{game_type}:easy"), ("🟡 Средне", f"{game_type}:medium")],
@@ -131,37 +192,49 @@ def difficulty_keyboard(game_type: str) -> InlineKeyboardMarkup:
     ])
 
 # Клавиатура для статистики
+STATS_KEYBOARD_LAYOUT: Layout = [
+    [("📈 Подробная статистика", "stats:detailed"), ("🏆 Мои достижения", "achievements")],
+    [("👥 Сравнить с другими", "stats:compare"), ("📊 Графики", "stats:charts")],
+    [("⬅️ Назад", "back_to_main")]
+]
+STATS_KEYBOARD = KeyboardBuilder.make_keyboard(STATS_KEYBOARD_LAYOUT)
+
 def stats_keyboard() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("📈 Подробная статистика", "stats:detailed"), ("🏆 Мои достижения", "achievements")],
-        [("👥 Сравнить с другими", "stats:compare"), ("📊 Графики", "stats:charts")],
-        [("⬅️ Назад", "back_to_main")]
-    ])
+    return STATS_KEYBOARD
 
 # Клавиатура помощи
+HELP_KEYBOARD_LAYOUT: Layout = [
+    [("❓ Как играть", "help:how_to_play"), ("🎯 Система очков", "help:scoring")],
+    [("🏆 Достижения", "help:achievements"), ("⚙️ Команды", "help:commands")],
+    [("📞 Поддержка", "help:support"), ("ℹ️ О боте", "help:about")],
+    [("⬅️ Назад", "back_to_main")]
+]
+HELP_KEYBOARD = KeyboardBuilder.make_keyboard(HELP_KEYBOARD_LAYOUT)
+
 def help_keyboard() -> InlineKeyboardMarkup:
-    return KeyboardBuilder.make_keyboard([
-        [("❓ Как играть", "help:how_to_play"), ("🎯 Система очков", "help:scoring")],
-        [("🏆 Достижения", "help:achievements"), ("⚙️ Команды", "help:commands")],
-        [("📞 Поддержка", "help:support"), ("ℹ️ О боте", "help:about")],
-        [("⬅️ Назад", "back_to_main")]
-    ])
+    return HELP_KEYBOARD
 
 # Вспомогательные функции
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def back_button(callback_data: str = "back_to_main") -> InlineKeyboardMarkup:
     """Простая кнопка назад"""
     return KeyboardBuilder.make_keyboard([
         [("⬅️ Назад", callback_data)]
     ])
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def yes_no_keyboard(yes_callback: str, no_callback: str) -> InlineKeyboardMarkup:
     """Клавиатура Да/Нет"""
     return KeyboardBuilder.make_keyboard([
         [("✅ Да", yes_callback), ("❌ Нет", no_callback)]
     ])
 
-def menu_with_back(items: List[Tuple[str, str]], back_callback: str = "back_to_main") -> InlineKeyboardMarkup:
+def menu_with_back(items: Sequence[Tuple[str, str]], back_callback: str = "back_to_main") -> InlineKeyboardMarkup:
     """Создание меню с кнопкой назад"""
+    return _menu_with_back(tuple(items), back_callback)
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _menu_with_back(items: Tuple[Tuple[str, str], ...], back_callback: str) -> InlineKeyboardMarkup:
     layout = []
 
     # Группируем кнопки по 2 в ряд
@@ -0,0 +1,289 @@
+"""Нагрузочный прогон диспетчера на синтетических обновлениях.
+
+Собирает тот же Dispatcher с роутерами, что и bot.py, подключает бота к
+LocalSession (запросы к Bot API обрабатываются локально) и подает через
+dp.feed_update сценарии пользователей: /start, викторина, загадка, игра
+в слова, рейтинг и мини-игры. Выводит пропускную способность и
+p50/p95/p99 по каждому обработчику и по обновлению целиком.
+
+    python loadtest.py --users 200 --updates 5000 --mix quiz=4,word=2,leaderboard=1
+    python loadtest.py --max-p95 20 --min-rate 300 --json result.json   # для CI
+
+Код возврата 1, если нарушен порог --max-p95 или --min-rate или
+обработчики падали с ошибками.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from aiogram import BaseMiddleware
+from webhook_selftest import percentile, use_temp_storage
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ["start", "quiz", "riddle", "word", "leaderboard", "game"]
+DEFAULT_MIX = "start=1,quiz=4,riddle=2,word=2,leaderboard=1,game=2"
+BOT_TOKEN = "42:LOADTEST"
+
+
+class HandlerTimer(BaseMiddleware):
+    """Время работы каждого обработчика по его имени"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def __call__(self, handler, event, data: Dict[str, Any]) -> Any:
+        name = data["handler"].callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+
+class UpdateFactory:
+    """Синтетические обновления от имени пользователя"""
+
+    def __init__(self):
+        self._update_id = 0
+        self._message_id = 0
+
+    def _next(self) -> Tuple[int, int]:
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def message(self, user_id: int, text: str) -> Dict[str, Any]:
+        update_id, message_id = self._next()
+        return {"update_id": update_id, "message": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }}
+
+    def callback(self, user_id: int, data: str) -> Dict[str, Any]:
+        update_id, message_id = self._next()
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": self._user(user_id),
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "...",
+            },
+            "data": data,
+        }}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий {name!r}, есть: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadTest:
+    """Прогон сценариев через диспетчер"""
+
+    def __init__(self, correct_ratio: float = 0.5, seed: int = 0):
+        from bot import create_bot, create_dispatcher
+        from local_session import LocalSession
+
+        self.session = LocalSession()
+        self.bot = create_bot(BOT_TOKEN, session=self.session, rate_limit=False)
+        self.dp = create_dispatcher(throttle=False)
+        self.timer = HandlerTimer()
+        self.dp.message.middleware(self.timer)
+        self.dp.callback_query.middleware(self.timer)
+        self.updates = UpdateFactory()
+        self.correct_ratio = correct_ratio
+        self.random = random.Random(seed)
+        self.latencies: List[float] = []
+        self.failed = 0
+
+    async def feed(self, update: Dict[str, Any]):
+        from aiogram.types import Update
+
+        start = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, Update.model_validate(update, context={"bot": self.bot}))
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"Ошибка обработки обновления: {e}")
+        self.latencies.append(time.perf_counter() - start)
+
+    def _correct(self) -> bool:
+        return self.random.random() < self.correct_ratio
+
+    async def scenario_start(self, user_id: int) -> int:
+        await self.feed(self.updates.message(user_id, "/start"))
+        return 1
+
+    async def scenario_quiz(self, user_id: int) -> int:
+        from handlers.quiz import user_questions
+
+        level = self.random.choice(["easy", "medium", "hard", "random"])
+        await self.feed(self.updates.callback(user_id, f"quiz:{level}"))
+        question = user_questions.get(user_id)
+        answer = question["a"][0] if question is not None and self._correct() else "не знаю"
+        await self.feed(self.updates.message(user_id, answer))
+        return 2
+
+    async def scenario_riddle(self, user_id: int) -> int:
+        from aiogram.fsm.storage.base import StorageKey
+
+        level = self.random.choice(["easy", "hard", "funny", "logic"])
+        await self.feed(self.updates.callback(user_id, f"riddles:{level}"))
+        data = await self.dp.storage.get_data(StorageKey(bot_id=self.bot.id, chat_id=user_id, user_id=user_id))
+        riddle = data.get("riddle")
+        answer = riddle["a"][0] if riddle and self._correct() else "эхо"
+        await self.feed(self.updates.message(user_id, answer))
+        return 2
+
+    async def scenario_word(self, user_id: int) -> int:
+        level = self.random.choice(["short", "long", "random", "hard"])
+        await self.feed(self.updates.callback(user_id, f"word:{level}"))
+        for letter in self.random.sample("аеиоунтсрлк", 3):
+            await self.feed(self.updates.message(user_id, letter))
+        return 4
+
+    async def scenario_leaderboard(self, user_id: int) -> int:
+        await self.feed(self.updates.callback(user_id, "leaderboard"))
+        await self.feed(self.updates.callback(user_id, "leaderboard:page:2"))
+        await self.feed(self.updates.message(user_id, "/rank"))
+        return 3
+
+    async def scenario_game(self, user_id: int) -> int:
+        game = self.random.choice(["dice", "coin", "roulette", "number", "double_dice"])
+        await self.feed(self.updates.callback(user_id, f"game:{game}"))
+        return 1
+
+    async def run(self, users: int, total: int, mix: Dict[str, float], concurrency: int) -> float:
+        """Прогнать не меньше total обновлений, вернуть затраченное время"""
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        remaining = total
+
+        async def worker(index: int):
+            nonlocal remaining
+            # Пользователь закреплен за одним воркером, чтобы его шаги шли по порядку
+            own_users = list(range(1_000_000 + index, 1_000_000 + users, concurrency))
+            if not own_users:
+                return
+            while remaining > 0:
+                name = self.random.choices(names, weights)[0]
+                scenario: Callable[[int], Awaitable[int]] = getattr(self, f"scenario_{name}")
+                sent = await scenario(self.random.choice(own_users))
+                remaining -= sent
+
+        await self.dp.emit_startup(bot=self.bot, dispatcher=self.dp)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+            return time.perf_counter() - started
+        finally:
+            await self.dp.emit_shutdown(bot=self.bot, dispatcher=self.dp)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        def summary(samples: List[float]) -> Dict[str, float]:
+            samples = sorted(samples)
+            return {
+                "count": len(samples),
+                "rate": len(samples) / elapsed if elapsed else 0.0,
+                "p50": percentile(samples, 50) * 1000,
+                "p95": percentile(samples, 95) * 1000,
+                "p99": percentile(samples, 99) * 1000,
+            }
+
+        handlers = {}
+        for name, samples in sorted(self.timer.samples.items()):
+            handlers[name] = summary(samples)
+            handlers[name]["errors"] = self.timer.errors.get(name, 0)
+        total = summary(self.latencies)
+        total["errors"] = self.failed
+        return {
+            "elapsed": elapsed,
+            "handlers": handlers,
+            "total": total,
+            "api_calls": self.session.stats(),
+            "date": datetime.now().isoformat(),
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'обработчик':<28} {'вызовов':>8} {'ошибок':>7} {'в сек':>9} "
+             f"{'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}"]
+    rows = list(report["handlers"].items()) + [("ВСЕГО (обновление)", report["total"])]
+    for name, row in rows:
+        lines.append(f"{name:<28} {row['count']:>8} {row['errors']:>7} {row['rate']:>9.1f} "
+                     f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f}")
+    lines.append(f"Время: {report['elapsed']:.2f} с. Запросы к Bot API: "
+                 + ", ".join(f"{name}={count}" for name, count in sorted(report["api_calls"].items())))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработчиков бота без сети")
+    parser.add_argument("--users", type=int, default=100, help="число синтетических пользователей")
+    parser.add_argument("--updates", type=int, default=2000, help="сколько обновлений подать")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременно активных пользователей")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"веса сценариев (по умолчанию {DEFAULT_MIX})")
+    parser.add_argument("--correct", type=float, default=0.5, help="доля правильных ответов")
+    parser.add_argument("--seed", type=int, default=0, help="зерно генератора случайных чисел")
+    parser.add_argument("--json", help="сохранить результат в JSON-файл")
+    parser.add_argument("--max-p95", type=float, help="порог p95 одного обновления (мс)")
+    parser.add_argument("--min-rate", type=float, help="минимальная пропускная способность (обн/с)")
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        random.seed(args.seed)
+        test = LoadTest(correct_ratio=args.correct, seed=args.seed)
+        elapsed = asyncio.run(test.run(args.users, args.updates, args.mix, args.concurrency))
+        report = test.report(elapsed)
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    if report["total"]["errors"]:
+        failures.append(f"ошибок обработки: {report['total']['errors']}")
+    if args.max_p95 is not None and report["total"]["p95"] > args.max_p95:
+        failures.append(f"p95 {report['total']['p95']:.2f} мс > {args.max_p95} мс")
+    if args.min_rate is not None and report["total"]["rate"] < args.min_rate:
+        failures.append(f"{report['total']['rate']:.1f} обн/с < {args.min_rate} обн/с")
+    for failure in failures:
+        print(f"ПРОВАЛ: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
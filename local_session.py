@@ -0,0 +1,61 @@
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, User
+
+
+class LocalSession(BaseSession):
+    """Сессия Bot API без сети: запросы записываются, ответы собираются локально.
+
+    Нужна для замеров и самопроверки - обработчики работают как обычно,
+    но ни одно сообщение не уходит в Telegram. Для методов, возвращающих
+    Message, отдается сообщение с текстом запроса, для остальных - True.
+    """
+
+    def __init__(self, keep_calls: int = 0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.counts: Counter = Counter()
+        # Последние keep_calls запросов (метод, chat_id, время) для отладки
+        self.keep_calls = keep_calls
+        self.calls: List[Tuple[str, Any, float]] = []
+        self._message_id = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        name = method.__api_method__
+        self.counts[name] += 1
+        chat_id = getattr(method, "chat_id", None)
+        if self.keep_calls:
+            self.calls.append((name, chat_id, time.perf_counter()))
+            if len(self.calls) > self.keep_calls:
+                del self.calls[:len(self.calls) - self.keep_calls]
+        return self._result(bot, method, chat_id)
+
+    def _result(self, bot: Bot, method: TelegramMethod[Any], chat_id: Any) -> Any:
+        returning = method.__returning__
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="LocalBot", username="local_bot")
+        if returning is Message or (returning is not bool and Message in getattr(returning, "__args__", ())):
+            self._message_id += 1
+            chat = Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private")
+            return Message(
+                message_id=getattr(method, "message_id", None) or self._message_id,
+                date=datetime.now(),
+                chat=chat,
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Число запросов по методам"""
+        return dict(self.counts)
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,156 @@
+"""Настройка логирования без записи на диск в потоке обработчиков.
+
+Записи уходят в очередь (QueueHandler), а в файл с ротацией и в консоль
+их пишет отдельный поток QueueListener. Для шумных логгеров горячего пути
+сообщения ниже WARNING прореживаются: из LOG_SAMPLING "имя=доля" в лог
+попадает примерно каждая 1/доля запись.
+"""
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime
+from typing import Dict, List, Optional
+
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Ротация по размеру: максимальный размер файла (байты) и число старых файлов
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Формат: text (по умолчанию) или json - одна JSON-запись на строку
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Доля сохраняемых записей ниже WARNING для логгеров горячего пути
+LOG_SAMPLING = os.getenv(
+    "LOG_SAMPLING", "aiogram.event=0.01,handlers.word_game.trace=0.1"
+)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - один JSON-объект"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "process": record.process,
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает каждую n-ю запись ниже WARNING от заданных логгеров (и дочерних)"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self._intervals = {name: max(1, round(1 / rate)) if rate > 0 else 0 for name, rate in rates.items()}
+        self._counters: Dict[str, int] = {}
+        # Кеш: имя логгера -> правило (или None), чтобы не разбирать имя на каждой записи
+        self._rules: Dict[str, Optional[str]] = {}
+
+    def _rule(self, name: str) -> Optional[str]:
+        rule = self._rules.get(name, "")
+        if rule == "":
+            rule = None
+            candidate = name
+            while candidate:
+                if candidate in self._intervals:
+                    rule = candidate
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._rules[name] = rule
+        return rule
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rule = self._rule(record.name)
+        if rule is None:
+            return True
+        interval = self._intervals[rule]
+        if not interval:
+            return False
+        count = self._counters.get(rule, 0)
+        self._counters[rule] = count + 1
+        return count % interval == 0
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    rates = {}
+    for part in value.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def create_handlers(log_file: str = LOG_FILE) -> List[logging.Handler]:
+    """Обработчики, которые пишут записи (работают в потоке QueueListener)"""
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def use_queue(log_queue) -> logging.Handler:
+    """Направить все записи процесса в очередь log_queue"""
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    return handler
+
+
+def listen(log_queue, log_file: str = LOG_FILE) -> logging.handlers.QueueListener:
+    """Запустить поток, который пишет записи из log_queue"""
+    listener = logging.handlers.QueueListener(log_queue, *create_handlers(log_file), respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def setup_logging(log_queue=None, log_file: str = LOG_FILE):
+    """Логирование процесса через очередь и фоновый поток записи.
+
+    log_queue можно передать multiprocessing-очередью: тогда в нее же
+    пишут процессы-воркеры, а в файл пишет только этот процесс.
+    """
+    global _listener, _queue
+    if _listener is not None:
+        return
+    _queue = log_queue if log_queue is not None else queue.Queue(-1)
+    _listener = listen(_queue, log_file)
+    use_queue(_queue)
+    atexit.register(stop_logging)
+
+
+def current_queue():
+    """Очередь, настроенная setup_logging (None, если не настроена)"""
+    return _queue
+
+
+def stop_logging():
+    """Дописать оставшиеся записи и остановить поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
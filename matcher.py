@@ -0,0 +1,77 @@
+import os
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Tuple
+
+# Допустимое число опечаток для буквенных ответов (0 - только точное совпадение,
+# по умолчанию; нечеткое сравнение включается явно, например 1)
+ANSWER_MAX_DISTANCE = int(os.getenv("ANSWER_MAX_DISTANCE", "0"))
+# Опечатки прощаются только в ответах не короче этой длины
+FUZZY_MIN_LENGTH = int(os.getenv("FUZZY_MIN_LENGTH", "5"))
+
+_TRANSLATION = str.maketrans({
+    **{chr(0x2080 + digit): str(digit) for digit in range(10)},  # H₂O -> h2o
+    "ё": "е",
+    "²": "^2",
+    "³": "^3",
+    "×": "*",
+    "·": "*",
+    "−": "-",
+    "–": "-",
+    ",": ".",
+})
+# Остаются буквы, цифры и знаки, меняющие смысл формулы
+_JUNK = re.compile(r"[^\w+\-*/^=.%<>]|_")
+
+
+def normalize(text: str) -> str:
+    """Привести ответ к каноническому виду.
+
+    Регистр, ё/е, пробелы ("300 000"), пунктуация и надстрочные степени
+    ("x²+c" -> "x^2+c") не влияют на результат.
+    """
+    text = _JUNK.sub("", text.lower().translate(_TRANSLATION))
+    return text.rstrip(".")
+
+
+@lru_cache(maxsize=4096)
+def compile_answers(answers: Tuple[str, ...]) -> FrozenSet[str]:
+    """Множество нормализованных вариантов ответа"""
+    return frozenset(normalize(answer) for answer in answers)
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """Расстояние Левенштейна не больше limit (с ранним выходом)"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def matches(accepted: FrozenSet[str], user_answer: str, max_distance: int = ANSWER_MAX_DISTANCE) -> bool:
+    """Проверить ответ по заранее скомпилированному множеству вариантов"""
+    answer = normalize(user_answer)
+    if answer in accepted:
+        return True
+    if max_distance <= 0 or not answer:
+        return False
+    return any(
+        within_distance(answer, variant, max_distance)
+        for variant in _fuzzy_candidates(accepted)
+    )
+
+
+def _fuzzy_candidates(accepted: Iterable[str]) -> Iterable[str]:
+    # Числа и формулы с опечаткой - это другой ответ
+    return (variant for variant in accepted if len(variant) >= FUZZY_MIN_LENGTH and variant.isalpha())
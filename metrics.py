@@ -0,0 +1,202 @@
+"""Метрики обработчиков, запросов к Bot API и записи данных.
+
+Для каждой серии считаются вызовы, ошибки и гистограмма длительности.
+Метрики отдаются в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+и кратко показываются в админ-панели (системная информация).
+"""
+import os
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+# Порт HTTP-эндпоинта метрик (0 - не запускать)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Границы корзин гистограммы (секунды)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FAMILIES = {
+    "handler": ("bot_handler", ("router", "handler"), "Обработка обновлений по обработчикам"),
+    "api": ("bot_api_request", ("method",), "Запросы к Telegram Bot API"),
+    "storage": ("bot_storage", ("operation",), "Запись данных пользователей"),
+}
+
+
+class Series:
+    """Счетчики и гистограмма одной серии"""
+
+    __slots__ = ("count", "errors", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.total += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Серии метрик по семействам и меткам"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._series: Dict[str, Dict[Tuple[str, ...], Series]] = {family: {} for family in FAMILIES}
+
+    def observe(self, family: str, labels: Tuple[str, ...], seconds: float, error: bool = False):
+        series = self._series[family].get(labels)
+        if series is None:
+            series = self._series[family][labels] = Series()
+        series.observe(seconds, error)
+
+    @contextmanager
+    def timer(self, family: str, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.observe(family, labels, time.perf_counter() - start, error)
+
+    def series(self, family: str) -> Dict[Tuple[str, ...], Series]:
+        return self._series[family]
+
+    def render(self) -> str:
+        """Текст в формате Prometheus exposition"""
+        lines: List[str] = []
+        for family, (name, label_names, help_text) in FAMILIES.items():
+            items = sorted(self._series[family].items())
+            lines.append(f"# HELP {name}_seconds {help_text}")
+            lines.append(f"# TYPE {name}_seconds histogram")
+            for labels, series in items:
+                base = ",".join(f'{key}="{_escape(value)}"' for key, value in zip(label_names, labels))
+                cumulative = 0
+                for bound, count in zip(BUCKETS, series.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_seconds_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_seconds_bucket{{{base},le="+Inf"}} {series.count}')
+                lines.append(f"{name}_seconds_sum{{{base}}} {series.total:.6f}")
+                lines.append(f"{name}_seconds_count{{{base}}} {series.count}")
+            lines.append(f"# HELP {name}_errors_total {help_text}: ошибки")
+            lines.append(f"# TYPE {name}_errors_total counter")
+            for labels, series in items:
+                base = ",".join(f'{key}="{_escape(value)}"' for key, value in zip(label_names, labels))
+                lines.append(f"{name}_errors_total{{{base}}} {series.errors}")
+        lines.append("# TYPE bot_uptime_seconds gauge")
+        lines.append(f"bot_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, limit: int = 5) -> str:
+        """Краткая сводка для админ-панели (HTML)"""
+        handlers = sorted(self._series["handler"].items(), key=lambda item: item[1].total, reverse=True)
+        if not handlers:
+            return "Нет данных"
+        lines = []
+        for (router, handler), series in handlers[:limit]:
+            lines.append(
+                f"• <code>{handler}</code>: {series.count} выз., {series.errors} ош., "
+                f"p95 ≤ {_format_ms(series.quantile(0.95))}"
+            )
+        api = self._series["api"].values()
+        api_count = sum(series.count for series in api)
+        if api_count:
+            api_total = sum(series.total for series in api)
+            lines.append(f"📡 Bot API: {api_count} запр., {sum(s.errors for s in api)} ош., "
+                         f"среднее {api_total / api_count * 1000:.1f} мс")
+        storage = self._series["storage"].get(("flush",))
+        if storage is not None and storage.count:
+            lines.append(f"💾 Запись данных: {storage.count} раз, p95 ≤ {_format_ms(storage.quantile(0.95))}")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_ms(seconds: float) -> str:
+    return "∞" if seconds == float("inf") else f"{seconds * 1000:g} мс"
+
+
+# Глобальный реестр
+registry = MetricsRegistry()
+_runner: Optional[web.AppRunner] = None
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время и ошибки обработчиков: router - модуль обработчика, handler - его имя"""
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+                       event: Any, data: Dict[str, Any]) -> Any:
+        callback = data["handler"].callback
+        labels = (callback.__module__.rpartition(".")[2], callback.__name__)
+        start = time.perf_counter()
+        error = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            error = True
+            raise
+        finally:
+            registry.observe("handler", labels, time.perf_counter() - start, error)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время запросов к Bot API по методам"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Any, method: TelegramMethod) -> Any:
+        with registry.timer("api", method.__api_method__):
+            return await make_request(bot, method)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Запуск эндпоинта /metrics, если задан порт"""
+    global _runner
+    if not port or _runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    _runner = runner
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+
+async def stop_server():
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+from cachetools import TLRUCache
+from questions import Category, Difficulty, make_question
+
+logger = logging.getLogger(__name__)
+
+# Время жизни неотвеченного вопроса (секунды) и максимум вопросов в памяти
+PENDING_TTL = float(os.getenv("QUIZ_PENDING_TTL", "3600"))
+PENDING_MAX_SIZE = int(os.getenv("QUIZ_PENDING_MAX", "100000"))
+# Файл SQLite для сохранения вопросов между перезапусками ("" - только память)
+PENDING_DB_PATH = os.getenv("QUIZ_PENDING_DB", "")
+
+
+class _EvictingCache(TLRUCache):
+    """TLRUCache, который сообщает о вытеснении записи по размеру"""
+
+    def __init__(self, maxsize: int, ttu, timer, on_evict: Callable[[Any], None]):
+        super().__init__(maxsize=maxsize, ttu=ttu, timer=timer)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key)
+        return key, value
+
+
+class PendingQuestions:
+    """Активные вопросы викторины по пользователям.
+
+    Записи живут не дольше ttl секунд, при переполнении вытесняются давно
+    не использованные (LRU). При указании db_path вопросы дублируются в
+    SQLite вместе со временем истечения и восстанавливаются после
+    перезапуска с оставшимся, а не полным сроком.
+    """
+
+    def __init__(self, maxsize: int = PENDING_MAX_SIZE, ttl: float = PENDING_TTL,
+                 db_path: Optional[str] = PENDING_DB_PATH):
+        self.ttl = ttl
+        # Значение - (время истечения по time.time(), вопрос)
+        self._cache: TLRUCache = _EvictingCache(maxsize, _expires, time.time, self._evicted)
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_questions (
+                    user_id INTEGER PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pending_expires ON pending_questions(expires)"
+            )
+            self._restore(maxsize)
+
+    def _restore(self, limit: int):
+        now = time.time()
+        self._conn.execute("DELETE FROM pending_questions WHERE expires < ?", (now,))
+        # Сверх лимита остаются только самые свежие вопросы (например, после
+        # уменьшения QUIZ_PENDING_MAX)
+        self._conn.execute(
+            "DELETE FROM pending_questions WHERE user_id NOT IN "
+            "(SELECT user_id FROM pending_questions ORDER BY expires DESC LIMIT ?)", (limit,)
+        )
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT user_id, question, expires FROM pending_questions ORDER BY expires DESC LIMIT ?", (limit,)
+        ).fetchall()
+        # Сначала старые, чтобы при вытеснении первыми уходили они
+        for user_id, question, expires in reversed(rows):
+            self._cache[user_id] = (expires, self._decode(question))
+        logger.info(f"Восстановлено {len(rows)} активных вопросов")
+
+    def _evicted(self, user_id: int):
+        # Вытесненный вопрос не должен вернуться после перезапуска;
+        # фиксируется вместе с записью, вызвавшей вытеснение
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM pending_questions WHERE user_id = ?", (user_id,))
+
+    @staticmethod
+    def _encode(question: Mapping[str, Any]) -> str:
+        data: Dict[str, Any] = {
+            "q": question["q"],
+            "a": list(question["a"]),
+            "difficulty": question["difficulty"].value,
+            "category": question["category"].value,
+        }
+        if "explanation" in question:
+            data["explanation"] = question["explanation"]
+        return json.dumps(data, ensure_ascii=False)
+
+    @staticmethod
+    def _decode(raw: str) -> Mapping[str, Any]:
+        data = json.loads(raw)
+        return make_question(data, Category(data["category"]), Difficulty(data["difficulty"]))
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._cache
+
+    def get(self, user_id: int) -> Optional[Mapping[str, Any]]:
+        entry = self._cache.get(user_id)
+        return entry[1] if entry is not None else None
+
+    def __setitem__(self, user_id: int, question: Mapping[str, Any]):
+        now = time.time()
+        expires = now + self.ttl
+        self._cache[user_id] = (expires, question)
+        if self._conn is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pending_questions (user_id, question, expires) VALUES (?, ?, ?)",
+                (user_id, self._encode(question), expires)
+            )
+            self._conn.execute("DELETE FROM pending_questions WHERE expires < ?", (now,))
+            self._conn.commit()
+
+    def pop(self, user_id: int) -> Optional[Mapping[str, Any]]:
+        entry = self._cache.pop(user_id, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM pending_questions WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+        return entry[1] if entry is not None else None
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def _expires(_user_id: int, entry: Tuple[float, Mapping[str, Any]], _now: float) -> float:
+    return entry[0]
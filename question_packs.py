@@ -0,0 +1,161 @@
+import csv
+import json
+import logging
+from array import array
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Смещение строки хранится вместе с номером файла: (файл << 48) | смещение
+_OFFSET_BITS = 48
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+
+CSV_FIELDS = ["type", "category", "difficulty", "q", "a", "explanation", "hint"]
+
+# Ошибки разбора одной записи: запись пропускается, разбор файла продолжается
+RECORD_ERRORS = (ValueError, KeyError, TypeError, AttributeError, StopIteration)
+
+# Сложность вопроса в паке: название или номер 1-3
+DIFFICULTIES = {
+    "easy": "easy", "medium": "medium", "hard": "hard",
+    "1": "easy", "2": "medium", "3": "hard",
+}
+
+
+def parse_line(line: str, header: Optional[List[str]]) -> Dict[str, Any]:
+    """Разбор одной записи пака: JSON-объект или строка CSV"""
+    if header is None:
+        return json.loads(line)
+    row = next(csv.reader([line]))
+    return {key: value for key, value in zip(header, row) if value != ""}
+
+
+def normalize_difficulty(value: Any) -> str:
+    """Название сложности вопроса из пака; неизвестная - ValueError"""
+    difficulty = DIFFICULTIES.get(str(value).strip().lower())
+    if difficulty is None:
+        raise ValueError(f"неизвестная сложность {value!r}")
+    return difficulty
+
+
+def parse_answers(value: Any) -> List[str]:
+    """Ответы: список или строка с вариантами через |"""
+    if isinstance(value, str):
+        return [ans.strip() for ans in value.split("|") if ans.strip()]
+    return [str(ans) for ans in value]
+
+
+class PackStore:
+    """Индекс паков вопросов из каталога (*.jsonl, *.csv).
+
+    При сканировании файлы читаются потоково, а для вопросов запоминаются
+    только смещения строк по ключу (категория, сложность). Сами вопросы
+    разбираются при первом обращении к категории. Загадки и слова
+    немногочисленны и загружаются сразу.
+
+    Формат записи: type (question/riddle/word, по умолчанию question),
+    category, difficulty, q, a, explanation, hint. В CSV первая строка -
+    заголовок, варианты ответа разделяются "|", одна запись на строку.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._files: List[Path] = []
+        self._headers: List[Optional[List[str]]] = []
+        self._offsets: Dict[Tuple[str, str], array] = {}
+        self.riddles: Dict[str, List[Dict[str, Any]]] = {}
+        self.words: Dict[str, List[str]] = {}
+
+    def scan(self):
+        """Потоковый проход по всем пакам каталога"""
+        if not self.directory.is_dir():
+            return
+        paths = sorted(self.directory.glob("*.jsonl")) + sorted(self.directory.glob("*.csv"))
+        total = 0
+        for path in paths:
+            try:
+                total += self._scan_file(path)
+            except Exception as e:
+                logger.error(f"Ошибка чтения пака {path}: {e}")
+        logger.info(f"Паки вопросов: {len(paths)} файлов, {total} вопросов в индексе")
+
+    def _scan_file(self, path: Path) -> int:
+        file_idx = len(self._files)
+        count = 0
+        with open(path, "rb") as f:
+            header = None
+            offset = 0
+            if path.suffix == ".csv":
+                first = f.readline()
+                offset = len(first)
+                header = next(csv.reader([first.decode("utf-8-sig")])) or CSV_FIELDS
+            self._files.append(path)
+            self._headers.append(header)
+
+            for raw in f:
+                pos = offset
+                offset += len(raw)
+                line = raw.decode("utf-8").strip()
+                if not line:
+                    continue
+                try:
+                    item = parse_line(line, header)
+                    kind = item.get("type", "question")
+                    if kind == "question":
+                        key = (item["category"], normalize_difficulty(item["difficulty"]))
+                        # Запись без вопроса или ответа не разобрать при загрузке категории
+                        if not item["q"] or not parse_answers(item["a"]):
+                            raise ValueError("пустой вопрос или ответ")
+                        self._offsets.setdefault(key, array("Q")).append((file_idx << _OFFSET_BITS) | pos)
+                        count += 1
+                    elif kind == "riddle":
+                        self.riddles.setdefault(item.get("category", "easy"), []).append({
+                            "q": item["q"],
+                            "a": parse_answers(item["a"]),
+                            "hint": item.get("hint", "")
+                        })
+                    elif kind == "word":
+                        self.words.setdefault(item.get("difficulty", "medium"), []).append(item["q"].lower())
+                except RECORD_ERRORS as e:
+                    logger.warning(f"Пропущена запись {path.name}@{pos}: {e}")
+        return count
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Количество вопросов по ключу (категория, сложность) без их разбора"""
+        return {key: len(offsets) for key, offsets in self._offsets.items()}
+
+    def load_category(self, category: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Разобрать все вопросы категории: {сложность: [вопрос, ...]}
+
+        Записи, которые не удалось разобрать (например, файл изменился после
+        сканирования и смещения указывают не туда), пропускаются с
+        предупреждением.
+        """
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        by_file: Dict[int, List[Tuple[int, str]]] = {}
+        for (cat, difficulty), offsets in self._offsets.items():
+            if cat != category:
+                continue
+            for packed in offsets:
+                by_file.setdefault(packed >> _OFFSET_BITS, []).append((packed & _OFFSET_MASK, difficulty))
+
+        for file_idx, entries in by_file.items():
+            header = self._headers[file_idx]
+            with open(self._files[file_idx], "rb") as f:
+                for pos, difficulty in sorted(entries):
+                    f.seek(pos)
+                    try:
+                        item = parse_line(f.readline().decode("utf-8").strip(), header)
+                        if (item["category"], normalize_difficulty(item["difficulty"])) != (category, difficulty):
+                            raise ValueError("запись не совпадает с индексом")
+                        question = {"q": item["q"], "a": parse_answers(item["a"])}
+                        if not question["q"] or not question["a"]:
+                            raise ValueError("пустой вопрос или ответ")
+                    except RECORD_ERRORS as e:
+                        logger.warning(f"Пропущена запись {self._files[file_idx].name}@{pos}: {e}")
+                        continue
+                    if item.get("explanation"):
+                        question["explanation"] = item["explanation"]
+                    result.setdefault(difficulty, []).append(question)
+        return result
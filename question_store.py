@@ -0,0 +1,192 @@
+"""Скомпилированное хранилище вопросов только для чтения.
+
+Формат файла (все числа little-endian):
+    заголовок     magic "QPK1", версия (u32), число корзин (u32)
+    корзины       смещение названия категории (u64), сложность (u8),
+                  число вопросов (u32), смещение массива смещений (u64)
+    массивы       для каждой корзины u64-смещения записей вопросов
+    строки        строка = длина (u32) + UTF-8; запись вопроса = число
+                  строк (u16) + строки: вопрос, объяснение, ответы...
+
+Файл открывается через mmap, вопрос декодируется только когда выбран,
+поэтому несколько процессов бота делят одни страницы в кеше ОС.
+
+Отображенный файл нельзя заменить (os.replace) под работающим ботом в
+Windows, поэтому каждая компиляция пишет новый файл с версией в имени
+(questions.qpack -> questions.<версия>.qpack), а бот открывает самую
+новую версию (resolve_store). Старые версии удаляются, как только их
+никто не держит открытыми.
+
+Компиляция встроенных вопросов и паков:
+    python question_store.py --packs packs -o questions.qpack
+"""
+import os
+import mmap
+import time
+import struct
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QPK1"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+BUCKET = struct.Struct("<QBIQ")
+OFFSET = struct.Struct("<Q")
+LENGTH = struct.Struct("<I")
+COUNT = struct.Struct("<H")
+
+# (категория, сложность 1-3, вопрос, ответы, объяснение)
+QuestionRow = Tuple[str, int, str, List[str], str]
+
+
+def _versions(path: str) -> List[Tuple[int, Path]]:
+    """Версии хранилища path по возрастанию: [(версия, файл), ...]"""
+    base = Path(path)
+    found = []
+    for candidate in base.parent.glob(f"{base.stem}.*{base.suffix}"):
+        version = candidate.name[len(base.stem) + 1:len(candidate.name) - len(base.suffix)]
+        if version.isdigit():
+            found.append((int(version), candidate))
+    return sorted(found)
+
+
+def resolve_store(path: str) -> Optional[str]:
+    """Файл хранилища для открытия: новейшая версия или сам path"""
+    versions = _versions(path)
+    if versions:
+        return str(versions[-1][1])
+    return path if os.path.exists(path) else None
+
+
+def remove_old_versions(path: str):
+    """Удалить все версии, кроме новейшей (открытые в Windows остаются)"""
+    for _, old in _versions(path)[:-1]:
+        try:
+            old.unlink()
+        except OSError as e:
+            logger.debug(f"Старая версия хранилища {old} пока занята: {e}")
+
+
+def compile_store(path: str, rows: Iterable[QuestionRow]) -> Tuple[int, str]:
+    """Записать вопросы в новую версию хранилища path.
+
+    Возвращает количество вопросов и имя записанного файла.
+    """
+    buckets: Dict[Tuple[str, int], List[bytes]] = {}
+    for category, difficulty, q, answers, explanation in rows:
+        strings = [q, explanation or ""] + list(answers)
+        record = COUNT.pack(len(strings)) + b"".join(
+            LENGTH.pack(len(data)) + data for data in (s.encode("utf-8") for s in strings))
+        buckets.setdefault((category, difficulty), []).append(record)
+
+    keys = sorted(buckets)
+    pos = HEADER.size + BUCKET.size * len(keys)
+    offsets_pos = []
+    for key in keys:
+        offsets_pos.append(pos)
+        pos += OFFSET.size * len(buckets[key])
+
+    # Строковая таблица: названия категорий, затем записи вопросов
+    strings = bytearray()
+    strings_start = pos
+    category_pos: Dict[str, int] = {}
+    for category, _ in keys:
+        if category not in category_pos:
+            data = category.encode("utf-8")
+            category_pos[category] = strings_start + len(strings)
+            strings += LENGTH.pack(len(data)) + data
+    record_offsets: Dict[Tuple[str, int], List[int]] = {}
+    for key in keys:
+        offsets = record_offsets[key] = []
+        for record in buckets[key]:
+            offsets.append(strings_start + len(strings))
+            strings += record
+
+    base = Path(path)
+    version = max(time.time_ns(), max((v for v, _ in _versions(path)), default=0) + 1)
+    target = base.with_name(f"{base.stem}.{version}{base.suffix}")
+    tmp_path = Path(str(target) + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys)))
+        for key, array_pos in zip(keys, offsets_pos):
+            f.write(BUCKET.pack(category_pos[key[0]], key[1], len(buckets[key]), array_pos))
+        for key in keys:
+            f.write(b"".join(OFFSET.pack(offset) for offset in record_offsets[key]))
+        f.write(strings)
+    # Новое имя: файл, отображенный работающим ботом, не заменяется
+    tmp_path.replace(target)
+    remove_old_versions(path)
+    return sum(len(records) for records in buckets.values()), str(target)
+
+
+class MappedQuestionStore:
+    """Чтение скомпилированного хранилища через mmap"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, bucket_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{self.path}: неизвестный формат хранилища вопросов")
+        self._buckets: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        for i in range(bucket_count):
+            name_pos, difficulty, count, array_pos = BUCKET.unpack_from(self._mm, HEADER.size + i * BUCKET.size)
+            self._buckets[(self._string(name_pos)[0], difficulty)] = (count, array_pos)
+
+    def _string(self, pos: int) -> Tuple[str, int]:
+        (length,) = LENGTH.unpack_from(self._mm, pos)
+        start = pos + LENGTH.size
+        return self._mm[start:start + length].decode("utf-8"), start + length
+
+    def counts(self) -> Dict[Tuple[str, int], int]:
+        """Количество вопросов по ключу (категория, сложность)"""
+        return {key: count for key, (count, _) in self._buckets.items()}
+
+    def get(self, category: str, difficulty: int, index: int) -> Dict[str, Any]:
+        """Декодировать index-й вопрос корзины"""
+        count, array_pos = self._buckets[(category, difficulty)]
+        if not 0 <= index < count:
+            raise IndexError(index)
+        (pos,) = OFFSET.unpack_from(self._mm, array_pos + index * OFFSET.size)
+        (n,) = COUNT.unpack_from(self._mm, pos)
+        pos += COUNT.size
+        strings = []
+        for _ in range(n):
+            value, pos = self._string(pos)
+            strings.append(value)
+        question = {"q": strings[0], "a": strings[2:]}
+        if strings[1]:
+            question["explanation"] = strings[1]
+        return question
+
+    def close(self):
+        self._mm.close()
+
+
+def main():
+    from questions import QuestionBank, QUESTION_PACKS_DIR
+
+    parser = argparse.ArgumentParser(description="Компиляция вопросов в хранилище для mmap")
+    parser.add_argument("--packs", default=QUESTION_PACKS_DIR, help="каталог с паками *.jsonl/*.csv")
+    parser.add_argument("-o", "--output", default="questions.qpack", help="файл хранилища")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    bank = QuestionBank(packs_dir=args.packs, store_path=None)
+    rows = (
+        (category.value, q["difficulty"].value, q["q"], q["a"], q.get("explanation", ""))
+        for category in bank.get_categories()
+        for q in bank.get_questions_by_category(category)
+    )
+    total, written = compile_store(args.output, rows)
+    logger.info(f"Записано {total} вопросов в {written}")
+
+
+if __name__ == "__main__":
+    main()
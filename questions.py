@@ -1,6 +1,28 @@
+import os
 import random
-from typing import List, Dict, Any
+import asyncio
+import bisect
+import logging
+import threading
+from itertools import accumulate
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple, Mapping
 from enum import Enum
+from question_packs import PackStore
+from question_store import MappedQuestionStore, remove_old_versions, resolve_store
+from matcher import compile_answers, matches
+
+logger = logging.getLogger(__name__)
+
+# Каталог с паками вопросов (*.jsonl, *.csv)
+QUESTION_PACKS_DIR = os.getenv("QUESTION_PACKS_DIR", "packs")
+# Скомпилированное хранилище вопросов (python question_store.py). Если файл
+# есть, вопросы берутся только из него
+QUESTION_STORE_PATH = os.getenv("QUESTION_STORE_PATH", "questions.qpack")
+# Период проверки изменений паков и хранилища (секунды), 0 - без перезагрузки
+QUESTION_RELOAD_INTERVAL = float(os.getenv("QUESTION_RELOAD_INTERVAL", "30"))
+# Разбирать категории из паков в фоне сразу после запуска (0 - только по запросу)
+QUESTION_WARMUP = os.getenv("QUESTION_WARMUP", "1") not in ("0", "false", "no")
 
 class Difficulty(Enum):
     EASY = 1
@@ -17,8 +39,23 @@ class Category(Enum):
     TECHNOLOGY = "technology"
     NATURE = "nature"
 
+BucketKey = Tuple[Optional["Category"], Optional["Difficulty"]]
+
+def make_question(question: Dict[str, Any], category: "Category", difficulty: "Difficulty") -> Mapping[str, Any]:
+    """Неизменяемая запись вопроса с категорией"""
+    answers = tuple(question["a"])
+    return MappingProxyType({**question, "a": answers, "answers": compile_answers(answers),
+                             "difficulty": difficulty, "category": category})
+
+def parse_difficulty(value: str) -> "Difficulty":
+    """Сложность из пака: easy/medium/hard или 1/2/3"""
+    if value.isdigit():
+        return Difficulty(int(value))
+    return Difficulty[value.upper()]
+
 class QuestionBank:
-    def __init__(self):
+    def __init__(self, packs_dir: Optional[str] = QUESTION_PACKS_DIR,
+                 store_path: Optional[str] = QUESTION_STORE_PATH):
         self.questions = {
             Category.MATH: [
                 {"q": "2 + 2 × 2 = ?", "a": ["6"], "difficulty": Difficulty.EASY, "explanation": "Сначала умножение: 2 × 2 = 4, потом сложение: 2 + 4 = 6"},
@@ -106,28 +143,260 @@ class QuestionBank:
             "hard": ["программирование", "администрирование", "дифференциал", "криптография", "археология"]
         }
 
-    def get_question(self, category: Category = None, difficulty: Difficulty = None) -> Dict[str, Any]:
+        self.packs_dir = packs_dir
+        self.store_path = store_path
+        self._watcher: Optional[asyncio.Task] = None
+        self._warmer: Optional[asyncio.Task] = None
+        # Разбор категорий из паков: один за раз, в потоке для асинхронных вызовов
+        self._load_lock = threading.Lock()
+        self._loading: Dict[Category, asyncio.Future] = {}
+
+        self.store = None
+        store_file = resolve_store(store_path) if store_path else None
+        if store_file:
+            self.store = MappedQuestionStore(store_file)
+            logger.info(f"Вопросы из хранилища {store_file}")
+
+        self.packs = PackStore(packs_dir) if packs_dir else None
+        if self.packs:
+            self.packs.scan()
+            for riddle_type, riddles in self.packs.riddles.items():
+                self.riddles.setdefault(riddle_type, []).extend(riddles)
+            for word_type, words in self.packs.words.items():
+                self.words.setdefault(word_type, []).extend(words)
+
+        self._build_index()
+
+    def _build_index(self):
+        """Построить индекс (категория, сложность) -> кортеж вопросов.
+
+        Встроенные вопросы раскладываются по корзинам сразу, вопросы из паков
+        учитываются только количеством и разбираются при первом обращении к
+        категории. Для каждой комбинации с None ("любая категория" /
+        "любая сложность") заранее готовится список корзин с накопленными
+        размерами, чтобы выбор оставался равномерным.
+        """
+        buckets: Dict[BucketKey, list] = {}
+        # Встроенные вопросы уже скомпилированы в хранилище
+        builtin = {} if self.store else self.questions
+        for category, questions in builtin.items():
+            for q in questions:
+                buckets.setdefault((category, q["difficulty"]), []).append(
+                    make_question(q, category, q["difficulty"]))
+        self._buckets: Dict[BucketKey, tuple] = {key: tuple(records) for key, records in buckets.items()}
+        # Загадки хранятся в состоянии FSM как обычные словари, поэтому их
+        # варианты ответа компилируются в кеш matcher
+        for riddles in self.riddles.values():
+            for riddle in riddles:
+                compile_answers(tuple(riddle["a"]))
+
+        counts = {key: len(records) for key, records in self._buckets.items()}
+        self._unloaded: set = set()
+        if self.store:
+            for (category, difficulty), count in self.store.counts().items():
+                counts[(Category(category), Difficulty(difficulty))] = count
+        elif self.packs:
+            for (category, difficulty), count in self.packs.counts().items():
+                try:
+                    key = (Category(category), parse_difficulty(difficulty))
+                except (ValueError, KeyError):
+                    logger.warning(f"Неизвестная категория или сложность в паке: {category}/{difficulty}")
+                    continue
+                counts[key] = counts.get(key, 0) + count
+                self._unloaded.add(key[0])
+
+        self._counts: Dict[BucketKey, int] = counts
+        self._build_choices()
+
+    def _build_choices(self):
+        """Накопленные размеры корзин для равномерного выбора"""
+        choices: Dict[BucketKey, list] = {}
+        for (category, difficulty), count in self._counts.items():
+            if not count:
+                continue
+            for key in ((category, difficulty), (category, None), (None, difficulty), (None, None)):
+                choices.setdefault(key, []).append(((category, difficulty), count))
+        self._choices: Dict[BucketKey, Tuple[tuple, tuple]] = {
+            key: (tuple(k for k, _ in items), tuple(accumulate(n for _, n in items)))
+            for key, items in choices.items()
+        }
+
+    def _bucket(self, key: BucketKey) -> tuple:
+        """Корзина вопросов; категория из паков разбирается при первом обращении"""
+        category = key[0]
+        if self.store:
+            count = self.store.counts().get((category.value, key[1].value), 0)
+            return tuple(self._question(key, i) for i in range(count))
+        if category in self._unloaded:
+            self._load_category(category)
+        return self._buckets.get(key, ())
+
+    def _load_category(self, category: Category):
+        """Разобрать категорию из паков (синхронно или в потоке)"""
+        with self._load_lock:
+            packs = self.packs
+            if category not in self._unloaded:
+                return
+            loaded = packs.load_category(category.value)
+            if self.packs is not packs:
+                # Банк перезагружен, пока разбиралась категория
+                return
+            for difficulty_name, questions in loaded.items():
+                difficulty = parse_difficulty(difficulty_name)
+                records = tuple(make_question(q, category, difficulty) for q in questions)
+                self._buckets[(category, difficulty)] = self._buckets.get((category, difficulty), ()) + records
+            self._unloaded.discard(category)
+            # Пропущенные при разборе записи убираем и из размеров корзин
+            counts = {k: len(self._buckets.get(k, ())) for k in self._counts if k[0] == category}
+            if any(self._counts[k] != n for k, n in counts.items()):
+                self._counts.update(counts)
+                self._build_choices()
+            logger.info(f"Загружена категория {category.value} из паков")
+
+    def _loading_task(self, category: Category) -> asyncio.Future:
+        """Разбор категории в потоке; одновременные запросы ждут одну загрузку"""
+        task = self._loading.get(category)
+        if task is None:
+            task = self._loading[category] = asyncio.ensure_future(
+                asyncio.to_thread(self._load_category, category))
+            task.add_done_callback(lambda _: self._loading.pop(category, None))
+        return task
+
+    def _pick(self, category: Optional[Category], difficulty: Optional[Difficulty]) -> Tuple[BucketKey, int]:
+        """Случайная корзина и номер вопроса в ней"""
+        # Если нет вопросов с заданными параметрами, берем любой
+        keys, sizes = self._choices.get((category, difficulty)) or self._choices[(None, None)]
+        pos = random.randrange(sizes[-1])
+        i = bisect.bisect_right(sizes, pos)
+        return keys[i], pos - (sizes[i - 1] if i else 0)
+
+    def _pick_loaded(self, category: Optional[Category],
+                     difficulty: Optional[Difficulty]) -> Optional[Tuple[BucketKey, int]]:
+        """Как _pick, но только среди уже разобранных категорий"""
+        keys, sizes = self._choices.get((category, difficulty)) or self._choices[(None, None)]
+        loaded = [(key, size - previous) for key, size, previous in zip(keys, sizes, (0,) + sizes[:-1])
+                  if key[0] not in self._unloaded]
+        if not loaded:
+            return None
+        pos = random.randrange(sum(count for _, count in loaded))
+        for key, count in loaded:
+            if pos < count:
+                return key, pos
+            pos -= count
+        return None
+
+    def get_question(self, category: Category = None, difficulty: Difficulty = None) -> Mapping[str, Any]:
         """Получить случайный вопрос"""
-        if category:
-            questions = self.questions.get(category, [])
-        else:
-            # Собираем все вопросы из всех категорий
-            questions = []
-            for cat_questions in self.questions.values():
-                questions.extend(cat_questions)
+        return self._question(*self._pick(category, difficulty))
+
+    async def get_question_async(self, category: Category = None,
+                                 difficulty: Difficulty = None) -> Mapping[str, Any]:
+        """Получить случайный вопрос, не блокируя цикл событий.
+
+        Еще не разобранная категория из паков загружается в потоке. Пока она
+        загружается, вопрос берется из уже разобранных категорий, а если
+        подходящих нет - ждем загрузку и выбираем заново (размеры корзин
+        могли уточниться).
+        """
+        while True:
+            key, index = self._pick(category, difficulty)
+            if self.store or key[0] not in self._unloaded:
+                return self._question(key, index)
+            task = self._loading_task(key[0])
+            fallback = self._pick_loaded(category, difficulty)
+            if fallback is not None:
+                return self._question(*fallback)
+            await asyncio.shield(task)
 
-        if difficulty:
-            questions = [q for q in questions if q["difficulty"] == difficulty]
+    def _question(self, key: BucketKey, index: int) -> Mapping[str, Any]:
+        if self.store:
+            # Декодируем из mmap только выбранный вопрос
+            category, difficulty = key
+            return make_question(self.store.get(category.value, difficulty.value, index), category, difficulty)
+        bucket = self._bucket(key)
+        if index < len(bucket):
+            return bucket[index]
+        # Корзина оказалась меньше проиндексированной: размеры уже исправлены
+        return self.get_question(*key)
 
-        if not questions:
-            # Если нет вопросов с заданными параметрами, берем любой
-            questions = []
-            for cat_questions in self.questions.values():
-                questions.extend(cat_questions)
+    def _sources_signature(self) -> tuple:
+        """Время изменения и размеры файлов паков и хранилища"""
+        files = []
+        if self.packs_dir and os.path.isdir(self.packs_dir):
+            for entry in sorted(os.scandir(self.packs_dir), key=lambda e: e.name):
+                if entry.name.endswith((".jsonl", ".csv")):
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        store_file = resolve_store(self.store_path) if self.store_path else None
+        if store_file:
+            stat = os.stat(store_file)
+            files.append((store_file, stat.st_mtime_ns, stat.st_size))
+        return tuple(files)
 
-        question = random.choice(questions)
-        question["category"] = self._find_category(question)
-        return question
+    def _build_replacement(self) -> "QuestionBank":
+        """Собрать новый банк (выполняется в отдельном потоке)"""
+        bank = QuestionBank(self.packs_dir, self.store_path)
+        # Заранее разбираем категории, которые уже использовались,
+        # чтобы первый вопрос после перезагрузки не блокировал цикл событий
+        loaded = {key[0] for key in self._choices if key[0] is not None} - self._unloaded
+        for category in loaded & bank._unloaded:
+            bank._bucket((category, Difficulty.EASY))
+        return bank
+
+    async def reload(self):
+        """Пересобрать банк в фоне и атомарно переключиться на него.
+
+        Уже выданные вопросы - неизменяемые записи старого банка, поэтому
+        ответы на них проверяются как раньше.
+        """
+        new = await asyncio.to_thread(self._build_replacement)
+        old_store = self.store
+        # Переключение без await между присваиваниями
+        for name in ("questions", "riddles", "words", "store", "packs", "_buckets", "_counts", "_choices", "_unloaded"):
+            setattr(self, name, getattr(new, name))
+        if old_store is not None and old_store is not self.store:
+            old_store.close()
+            # Закрытую версию теперь можно удалить и в Windows
+            remove_old_versions(self.store_path)
+        logger.info("Банк вопросов перезагружен")
+
+    def start(self, interval: float = QUESTION_RELOAD_INTERVAL, warmup: bool = QUESTION_WARMUP):
+        """Запуск фоновой проверки источников вопросов и разбора паков"""
+        if interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch(interval))
+        if warmup and self._unloaded and self._warmer is None:
+            self._warmer = asyncio.create_task(self._warm_up())
+
+    async def _warm_up(self):
+        """Разобрать категории из паков в потоке, по одной"""
+        for category in list(self._unloaded):
+            try:
+                await asyncio.shield(self._loading_task(category))
+            except Exception as e:
+                logger.error(f"Ошибка загрузки категории {category.value}: {e}")
+
+    async def _watch(self, interval: float):
+        signature = await asyncio.to_thread(self._sources_signature)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current = await asyncio.to_thread(self._sources_signature)
+                if current != signature:
+                    signature = current
+                    await self.reload()
+            except Exception as e:
+                logger.error(f"Ошибка перезагрузки банка вопросов: {e}")
+
+    async def close(self):
+        """Остановка фоновой проверки и разбора паков"""
+        for task in (self._watcher, self._warmer):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._watcher = self._warmer = None
 
     def get_riddle(self, difficulty: str = None) -> Dict[str, Any]:
         """Получить загадку"""
@@ -153,26 +422,21 @@ class QuestionBank:
 
         return random.choice(words)
 
-    def _find_category(self, question: Dict[str, Any]) -> Category:
-        """Найти категорию вопроса"""
-        for category, questions in self.questions.items():
-            if question in questions:
-                return category
-        return Category.CULTURE  # По умолчанию
-
     def get_categories(self) -> List[Category]:
         """Получить список всех категорий"""
-        return list(self.questions.keys())
+        return list(dict.fromkeys(key[0] for key in self._choices if key[0] is not None))
 
-    def get_questions_by_category(self, category: Category) -> List[Dict[str, Any]]:
+    def get_questions_by_category(self, category: Category) -> List[Mapping[str, Any]]:
         """Получить все вопросы определенной категории"""
-        return self.questions.get(category, [])
+        questions = []
+        for difficulty in Difficulty:
+            questions.extend(self._bucket((category, difficulty)))
+        return questions
 
-    def check_answer(self, question: Dict[str, Any], user_answer: str) -> bool:
-        """Проверить ответ пользователя"""
-        user_answer = user_answer.lower().strip()
-        correct_answers = [ans.lower() for ans in question["a"]]
-        return user_answer in correct_answers
+    def check_answer(self, question: Mapping[str, Any], user_answer: str) -> bool:
+        """Проверить ответ пользователя (вопрос или загадка)"""
+        accepted = question.get("answers") or compile_answers(tuple(question["a"]))
+        return matches(accepted, user_answer)
 
     def get_difficulty_multiplier(self, difficulty: Difficulty) -> int:
         """Получить множитель очков за сложность"""
@@ -187,7 +451,7 @@ class QuestionBank:
         """Получить статистику по базе вопросов"""
         stats = {
             "total_questions": 0,
-            "categories": len(self.questions),
+            "categories": len(self.get_categories()),
             "easy_questions": 0,
             "medium_questions": 0,
             "hard_questions": 0,
@@ -195,15 +459,10 @@ class QuestionBank:
             "total_words": sum(len(words) for words in self.words.values())
         }
 
-        for questions in self.questions.values():
-            stats["total_questions"] += len(questions)
-            for q in questions:
-                if q["difficulty"] == Difficulty.EASY:
-                    stats["easy_questions"] += 1
-                elif q["difficulty"] == Difficulty.MEDIUM:
-                    stats["medium_questions"] += 1
-                elif q["difficulty"] == Difficulty.HARD:
-                    stats["hard_questions"] += 1
+        for difficulty in Difficulty:
+            _, sizes = self._choices.get((None, difficulty), ((), (0,)))
+            stats[f"{difficulty.name.lower()}_questions"] = sizes[-1]
+            stats["total_questions"] += sizes[-1]
 
         return stats
 
@@ -0,0 +1,269 @@
+"""Очередь исходящих сообщений с учетом лимитов Telegram.
+
+Запросы send*/edit*/copy*/forward* к Bot API проходят через middleware
+сессии бота и ставятся в очередь своего чата. Каждый чат отправляет по
+порядку, ограниченный своим ведром токенов (около 1 сообщения в секунду в
+личке и 20 в минуту в группах), и все чаты вместе - общим ведром
+(SEND_GLOBAL_RATE в секунду). Лимит общий на весь бот: при BOT_WORKERS > 1
+каждый воркер получает свою долю SEND_GLOBAL_RATE / BOT_WORKERS (см.
+sharding.py). Общие токены выдаются по приоритету:
+ответы пользователям раньше рассылок. При TelegramRetryAfter отправка
+приостанавливается на указанное время и повторяется.
+
+Обработчик не ждет отправки: сразу получает заглушку результата, а ошибка
+отправки пишется в лог. Чтобы дождаться настоящего результата (например,
+в рассылке), запросы выполняются внутри with bulk() или with waiting().
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Set, Tuple, Union, get_args
+from cachetools import TTLCache
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message
+
+logger = logging.getLogger(__name__)
+
+# Очередь исходящих сообщений (0 - отправлять напрямую, как раньше)
+SEND_QUEUE_ENABLED = os.getenv("SEND_QUEUE_ENABLED", "1") not in ("0", "false", "no")
+# Сообщений в секунду на весь бот (делится между воркерами при BOT_WORKERS > 1)
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "25"))
+# Сообщений в секунду в личный чат и в минуту в группу, запас для всплеска
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE_PER_MINUTE = float(os.getenv("SEND_GROUP_RATE_PER_MINUTE", "20"))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+# Повторов после TelegramRetryAfter
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# Полосы приоритета: меньше - раньше
+INTERACTIVE = 0
+BULK = 1
+
+_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+# (полоса, ждать ли результата) для запросов текущей задачи
+_options: contextvars.ContextVar[Tuple[int, bool]] = contextvars.ContextVar(
+    "send_queue_options", default=(INTERACTIVE, False)
+)
+
+
+@contextmanager
+def bulk() -> Iterator[None]:
+    """Запросы внутри блока идут в полосу рассылок и ждут результата"""
+    token = _options.set((BULK, True))
+    try:
+        yield
+    finally:
+        _options.reset(token)
+
+
+@contextmanager
+def waiting() -> Iterator[None]:
+    """Запросы внутри блока ждут результата отправки"""
+    token = _options.set((_options.get()[0], True))
+    try:
+        yield
+    finally:
+        _options.reset(token)
+
+
+class TokenBucket:
+    """Ведро токенов: rate в секунду, не больше capacity про запас"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Взять токен; если его нет - вернуть, сколько секунд ждать"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class PriorityGate:
+    """Общий лимит: токены выдаются ожидающим в порядке приоритета"""
+
+    def __init__(self, rate: float):
+        self._bucket = TokenBucket(rate, max(1.0, rate))
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._task = None
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float):
+        """Приостановить все отправки (после flood control)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, lane: int):
+        if not self._waiters and time.monotonic() >= self._paused_until and not self._bucket.take():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane, next(self._seq), future))
+        if self._task is None:
+            self._task = asyncio.create_task(self._grant())
+        await future
+
+    async def _grant(self):
+        try:
+            while self._waiters:
+                delay = self._paused_until - time.monotonic()
+                if delay <= 0:
+                    delay = self._bucket.take()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            self._task = None
+
+
+# Элемент очереди чата: полоса, следующий обработчик запроса, бот, метод, результат
+_Item = Tuple[int, NextRequestMiddlewareType, Any, TelegramMethod, asyncio.Future]
+
+
+class SendQueue(BaseRequestMiddleware):
+    """Middleware сессии бота: очереди по чатам и общий приоритетный лимит"""
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
+                 group_rate_per_minute: float = SEND_GROUP_RATE_PER_MINUTE, burst: int = SEND_CHAT_BURST,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_minute / 60
+        self.burst = burst
+        self.max_retries = max_retries
+        self._gate = PriorityGate(global_rate)
+        # Простаивающее ведро все равно наполнено, поэтому его можно забыть
+        self._buckets: TTLCache = TTLCache(maxsize=100_000, ttl=max(60.0, burst / self.group_rate))
+        self._chats: Dict[Union[int, str], Deque[_Item]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def set_global_rate(self, rate: float):
+        """Изменить общий лимит (до первой отправки, например в воркере)"""
+        self._gate = PriorityGate(rate)
+
+    def pending(self) -> int:
+        """Сколько запросов ждут отправки"""
+        return sum(len(items) for items in self._chats.values())
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Any, method: TelegramMethod) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not method.__api_method__.startswith(_LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        lane, wait = _options.get()
+        placeholder = None if wait else _placeholder(method, chat_id)
+        future = asyncio.get_running_loop().create_future()
+        items = self._chats.get(chat_id)
+        if items is None:
+            items = self._chats[chat_id] = deque()
+            task = asyncio.create_task(self._run_chat(chat_id, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        items.append((lane, make_request, bot, method, future))
+
+        if placeholder is None:
+            return await future
+        future.add_done_callback(lambda f: _log_failure(f, method, chat_id))
+        return placeholder
+
+    def _bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательные id и @username - группы и каналы
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = TokenBucket(self.chat_rate if private else self.group_rate, self.burst)
+        # Запись заново продлевает срок жизни ведра в кеше
+        self._buckets[chat_id] = bucket
+        return bucket
+
+    async def _run_chat(self, chat_id: Union[int, str], items: Deque[_Item]):
+        try:
+            retries = 0
+            while items:
+                lane, make_request, bot, method, future = items[0]
+                if future.done():
+                    items.popleft()
+                    continue
+                bucket = self._bucket(chat_id)
+                delay = bucket.take()
+                while delay:
+                    await asyncio.sleep(delay)
+                    delay = bucket.take()
+                await self._gate.acquire(lane)
+                try:
+                    result = await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    if retries < self.max_retries:
+                        retries += 1
+                        logger.warning(f"Flood control в чате {chat_id}, повтор через {e.retry_after} с")
+                        self._gate.pause(e.retry_after)
+                        await asyncio.sleep(e.retry_after)
+                        continue
+                    result = e
+                except Exception as e:
+                    result = e
+                # Ожидающий мог отменить запрос, пока тот стоял в очереди
+                if not future.done():
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                items.popleft()
+                retries = 0
+        finally:
+            del self._chats[chat_id]
+            for item in items:
+                item[4].cancel()
+
+    async def drain(self, timeout: float = 10):
+        """Дождаться отправки очереди (при остановке бота)"""
+        if self._tasks:
+            done, pending = await asyncio.wait(list(self._tasks), timeout=timeout)
+            if pending:
+                logger.warning(f"Не отправлено {self.pending()} сообщений при остановке")
+                for task in pending:
+                    task.cancel()
+
+
+def _placeholder(method: TelegramMethod, chat_id: Union[int, str]) -> Any:
+    """Результат, который обработчик получает сразу, или None, если его надо ждать"""
+    returning = method.__returning__
+    if bool in get_args(returning):
+        return True
+    if returning is Message:
+        return Message(
+            message_id=0,
+            date=datetime.now(),
+            chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+            text=getattr(method, "text", None),
+        )
+    return None
+
+
+def _log_failure(future: asyncio.Future, method: TelegramMethod, chat_id: Union[int, str]):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Не удалось выполнить {method.__api_method__} в чате {chat_id}: {future.exception()}")
+
+
+# Глобальная очередь процесса
+send_queue = SendQueue()
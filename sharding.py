@@ -0,0 +1,181 @@
+"""Запуск бота в нескольких процессах с разбиением обновлений по пользователю.
+
+Процесс-диспетчер один раз получает обновления через getUpdates и
+раскладывает их по очередям воркеров по from_user.id % N. Каждый воркер
+запускает свой Dispatcher со всеми роутерами, поэтому обновления одного
+пользователя всегда обрабатываются одним процессом и по порядку.
+
+Воркеры делят данные через SQLite (DATA_BACKEND=sqlite, FSM_STORAGE=sqlite).
+Общий лимит отправки SEND_GLOBAL_RATE делится поровну между воркерами:
+у каждого своя очередь send_queue, а лимит Telegram - на весь бот.
+"""
+import os
+import queue
+import signal
+import asyncio
+import logging
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+from aiogram.types import Update
+from aiogram.types.update import UpdateTypeLookupError
+from metrics import METRICS_PORT
+from logging_config import use_queue
+
+logger = logging.getLogger(__name__)
+
+# Число процессов-воркеров (0 или 1 - обычный запуск в одном процессе)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "0"))
+# Максимум обновлений в очереди одного воркера
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "10000"))
+# Максимум обновлений в обработке у одного воркера: следующее берется из
+# очереди только после завершения одного из них, поэтому очередь воркера
+# остается ограниченной и диспетчер притормаживает прием
+SHARD_MAX_INFLIGHT = int(os.getenv("SHARD_MAX_INFLIGHT", "1000"))
+# Таймаут long polling диспетчера (секунды)
+SHARD_POLLING_TIMEOUT = int(os.getenv("SHARD_POLLING_TIMEOUT", "10"))
+
+# (id пользователя, обновление в JSON); None - сигнал остановки
+ShardItem = Optional[Tuple[int, str]]
+
+
+def shard_for(user_id: int, workers: int) -> int:
+    """Номер воркера для пользователя"""
+    return user_id % workers
+
+
+def run_worker(index: int, workers: int, updates: multiprocessing.Queue, log_queue=None):
+    """Точка входа процесса-воркера"""
+    if log_queue is not None:
+        # Файл логов пишет только процесс-диспетчер
+        use_queue(log_queue)
+    # Остановкой управляет диспетчер: воркер дорабатывает очередь до сигнала None
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(index, workers, updates))
+
+
+async def _worker_main(index: int, workers: int, updates: multiprocessing.Queue):
+    from bot import create_bot, create_dispatcher, get_token
+    from send_queue import SEND_GLOBAL_RATE, send_queue
+
+    send_queue.set_global_rate(SEND_GLOBAL_RATE / workers)
+
+    bot = create_bot(get_token())
+    dp = create_dispatcher()
+    loop = asyncio.get_running_loop()
+    # Последняя задача каждого пользователя: следующая ждет ее завершения
+    tails: Dict[int, asyncio.Task] = {}
+    inflight = asyncio.Semaphore(SHARD_MAX_INFLIGHT)
+
+    async def process(user_id: int, raw: str, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await dp.feed_update(bot, Update.model_validate_json(raw, context={"bot": bot}))
+        except Exception as e:
+            logger.error(f"Воркер {index}: ошибка обработки обновления: {e}")
+        finally:
+            inflight.release()
+            # Цепочка пользователя закончилась - забываем его
+            if tails.get(user_id) is asyncio.current_task():
+                del tails[user_id]
+
+    # У каждого воркера свой эндпоинт метрик: METRICS_PORT + 1 + номер
+    await dp.emit_startup(bot=bot, dispatcher=dp, metrics_port=METRICS_PORT + 1 + index if METRICS_PORT else 0)
+    logger.info(f"Воркер {index} запущен (pid {os.getpid()})")
+    try:
+        while True:
+            await inflight.acquire()
+            item: ShardItem = await loop.run_in_executor(None, updates.get)
+            if item is None:
+                inflight.release()
+                break
+            user_id, raw = item
+            tails[user_id] = asyncio.create_task(process(user_id, raw, tails.get(user_id)))
+        if tails:
+            await asyncio.wait(list(tails.values()))
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+        logger.info(f"Воркер {index} остановлен")
+
+
+class ShardSupervisor:
+    """Получение обновлений и раздача их процессам-воркерам"""
+
+    def __init__(self, workers: int = BOT_WORKERS, queue_size: int = SHARD_QUEUE_SIZE, log_queue=None):
+        if workers < 2:
+            raise ValueError("Для разбиения по процессам нужно не меньше 2 воркеров")
+        self.workers = workers
+        self.log_queue = log_queue
+        # spawn: воркеры не наследуют цикл событий и открытые базы диспетчера
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queues: List[multiprocessing.Queue] = [self._ctx.Queue(queue_size) for _ in range(workers)]
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(
+            target=run_worker, args=(index, self.workers, self._queues[index], self.log_queue),
+            name=f"bot-worker-{index}", daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _check_workers(self):
+        for index, process in enumerate(self._processes):
+            if process is not None and not process.is_alive():
+                logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапуск")
+                self._spawn(index)
+
+    async def _put(self, index: int, item: ShardItem):
+        try:
+            self._queues[index].put_nowait(item)
+        except queue.Full:
+            # Воркер не успевает: ждем места, не принимая новые обновления
+            await asyncio.get_running_loop().run_in_executor(None, self._queues[index].put, item)
+
+    async def dispatch(self, update: Update) -> int:
+        """Отправить обновление воркеру, вернуть его номер"""
+        try:
+            user = getattr(update.event, "from_user", None)
+        except UpdateTypeLookupError:
+            user = None
+        user_id = user.id if user is not None else 0
+        index = shard_for(user_id, self.workers)
+        await self._put(index, (user_id, update.model_dump_json(exclude_none=True)))
+        return index
+
+    async def run(self, bot, allowed_updates: List[str]):
+        """Цикл long polling до отмены задачи"""
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Запущено {self.workers} воркеров, начинаю polling...")
+        offset = None
+        try:
+            while True:
+                self._check_workers()
+                try:
+                    updates = await bot.get_updates(
+                        offset=offset, timeout=SHARD_POLLING_TIMEOUT, allowed_updates=allowed_updates
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка получения обновлений: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    await self.dispatch(update)
+                    offset = update.update_id + 1
+        finally:
+            await self.stop()
+
+    async def stop(self, timeout: float = 30):
+        """Остановка воркеров после обработки уже розданных обновлений"""
+        loop = asyncio.get_running_loop()
+        for index, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                await loop.run_in_executor(None, self._queues[index].put, None)
+        for process in self._processes:
+            if process is not None:
+                await loop.run_in_executor(None, process.join, timeout)
+                if process.is_alive():
+                    process.terminate()
+        self._processes = [None] * self.workers
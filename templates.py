@@ -0,0 +1,89 @@
+"""Шаблоны текстов сообщений.
+
+Шаблон - строка в синтаксисе str.format ({score}, {accuracy:.1f}),
+регистрируется один раз при импорте модуля обработчиков и отрисовывается
+из словаря контекста. Поля шаблона разбираются при регистрации: шаблон
+без полей сразу хранится готовым текстом и не форматируется на каждом
+вызове, а опечатка в поле видна как KeyError при первой отрисовке.
+
+Тексты, зависящие только от данных пользователя (карточки статистики),
+кешируются в RenderCache по версии пользователя (UserData.version,
+растет при каждом изменении пользователя).
+"""
+import os
+from string import Formatter
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Mapping, Optional, Tuple
+from cachetools import LRUCache
+
+# Отрисованных карточек в кеше каждого RenderCache
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "10000"))
+
+
+class Template:
+    """Скомпилированный шаблон"""
+
+    __slots__ = ("name", "source", "fields", "static", "_format")
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        self.fields: FrozenSet[str] = frozenset(
+            field.split(".", 1)[0].split("[", 1)[0]
+            for _, field, _, _ in Formatter().parse(source) if field is not None
+        )
+        # Текст без полей отрисовывается один раз ({{ }} превращаются в { })
+        self.static: Optional[str] = None if self.fields else source.format()
+        self._format = source.format_map
+
+    def render(self, context: Optional[Mapping[str, Any]] = None, **kwargs: Any) -> str:
+        if self.static is not None:
+            return self.static
+        if kwargs:
+            context = {**context, **kwargs} if context else kwargs
+        return self._format(context)
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+class TemplateRegistry:
+    """Все шаблоны бота по именам"""
+
+    def __init__(self):
+        self._templates: Dict[str, Template] = {}
+
+    def register(self, name: str, source: str) -> Template:
+        if name in self._templates:
+            raise ValueError(f"Шаблон {name!r} уже зарегистрирован")
+        template = self._templates[name] = Template(name, source)
+        return template
+
+    def __getitem__(self, name: str) -> Template:
+        return self._templates[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def render(self, name: str, context: Optional[Mapping[str, Any]] = None, **kwargs: Any) -> str:
+        return self._templates[name].render(context, **kwargs)
+
+
+class RenderCache:
+    """Отрисованный шаблон по ключу, пока не изменилась версия данных"""
+
+    def __init__(self, template: Template, maxsize: int = RENDER_CACHE_SIZE):
+        self.template = template
+        self._cache: LRUCache = LRUCache(maxsize=maxsize)
+
+    def render(self, key: Hashable, version: Hashable, context: Callable[[], Mapping[str, Any]]) -> str:
+        """context вызывается только при промахе кеша"""
+        cached: Optional[Tuple[Hashable, str]] = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        text = self.template.render(context())
+        self._cache[key] = (version, text)
+        return text
+
+
+# Глобальный реестр
+templates = TemplateRegistry()
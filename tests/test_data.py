@@ -0,0 +1,123 @@
+"""Одинаковые ответы рейтинга у UserData (JSON) и SqliteUserData"""
+import asyncio
+
+import pytest
+
+from data import SqliteUserData, UserData
+
+# (user_id, очки): есть равные очки, отрицательные и нулевые
+SCORES = [(15, 10), (3, 10), (42, 7), (7, 10), (100, 0), (8, -2), (21, 7), (5, 3), (9, 7), (11, 0)]
+
+
+def stores(tmp_path, flush_interval):
+    json_store = UserData(str(tmp_path / "users.json"), flush_interval=flush_interval)
+    sqlite_store = SqliteUserData(str(tmp_path / "users.db"), str(tmp_path / "import.json"),
+                                  flush_interval=flush_interval)
+    return json_store, sqlite_store
+
+
+async def fill(store, scores):
+    await store.load()
+    for user_id, score in scores:
+        await store.apply(user_id, {"score": score, "answered": 1})
+
+
+def snapshot(store):
+    """Все ответы рейтинга, которые сравниваются между хранилищами"""
+    result = {
+        "pages": [[(uid, info["score"]) for uid, info in store.get_leaderboard(3, offset)]
+                  for offset in range(0, 12, 3)],
+        "ranks": {user_id: store.get_rank(user_id) for user_id, _ in SCORES + [(999, 0)]},
+        "around": {user_id: [(rank, uid, info["score"]) for rank, uid, info in store.get_around(user_id, 2)]
+                   for user_id, _ in SCORES},
+        "count": store.count_users(),
+    }
+    pages, cursor = [], ""
+    while True:
+        page = store.user_ids_after(cursor, 4)
+        if not page:
+            break
+        pages.append(page)
+        cursor = page[-1]
+    result["ids"] = pages
+    return result
+
+
+def test_leaderboard_order_with_ties(tmp_path):
+    async def run():
+        store = UserData(str(tmp_path / "users.json"), flush_interval=0)
+        await fill(store, SCORES)
+        return [uid for uid, _ in store.get_leaderboard(10)], store.get_rank(7), store.get_rank(999)
+
+    order, rank, missing = asyncio.run(run())
+    # Очки по убыванию, при равенстве - user_id по возрастанию строк
+    assert order == ["15", "3", "7", "21", "42", "9", "5", "100", "11", "8"]
+    assert rank == 3
+    assert missing is None
+
+
+def test_user_ids_after_pages_in_string_order(tmp_path):
+    async def run():
+        store = UserData(str(tmp_path / "users.json"), flush_interval=0)
+        await fill(store, SCORES)
+        return store.user_ids_after("", 3), store.user_ids_after("3", 3), store.user_ids_after("9", 3)
+
+    first, middle, last = asyncio.run(run())
+    assert first == ["100", "11", "15"]
+    assert middle == ["42", "5", "7"]
+    assert last == []
+
+
+@pytest.mark.parametrize("flush_interval", [0, 3600], ids=["written", "pending"])
+def test_json_and_sqlite_agree(tmp_path, flush_interval):
+    async def run():
+        results = []
+        for store in stores(tmp_path, flush_interval):
+            await fill(store, SCORES)
+            if flush_interval:
+                store.start()
+            # Изменения после первой записи: часть строк в базе, часть в кеше
+            await store.apply(42, {"score": 3})
+            await store.apply(8, {"score": 12})
+            await store.apply(77, {"score": 7, "answered": 1})
+            await store.set_fields(5, score=10)
+            result = snapshot(store)
+            result["stats"] = await store.get_stats_summary()
+            results.append(result)
+            await store.close()
+        return results
+
+    json_result, sqlite_result = asyncio.run(run())
+    assert sqlite_result == json_result
+    assert json_result["count"] == 11
+    assert json_result["ranks"][999] is None
+
+
+def test_sqlite_reads_do_not_flush(tmp_path):
+    async def run():
+        store = SqliteUserData(str(tmp_path / "users.db"), str(tmp_path / "import.json"), flush_interval=3600)
+        await store.load()
+        store.start()
+        await store.apply(1, {"score": 5})
+        await store.apply(2, {"score": 8})
+        leaders = [uid for uid, _ in store.get_leaderboard(10)]
+        stored = store._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        await store.close()
+        return leaders, stored
+
+    leaders, stored = asyncio.run(run())
+    assert leaders == ["2", "1"]
+    assert stored == 0
+
+
+def test_version_changes_without_touching_records(tmp_path):
+    async def run():
+        store = UserData(str(tmp_path / "users.json"), flush_interval=0)
+        await store.load()
+        before = store.version(1)
+        await store.apply(1, {"score": 1})
+        return before, store.version(1), store.get_info(1)
+
+    before, after, info = asyncio.run(run())
+    assert after > before
+    assert "version" not in info
@@ -0,0 +1,40 @@
+from matcher import compile_answers, matches, normalize, within_distance
+
+
+def test_normalize_ignores_case_spaces_and_punctuation():
+    assert normalize("  Москва! ") == "москва"
+    assert normalize("300 000") == "300000"
+    assert normalize("Ёжик") == "ежик"
+    assert normalize("Ответ.") == "ответ"
+
+
+def test_normalize_keeps_formula_signs():
+    assert normalize("x² + c") == "x^2+c"
+    assert normalize("H₂O") == "h2o"
+    assert normalize("2×3") == "2*3"
+    assert normalize("3,14") == "3.14"
+    assert normalize("a−b") == "a-b"
+    assert normalize("x+1") != normalize("x-1")
+
+
+def test_matches_exact_variants():
+    accepted = compile_answers(("Пётр I", "Петр Первый"))
+    assert matches(accepted, "петр i")
+    assert matches(accepted, "Петр  первый!", max_distance=0)
+    assert not matches(accepted, "Петр", max_distance=0)
+
+
+def test_matches_forgives_typos_only_in_long_words():
+    accepted = compile_answers(("Антарктида", "42"))
+    assert matches(accepted, "Антарктеда", max_distance=1)
+    assert not matches(accepted, "Антарктеда", max_distance=0)
+    # Числа с опечаткой - другой ответ
+    assert not matches(accepted, "43", max_distance=1)
+    assert not matches(accepted, "", max_distance=1)
+
+
+def test_within_distance():
+    assert within_distance("кот", "кот", 0)
+    assert within_distance("кот", "кит", 1)
+    assert not within_distance("кот", "кит", 0)
+    assert not within_distance("кот", "котенок", 2)
@@ -0,0 +1,72 @@
+import sqlite3
+
+from pending_questions import PendingQuestions
+from questions import Category, Difficulty, make_question
+
+
+def make(n):
+    return make_question({"q": f"вопрос {n}", "a": [str(n)]}, Category.MATH, Difficulty.EASY)
+
+
+def stored_ids(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {row[0] for row in conn.execute("SELECT user_id FROM pending_questions")}
+    finally:
+        conn.close()
+
+
+def test_get_and_pop():
+    pending = PendingQuestions(maxsize=10, ttl=60, db_path="")
+    pending[1] = make(1)
+    assert 1 in pending
+    assert pending.get(1)["q"] == "вопрос 1"
+    assert pending.pop(1)["a"] == ("1",)
+    assert pending.get(1) is None
+    assert pending.pop(1) is None
+
+
+def test_expired_question_is_dropped():
+    pending = PendingQuestions(maxsize=10, ttl=-1, db_path="")
+    pending[1] = make(1)
+    assert 1 not in pending
+    assert len(pending) == 0
+
+
+def test_eviction_removes_row_from_database(tmp_path):
+    db_path = str(tmp_path / "pending.db")
+    pending = PendingQuestions(maxsize=3, ttl=60, db_path=db_path)
+    for user_id in range(1, 6):
+        pending[user_id] = make(user_id)
+    # Вытесняются давно не использованные
+    assert [user_id for user_id in range(1, 6) if user_id in pending] == [3, 4, 5]
+    assert stored_ids(db_path) == {3, 4, 5}
+
+    pending.pop(4)
+    assert stored_ids(db_path) == {3, 5}
+
+
+def test_restore_after_restart(tmp_path):
+    db_path = str(tmp_path / "pending.db")
+    pending = PendingQuestions(maxsize=10, ttl=60, db_path=db_path)
+    for user_id in range(1, 6):
+        pending[user_id] = make(user_id)
+
+    restored = PendingQuestions(maxsize=10, ttl=60, db_path=db_path)
+    assert len(restored) == 5
+    question = restored.get(3)
+    assert question["q"] == "вопрос 3"
+    assert question["category"] is Category.MATH
+    assert question["difficulty"] is Difficulty.EASY
+    assert "3" in question["answers"]
+
+
+def test_restore_keeps_newest_within_limit(tmp_path):
+    db_path = str(tmp_path / "pending.db")
+    pending = PendingQuestions(maxsize=10, ttl=60, db_path=db_path)
+    for user_id in range(1, 6):
+        pending[user_id] = make(user_id)
+
+    restored = PendingQuestions(maxsize=2, ttl=60, db_path=db_path)
+    assert [user_id for user_id in range(1, 6) if user_id in restored] == [4, 5]
+    assert stored_ids(db_path) == {4, 5}
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from question_packs import PackStore, normalize_difficulty
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def question(q, a, category="math", difficulty="easy", **extra):
+    return json.dumps({"category": category, "difficulty": difficulty, "q": q, "a": a, **extra},
+                      ensure_ascii=False)
+
+
+def test_normalize_difficulty():
+    assert normalize_difficulty("Easy") == "easy"
+    assert normalize_difficulty(3) == "hard"
+    with pytest.raises(ValueError):
+        normalize_difficulty("legendary")
+
+
+def test_scan_skips_malformed_lines(tmp_path):
+    write_lines(tmp_path / "pack.jsonl", [
+        question("2+2", ["4"]),
+        '{"category": "math", "difficulty": "easy", "q": "оборвано',
+        "[1, 2, 3]",
+        "42",
+        question("без сложности", ["1"], difficulty="legendary"),
+        question("", ["1"]),
+        question("без ответа", []),
+        json.dumps({"category": "math", "q": "без сложности", "a": ["1"]}),
+        question("3*3", "9|девять", difficulty="2", explanation="таблица умножения"),
+        json.dumps({"type": "riddle", "q": "Зимой и летом одним цветом", "a": "ель"}, ensure_ascii=False),
+        json.dumps({"type": "word", "q": "Слово", "difficulty": "short"}, ensure_ascii=False),
+    ])
+    store = PackStore(str(tmp_path))
+    store.scan()
+
+    assert store.counts() == {("math", "easy"): 1, ("math", "medium"): 1}
+    assert store.riddles == {"easy": [{"q": "Зимой и летом одним цветом", "a": ["ель"], "hint": ""}]}
+    assert store.words == {"short": ["слово"]}
+
+    loaded = store.load_category("math")
+    assert loaded["easy"] == [{"q": "2+2", "a": ["4"]}]
+    assert loaded["medium"] == [{"q": "3*3", "a": ["9", "девять"], "explanation": "таблица умножения"}]
+
+
+def test_scan_csv_pack(tmp_path):
+    (tmp_path / "pack.csv").write_text(
+        "category,difficulty,q,a\n"
+        "science,hard,Формула воды,H2O|H₂O\n"
+        "science,unknown,Плохая сложность,1\n"
+        'science,"easy\n',
+        encoding="utf-8",
+    )
+    store = PackStore(str(tmp_path))
+    store.scan()
+
+    assert store.counts() == {("science", "hard"): 1}
+    assert store.load_category("science") == {"hard": [{"q": "Формула воды", "a": ["H2O", "H₂O"]}]}
+
+
+def test_load_category_skips_lines_changed_after_scan(tmp_path):
+    path = tmp_path / "pack.jsonl"
+    first, second = question("1+1", ["2"]), question("2+3", ["5"])
+    write_lines(path, [first, second])
+    store = PackStore(str(tmp_path))
+    store.scan()
+
+    # Та же длина, но другая категория: смещения индекса указывают на чужую запись
+    write_lines(path, [first, second.replace('"math"', '"arts"')])
+
+    assert store.load_category("math") == {"easy": [{"q": "1+1", "a": ["2"]}]}
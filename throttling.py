@@ -0,0 +1,131 @@
+"""Ограничение частоты обновлений от одного пользователя.
+
+У каждого пользователя два ведра токенов: общее (THROTTLE_USER_RATE
+обновлений в секунду) и на каждое действие - кнопку вида "game:dice" или
+команду (THROTTLE_ACTION_RATE). Обычный текст (ответы на вопросы и
+загадки, буквы в игре в слова) - отдельное действие "text" со своим, более
+щедрым лимитом (THROTTLE_TEXT_RATE): его набирают быстро и подряд.
+Обновление без токена отбрасывается до FSM и обработчиков, а пользователь
+получает одно короткое уведомление (не чаще раза в THROTTLE_NOTICE_INTERVAL
+секунд); на отброшенные нажатия кнопок всегда отвечаем, чтобы у клиента не
+крутилась загрузка. Ведра хранятся в
+TTLCache: простаивающее ведро все равно полное, поэтому его можно забыть.
+"""
+import os
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from cachetools import TTLCache
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Update, User
+from send_queue import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Ограничение частоты (0 - выключено)
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "1") not in ("0", "false", "no")
+# Обновлений в секунду от пользователя и запас для всплеска
+THROTTLE_USER_RATE = float(os.getenv("THROTTLE_USER_RATE", "3"))
+THROTTLE_USER_BURST = int(os.getenv("THROTTLE_USER_BURST", "10"))
+# То же для одного действия (кнопки или команды)
+THROTTLE_ACTION_RATE = float(os.getenv("THROTTLE_ACTION_RATE", "1"))
+THROTTLE_ACTION_BURST = int(os.getenv("THROTTLE_ACTION_BURST", "5"))
+# То же для текстовых сообщений без команды
+THROTTLE_TEXT_RATE = float(os.getenv("THROTTLE_TEXT_RATE", "3"))
+THROTTLE_TEXT_BURST = int(os.getenv("THROTTLE_TEXT_BURST", "10"))
+# Не чаще одного уведомления за столько секунд
+THROTTLE_NOTICE_INTERVAL = float(os.getenv("THROTTLE_NOTICE_INTERVAL", "10"))
+THROTTLE_CACHE_SIZE = int(os.getenv("THROTTLE_CACHE_SIZE", "100000"))
+
+NOTICE_TEXT = "⏳ Слишком часто! Подождите пару секунд."
+
+# Действие для текста без команды
+TEXT_ACTION = "text"
+
+
+def update_action(update: Update) -> Optional[str]:
+    """Действие обновления: кнопка без параметров страницы, команда или текст"""
+    if update.callback_query is not None:
+        # "leaderboard:page:3" и "leaderboard:page:4" - одно действие
+        return ":".join((update.callback_query.data or "").split(":", 2)[:2])
+    if update.message is not None:
+        text = update.message.text or ""
+        if text.startswith("/"):
+            return text.split(maxsplit=1)[0].split("@", 1)[0]
+        return TEXT_ACTION
+    return None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Outer middleware обновлений: отбрасывает слишком частые обновления.
+
+    Регистрируется до FSMContextMiddleware, поэтому отброшенное обновление
+    не читает состояние и не ждет блокировку пользователя.
+    """
+
+    def __init__(self, user_rate: float = THROTTLE_USER_RATE, user_burst: int = THROTTLE_USER_BURST,
+                 action_rate: float = THROTTLE_ACTION_RATE, action_burst: int = THROTTLE_ACTION_BURST,
+                 text_rate: float = THROTTLE_TEXT_RATE, text_burst: int = THROTTLE_TEXT_BURST,
+                 notice_interval: float = THROTTLE_NOTICE_INTERVAL, cache_size: int = THROTTLE_CACHE_SIZE):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.action_rate = action_rate
+        self.action_burst = action_burst
+        self.text_rate = text_rate
+        self.text_burst = text_burst
+        ttl = max(60.0, user_burst / user_rate, action_burst / action_rate, text_burst / text_rate)
+        self._buckets: TTLCache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self._noticed: TTLCache = TTLCache(maxsize=cache_size, ttl=notice_interval)
+        self.dropped = 0
+
+    def _bucket(self, key: Hashable, rate: float, burst: int) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst)
+        # Запись заново продлевает срок жизни ведра в кеше
+        self._buckets[key] = bucket
+        return bucket
+
+    def allow(self, user_id: int, action: str) -> bool:
+        """Взять токены пользователя и действия; False - обновление отбросить"""
+        # Сначала действие: спам одной кнопкой не расходует общий лимит
+        if action == TEXT_ACTION:
+            rate, burst = self.text_rate, self.text_burst
+        else:
+            rate, burst = self.action_rate, self.action_burst
+        if self._bucket((user_id, action), rate, burst).take():
+            return False
+        return not self._bucket(user_id, self.user_rate, self.user_burst).take()
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+                       event: Update, data: Dict[str, Any]) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        action = update_action(event)
+        if user is None or action is None or self.allow(user.id, action):
+            return await handler(event, data)
+
+        self.dropped += 1
+        if user.id not in self._noticed:
+            self._noticed[user.id] = True
+            logger.info(f"Пользователь {user.id} ограничен по частоте ({action})")
+            await self._notify(event)
+        elif event.callback_query is not None:
+            await self._answer_silently(event.callback_query)
+        return None
+
+    @staticmethod
+    async def _notify(event: Update):
+        try:
+            if event.callback_query is not None:
+                await event.callback_query.answer(NOTICE_TEXT)
+            elif event.message is not None:
+                await event.message.answer(NOTICE_TEXT)
+        except Exception as e:
+            logger.debug(f"Не удалось отправить уведомление об ограничении: {e}")
+
+    @staticmethod
+    async def _answer_silently(callback: CallbackQuery):
+        """Пустой ответ на нажатие: убрать индикатор загрузки у клиента"""
+        try:
+            await callback.answer()
+        except Exception as e:
+            logger.debug(f"Не удалось ответить на отброшенное нажатие: {e}")
@@ -0,0 +1,179 @@
+"""Локальная самопроверка webhook-режима на записанных обновлениях.
+
+Поднимает тот же диспетчер, что и bot.py, со встроенным веб-сервером на
+127.0.0.1 и отправляет ему обновления из JSONL-файла (записываются ботом
+при RECORD_UPDATES_PATH). Затем те же обновления подаются напрямую в
+dp.feed_raw_update, как это делает polling, и выводится сравнение.
+
+Бот работает через LocalSession: в Telegram ничего не отправляется, а
+данные пользователей и состояния FSM пишутся во временный каталог.
+
+    python webhook_selftest.py updates.jsonl --repeat 20 --concurrency 50
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import secrets
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0-100) по отсортированному списку"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def use_temp_storage(directory: str):
+    """Направить данные пользователей и состояния FSM во временный каталог.
+
+    Настройки читаются при импорте модулей бота, поэтому вызывать до него.
+    """
+    os.environ["DATA_PATH"] = str(Path(directory) / "user_data.json")
+    os.environ["DATA_DB_PATH"] = str(Path(directory) / "user_data.db")
+    os.environ["FSM_DB_PATH"] = str(Path(directory) / "fsm_state.db")
+    os.environ["BROADCAST_DB_PATH"] = str(Path(directory) / "broadcasts.db")
+    os.environ.pop("RECORD_UPDATES_PATH", None)
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    updates = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                updates.append(json.loads(line))
+    return updates
+
+
+async def drive(send: Callable[[Dict[str, Any]], Awaitable[bool]], updates: List[Dict[str, Any]],
+                repeat: int, concurrency: int) -> Dict[str, Any]:
+    """Прогнать обновления через send с ограничением параллельности"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(repeat):
+        for update in updates:
+            queue.put_nowait(update)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            update = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                ok = await send(update)
+            except Exception as e:
+                logger.debug(f"Ошибка обработки обновления: {e}")
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "updates": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "rate": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+def format_result(name: str, result: Dict[str, Any]) -> str:
+    return (f"{name:<8} {result['updates']:>7} обн. {result['errors']:>5} ошибок "
+            f"{result['rate']:>9.1f} обн/с  p50 {result['p50']:.2f} мс  "
+            f"p95 {result['p95']:.2f} мс  p99 {result['p99']:.2f} мс")
+
+
+async def selftest(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    import aiohttp
+    from aiohttp import web
+    from bot import create_bot, create_dispatcher, create_webhook_app
+    from local_session import LocalSession
+
+    updates = load_updates(args.updates)
+    if not updates:
+        raise ValueError(f"{args.updates}: нет обновлений")
+
+    session = LocalSession()
+    bot = create_bot("42:SELFTEST", session=session, rate_limit=False)
+    dp = create_dispatcher(throttle=False)
+    secret = secrets.token_urlsafe(32)
+    app = create_webhook_app(bot, dp, path=args.path, secret=secret, background=args.background)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    results = {}
+    try:
+        site = web.TCPSite(runner, "127.0.0.1", args.port)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        url = f"http://{host}:{port}{args.path}"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as client:
+            async with client.post(url, json=updates[0], headers={}) as response:
+                if response.status != 401:
+                    raise RuntimeError(f"Запрос без секрета принят (HTTP {response.status})")
+
+            async def post(update: Dict[str, Any]) -> bool:
+                async with client.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                    return response.status == 200
+
+            results["webhook"] = await drive(post, updates, args.repeat, args.concurrency)
+
+        async def feed(update: Dict[str, Any]) -> bool:
+            await dp.feed_raw_update(bot, update)
+            return True
+
+        results["polling"] = await drive(feed, updates, args.repeat, args.concurrency)
+    finally:
+        await runner.cleanup()
+    results["api"] = session.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение webhook и polling на записанных обновлениях")
+    parser.add_argument("updates", help="JSONL-файл с обновлениями (RECORD_UPDATES_PATH)")
+    parser.add_argument("--repeat", type=int, default=10, help="сколько раз прогнать файл")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных запросов")
+    parser.add_argument("--port", type=int, default=0, help="порт сервера (0 - любой свободный)")
+    parser.add_argument("--path", default="/webhook", help="путь вебхука")
+    parser.add_argument("--background", action="store_true",
+                        help="отвечать сразу (как WEBHOOK_BACKGROUND), иначе ждать обработчик")
+    parser.add_argument("--keep-data", action="store_true",
+                        help="не подменять файлы данных временными")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.keep_data:
+            use_temp_storage(tmp)
+        results = asyncio.run(selftest(args))
+
+    print(format_result("webhook", results["webhook"]))
+    print(format_result("polling", results["polling"]))
+    print("Запросы к Bot API: " + ", ".join(f"{name}={count}" for name, count in sorted(results["api"].items())))
+    failed = results["webhook"]["errors"] + results["polling"]["errors"]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()